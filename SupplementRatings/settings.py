@@ -96,6 +96,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # trigram lookups for supplement search
     'django_filters',
     'pages.apps.PagesConfig',
     'storages',  # for handling file uploads
@@ -147,6 +148,28 @@ DATABASES = {
     }
 }
 
+# Caches
+# 'default' backs throttling; 'responses' holds anonymous supplement list/detail
+# responses (see pages/cache.py). LocMemCache evicts least-recently-used entries
+# first, and with CULL_FREQUENCY == MAX_ENTRIES it drops one entry at a time.
+RESPONSE_CACHE_MAX_ENTRIES = config('RESPONSE_CACHE_MAX_ENTRIES', cast=int, default=1000)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'supplement-responses',
+        # Entries are keyed by the presigned-URL signing epoch too (pages/s3.py), so none outlives its image links
+        'TIMEOUT': config('RESPONSE_CACHE_TIMEOUT', cast=int, default=300),
+        'OPTIONS': {
+            'MAX_ENTRIES': RESPONSE_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': RESPONSE_CACHE_MAX_ENTRIES,
+        },
+    },
+}
+
 DEV_THROTTLE_RATES = {
     'anon': '10000/minute',
     'user': '20000/minute',
@@ -273,6 +296,26 @@ print("--- END DJANGO EMAIL SETTINGS DEBUG ---")
 # Determine if running in production
 IS_PRODUCTION = not DEBUG
 
+# Public media mode (pages/storage.py): processed avatars are also written to a
+# public-read prefix under content-hash names with an immutable Cache-Control,
+# and served by stable unsigned URLs. Full-size rating/comment images stay private.
+PUBLIC_MEDIA_ENABLED = config('PUBLIC_MEDIA_ENABLED', cast=bool, default=False)
+PUBLIC_MEDIA_LOCATION = 'public'
+PUBLIC_MEDIA_DOMAIN = config('PUBLIC_MEDIA_DOMAIN', default=None)  # e.g. a CDN in front of the public prefix
+
+# Uploaded images are stored as-is and converted by ImageProcessingJob rows.
+# 'thread' runs them on an in-process pool once the upload commits; 'worker'
+# leaves them to `manage.py process_image_jobs`.
+IMAGE_JOB_RUNNER = config('IMAGE_JOB_RUNNER', default='thread')
+IMAGE_JOB_THREADS = config('IMAGE_JOB_THREADS', cast=int, default=2)
+# Catalog CSV uploads are stored as ImportJob rows and imported in chunks;
+# same choice of runner, with `manage.py process_import_jobs` for 'worker'.
+IMPORT_JOB_RUNNER = config('IMPORT_JOB_RUNNER', default='thread')
+# Widths of the downscaled copies rendered next to each processed image (image_variants)
+IMAGE_VARIANT_WIDTHS = (160, 320, 640)
+# Uploads with more pixels are rejected from their header, before decoding (pages/image_ingest.py)
+IMAGE_MAX_PIXELS = config('IMAGE_MAX_PIXELS', cast=int, default=50_000_000)
+
 if IS_PRODUCTION:
     # AWS S3 settings
     AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID')
@@ -280,12 +323,16 @@ if IS_PRODUCTION:
     AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME')
     AWS_S3_REGION_NAME = config('AWS_S3_REGION_NAME', default='us-east-2') # Your bucket region
     AWS_S3_FILE_OVERWRITE = False # Default, set to True if you want to overwrite files
+    AWS_S3_MAX_MEMORY_SIZE = 5242880  # Objects read back (image jobs) spill to disk above 5 MB
     AWS_DEFAULT_ACL = None # Disable setting ACLs
     AWS_S3_OBJECT_PARAMETERS = {
         'CacheControl': 'max-age=86400', # Cache for 1 day
     }
     AWS_QUERYSTRING_AUTH = True  # Enable signed URLs
     AWS_QUERYSTRING_EXPIRE = 3600  # URL lifetime in seconds (e.g., 1 hour)
+    # Presigned URLs are cached (pages/s3.py) and reused until this many seconds before they expire
+    S3_PRESIGN_SAFETY_MARGIN = 600
+    S3_FAKE_SIGNING = config('S3_FAKE_SIGNING', cast=bool, default=False)  # Sign with pages.s3.FakeS3Client (offline)
     AWS_LOCATION = 'media' # Optional: subdirectory in your bucket for media files
     AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com'
 
@@ -369,4 +416,5 @@ LOGGING = {
 # sys.excepthook = _capture_all_exceptions
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 MB
\ No newline at end of file
+# Uploads above this are streamed to a temp file instead of held in memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB
\ No newline at end of file
@@ -7,9 +7,11 @@ from pages.views import (
     CommentViewSet, 
     ConditionViewSet,
     BrandViewSet,
+    ImportJobViewSet,
     upload_supplements_csv,
     upload_conditions_csv,
     upload_brands_csv,
+    upload_ratings_file,
     get_user_details,
     register_user,
     verify_email,
@@ -18,7 +20,8 @@ from pages.views import (
     ProfileImageUpdateAPIView,
     contact_message,
     google_login,
-    google_client_id
+    google_client_id,
+    upvote_state
 )
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -34,6 +37,7 @@ router.register(r'ratings', RatingViewSet, basename='rating')
 router.register(r'comments', CommentViewSet, basename='comment')
 router.register(r'conditions', ConditionViewSet, basename='condition')
 router.register(r'brands', BrandViewSet, basename='brand')
+router.register(r'import-jobs', ImportJobViewSet, basename='import-job')
 
 import traceback
 from rest_framework.response import Response
@@ -72,6 +76,7 @@ api_urlpatterns = [
     path('upload-supplements-csv/', upload_supplements_csv, name='upload-supplements-csv'),
     path('upload-conditions-csv/', upload_conditions_csv, name='upload-conditions-csv'),
     path('upload-brands-csv/', upload_brands_csv, name='upload-brands-csv'),
+    path('upload-ratings/', upload_ratings_file, name='upload-ratings'),
     path('token/obtain/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('user/me/', get_user_details, name='user-details'),
@@ -83,6 +88,7 @@ api_urlpatterns = [
     path('contact/', contact_message, name='contact-message'),
     path('auth/google/', google_login, name='google-login'),
     path('auth/google/client-id/', google_client_id, name='google-client-id'),
+    path('upvotes/', upvote_state, name='upvote-state'),
     path('', include(router.urls)),
 ]
 
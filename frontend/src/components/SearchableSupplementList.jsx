@@ -26,7 +26,7 @@ import {
     Chip,
     InputAdornment
 } from '@mui/material';
-import { getSupplements, getSupplement, getConditions, getBrands, addRating, updateRating, upvoteRating, getCategories } from '../services/api';
+import { getSupplements, getSupplement, getConditions, getBrands, addRating, updateRating, upvoteRating, getCategories, getCursorFromUrl } from '../services/api';
 import { useAuth } from '../context/AuthContext';
 import { toast } from 'react-toastify';
 import AddIcon from '@mui/icons-material/Add';
@@ -40,6 +40,7 @@ import ForumOutlinedIcon from '@mui/icons-material/ForumOutlined';
 import { useAutoSave } from '../hooks/useAutoSave';
 import { useBanner } from '../context/BannerContext';
 import { DEFAULT_PROFILE_IMAGE_URL } from '../config';
+import { buildSrcSet } from '../utils/images';
 
 const SPECIAL_CHRONIC_CONDITIONS_ID = '__MY_CHRONIC_CONDITIONS__';
 
@@ -466,6 +467,8 @@ const SupplementRatingItem = React.forwardRef(({ rating, user, handleEditRating,
                 }}>
                     <img 
                         src={rating.image_url}
+                        srcSet={buildSrcSet(rating.image_variants)}
+                        sizes="(max-width: 600px) 100vw, 640px"
                         alt="Rating attachment"
                         loading="lazy"
                         onClick={(e) => { 
@@ -555,7 +558,7 @@ function SearchableSupplementList() {
 
     const [selectedReview, setSelectedReview] = useState(null);
     const [debouncedSearchTerm, setDebouncedSearchTerm] = useState('');
-    const [offset, setOffset] = useState(0);
+    const [nextCursor, setNextCursor] = useState(null);
     const [hasMore, setHasMore] = useState(true);
     const [batchSize, setBatchSize] = useState(20);
     const [editingRating, setEditingRating] = useState(null);
@@ -729,12 +732,11 @@ function SearchableSupplementList() {
                         frequency: `${appliedFilterFrequency}_${appliedFilterFrequencyUnit}` 
                     } : {}),
                     sort_by: appliedSortBy,
-                    offset: 0,
                     limit: 10
                 };
                 const data = await getSupplements(params);
                 setSupplements(data.results || []);
-                setOffset(10);
+                setNextCursor(getCursorFromUrl(data.next));
                 setHasMore(data.next !== null);
             } catch (error) {
                 console.error('Error fetching supplements:', error);
@@ -926,13 +928,12 @@ function SearchableSupplementList() {
                     frequency: `${appliedFilterFrequency}_${appliedFilterFrequencyUnit}` 
                 } : {}),
                 sort_by: appliedSortBy,
-                offset: 0,
                 limit: 10
             };
             const data = await getSupplements(params);
             setSupplements(data.results || []);
             setSelectedSupplement(null);
-            setOffset(10);
+            setNextCursor(getCursorFromUrl(data.next));
             setHasMore(data.next !== null);
         } catch (error) {
             console.error('Error refreshing supplements:', error);
@@ -1204,12 +1205,12 @@ function SearchableSupplementList() {
                     frequency: `${appliedFilterFrequency}_${appliedFilterFrequencyUnit}` 
                 } : {}),
                 sort_by: appliedSortBy,
-                offset: offset,
+                cursor: nextCursor,
                 limit: batchSize
             };
             const data = await getSupplements(params);
             setSupplements(prevSupplements => [...prevSupplements, ...(data.results || [])]);
-            setOffset(offset + (data.results ? data.results.length : 0));
+            setNextCursor(getCursorFromUrl(data.next));
             setHasMore(data.next !== null);
         } catch (error) {
             console.error('Error loading more supplements:', error);
@@ -1422,7 +1423,7 @@ function SearchableSupplementList() {
             setAppliedFilterFrequency('');
             setAppliedFilterFrequencyUnit('day');
             setAppliedFilterCategory('');
-            setOffset(0);
+            setNextCursor(null);
             setSelectedSupplement(null); // ensure we're on the list view
 
             // Replace history state to avoid repeated resets on back/forward
@@ -1,7 +1,7 @@
 // frontend/src/components/UploadCSV.jsx
 
-import React, { useState, useContext } from 'react';
-import { uploadSupplementsCSV, uploadConditionsCSV, uploadBrandsCSV, addSupplement, addBrand, addCondition } from '../services/api';
+import React, { useState, useContext, useEffect, useRef } from 'react';
+import { uploadSupplementsCSV, uploadConditionsCSV, uploadBrandsCSV, addSupplement, addBrand, addCondition, getImportJob, resumeImportJob } from '../services/api';
 import { toast } from 'react-toastify';
 import { 
   Button, 
@@ -34,6 +34,14 @@ const VisuallyHiddenInput = styled('input')({
   width: 1,
 });
 
+const POLL_INTERVAL_MS = 1500;
+
+const formatEta = (seconds) => {
+  if (seconds == null) return '';
+  if (seconds < 60) return `about ${Math.ceil(seconds)}s left`;
+  return `about ${Math.ceil(seconds / 60)} min left`;
+};
+
 function UploadCSV({ type }) {
   const [file, setFile] = useState(null);
   const [uploading, setUploading] = useState(false);
@@ -42,6 +50,14 @@ function UploadCSV({ type }) {
   const [name, setName] = useState('');
   const [category, setCategory] = useState('');
   const [dosageUnit, setDosageUnit] = useState('');
+  // Background import job returned by the upload, polled until it finishes
+  const [job, setJob] = useState(null);
+  const mountedRef = useRef(true);
+
+  useEffect(() => {
+    mountedRef.current = true;
+    return () => { mountedRef.current = false; };
+  }, []);
 
   const handleFileSelect = (event) => {
     const selectedFile = event.target.files[0];
@@ -98,32 +114,18 @@ function UploadCSV({ type }) {
 
     setUploading(true);
     setProgress(0);
+    setJob(null);
 
     try {
       const uploadFunction = 
       type === 'conditions' ? uploadConditionsCSV : 
       type == 'brands' ? uploadBrandsCSV :
       uploadSupplementsCSV;
-      
-      console.log('Starting upload for type:', type);
-      console.log('File being uploaded:', file);
-      console.log('Upload function being used:', uploadFunction.name);
-      
-      // Simulate progress
-      const progressInterval = setInterval(() => {
-        setProgress((prev) => Math.min(prev + 10, 90));
-      }, 500);
-
-      const response = await uploadFunction(file);
-      
-      console.log('Upload response:', response);
-      
-      clearInterval(progressInterval);
-      setProgress(100);
-      
-      toast.success(`${type === 'conditions' ? 'Conditions' : type === 'brands' ? 'Brands' : 'Supplements'} uploaded successfully!`);
+
+      // The server accepts the file into an import job and imports it in the background
+      const acceptedJob = await uploadFunction(file);
       setFile(null);
-      setProgress(0);
+      await followImportJob(acceptedJob);
     } catch (error) {
       console.error('Upload error details:', error.response?.data || error);
       const errorMessage = error.response?.data?.error || error.message;
@@ -133,9 +135,43 @@ function UploadCSV({ type }) {
     }
 };
 
+  const followImportJob = async (startingJob) => {
+    let current = startingJob;
+    setJob(current);
+    setProgress(current.percent || 0);
+    while (mountedRef.current && (current.status === 'pending' || current.status === 'running')) {
+      await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+      current = await getImportJob(current.id);
+      if (!mountedRef.current) return;
+      setJob(current);
+      setProgress(current.percent || 0);
+    }
+    if (current.status === 'done') {
+      toast.success(current.message);
+      if (current.row_error_count > 0) {
+        toast.warning(`${current.row_error_count} rows could not be imported.`);
+      }
+    } else if (current.status === 'failed') {
+      toast.error(`Import stopped after ${current.rows_processed} rows: ${current.error}`);
+    }
+  };
+
+  const handleResume = async () => {
+    if (!job) return;
+    setUploading(true);
+    try {
+      await followImportJob(await resumeImportJob(job.id));
+    } catch (error) {
+      toast.error(`Failed to resume import: ${error.response?.data?.error || error.message}`);
+    } finally {
+      setUploading(false);
+    }
+  };
+
   const clearFile = () => {
     setFile(null);
     setProgress(0);
+    setJob(null);
   };
 
   return (
@@ -183,9 +219,33 @@ function UploadCSV({ type }) {
           )}
         </Box>
 
-        {uploading && (
+        {(uploading || job) && (
           <Box sx={{ width: '100%', mb: 2 }}>
-            <LinearProgress variant="determinate" value={progress} />
+            <LinearProgress variant={job ? 'determinate' : 'indeterminate'} value={progress} />
+            {job && (
+              <Typography variant="body2" color="text.secondary" sx={{ mt: 1 }}>
+                {job.status === 'pending' && 'Queued…'}
+                {job.status === 'running' && (
+                  `${job.rows_processed}${job.total_rows != null ? ` of ${job.total_rows}` : ''} rows imported` +
+                  `${job.eta_seconds != null ? `, ${formatEta(job.eta_seconds)}` : ''}`
+                )}
+                {job.status === 'done' && job.message}
+                {job.status === 'failed' && `Stopped after ${job.rows_processed} rows: ${job.error}`}
+                {job.row_error_count > 0 && ` (${job.row_error_count} row errors)`}
+              </Typography>
+            )}
+            {job && job.row_errors?.length > 0 && (
+              <Box component="ul" sx={{ maxHeight: 160, overflowY: 'auto', pl: 3, my: 1 }}>
+                {job.row_errors.slice(0, 50).map((rowError) => (
+                  <Typography component="li" variant="caption" key={rowError}>{rowError}</Typography>
+                ))}
+              </Box>
+            )}
+            {job && job.status === 'failed' && (
+              <Button variant="outlined" size="small" onClick={handleResume} disabled={uploading} sx={{ mt: 1 }}>
+                Resume import
+              </Button>
+            )}
           </Box>
         )}
 
@@ -21,6 +21,8 @@ const DeleteSupplementModal = ({ open, onClose, supplement, onSupplementDeleted
     const [targetSupplement, setTargetSupplement] = useState(null);
     const [loadingSupplements, setLoadingSupplements] = useState(false);
     const [isDeleting, setIsDeleting] = useState(false);
+    const [keepNewer, setKeepNewer] = useState(false);
+    const [preview, setPreview] = useState(null);
 
     useEffect(() => {
         if (open && transferRatings) {
@@ -43,9 +45,29 @@ const DeleteSupplementModal = ({ open, onClose, supplement, onSupplementDeleted
             // Reset state when modal is closed
             setTransferRatings(false);
             setTargetSupplement(null);
+            setKeepNewer(false);
+            setPreview(null);
         }
     }, [open, transferRatings, supplement?.id]);
 
+    useEffect(() => {
+        // A preview only describes the target and options it was made with
+        setPreview(null);
+    }, [targetSupplement, keepNewer, transferRatings]);
+
+    const handlePreview = async () => {
+        if (!supplement || !targetSupplement) return;
+        setIsDeleting(true);
+        try {
+            const response = await deleteSupplement(supplement.id, targetSupplement.id, { keepNewer, dryRun: true });
+            setPreview(response);
+        } catch (error) {
+            toast.error(error.error || 'Failed to preview the transfer.');
+        } finally {
+            setIsDeleting(false);
+        }
+    };
+
     const handleDelete = async () => {
         if (!supplement) return;
 
@@ -57,7 +79,7 @@ const DeleteSupplementModal = ({ open, onClose, supplement, onSupplementDeleted
         setIsDeleting(true);
         try {
             const transferToId = transferRatings && targetSupplement ? targetSupplement.id : null;
-            const response = await deleteSupplement(supplement.id, transferToId);
+            const response = await deleteSupplement(supplement.id, transferToId, { keepNewer });
             toast.success(response.message || 'Supplement deleted successfully!');
             onSupplementDeleted(supplement.id); // Callback to update parent list
             onClose(); // Close modal
@@ -113,11 +135,34 @@ const DeleteSupplementModal = ({ open, onClose, supplement, onSupplementDeleted
                         />
                     )
                 )}
+                {transferRatings && (
+                    <FormControlLabel
+                        control={
+                            <Checkbox
+                                checked={keepNewer}
+                                onChange={(e) => setKeepNewer(e.target.checked)}
+                                color="primary"
+                            />
+                        }
+                        label="If a user rated both, keep their newer rating"
+                    />
+                )}
+                {preview && (
+                    <DialogContentText sx={{ mt: 1 }}>
+                        {preview.message}
+                        {preview.conflicts.length > 0 && ` Users who rated both: ${preview.conflicts.map(c => c.user).join(', ')}.`}
+                    </DialogContentText>
+                )}
             </DialogContent>
             <DialogActions>
                 <Button onClick={onClose} color="secondary" disabled={isDeleting}>
                     Cancel
                 </Button>
+                {transferRatings && (
+                    <Button onClick={handlePreview} disabled={isDeleting || !targetSupplement}>
+                        Preview
+                    </Button>
+                )}
                 <Button onClick={handleDelete} color="error" variant="contained" disabled={isDeleting}>
                     {isDeleting ? <CircularProgress size={24} color="inherit" /> : 'Delete Supplement'}
                 </Button>
@@ -36,6 +36,7 @@ import { useAuth } from '../context/AuthContext';
 import { toast } from 'react-toastify';
 import { useBanner } from '../context/BannerContext';
 import { DEFAULT_PROFILE_IMAGE_URL } from '../config';
+import { buildSrcSet } from '../utils/images';
 
 const defaultProfileImage = DEFAULT_PROFILE_IMAGE_URL;
 const SPECIAL_CHRONIC_CONDITIONS_ID = '__MY_CHRONIC_CONDITIONS__';
@@ -159,6 +160,8 @@ const SupplementRatingItem = ({ rating, handleReviewClick, user, handleEditRatin
                 <Box sx={{ mt: 1, mb: 1 }}>
                     <img 
                         src={rating.image_url}
+                        srcSet={buildSrcSet(rating.image_variants)}
+                        sizes="(max-width: 600px) 100vw, 640px"
                         alt="Rating attachment"
                         style={{ maxWidth: '100%', height: 'auto', borderRadius: '4px' }}
                     />
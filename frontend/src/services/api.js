@@ -385,7 +385,7 @@ export const getSupplements = async (params = {}, skipCache = false) => {
 
     try {
         const response = await API.get('supplements/', { params: apiParams });
-        if (params.offset === 0) {  // Only cache first page, use original params for cache key
+        if (!params.cursor && !params.offset) {  // Only cache first page, use original params for cache key
             cache.set(cacheKey, {
                 data: response.data,
                 timestamp: Date.now()
@@ -397,6 +397,16 @@ export const getSupplements = async (params = {}, skipCache = false) => {
     }
 };
 
+// Extracts the opaque keyset cursor from a paginated response's `next` URL
+export const getCursorFromUrl = (url) => {
+    if (!url) return null;
+    try {
+        return new URL(url).searchParams.get('cursor');
+    } catch (error) {
+        return null;
+    }
+};
+
 export const getAllSupplements = async (params = {}) => {
     try {
         // Fetch with a large limit to effectively get all supplements for dropdowns.
@@ -573,11 +583,13 @@ export const uploadSupplementsCSV = async (file) => {
     }
 };
 
-export const deleteSupplement = async (supplementId, transferToSupplementId = null) => {
+export const deleteSupplement = async (supplementId, transferToSupplementId = null, { keepNewer = false, dryRun = false } = {}) => {
     try {
         let url = `/supplements/${supplementId}/`;
         if (transferToSupplementId) {
             url += `?transfer_ratings_to_id=${transferToSupplementId}`;
+            if (keepNewer) url += '&keep_newer=true';
+            if (dryRun) url += '&dry_run=true';
         }
         const response = await API.delete(url);
         return response.data;
@@ -768,6 +780,27 @@ export const uploadBrandsCSV = async (file) => {
     }
 };
 
+// CSV uploads return an import job (202); poll it for progress
+export const getImportJob = async (jobId) => {
+    try {
+        const response = await API.get(`/import-jobs/${jobId}/`);
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching import job:', error);
+        throw error;
+    }
+};
+
+export const resumeImportJob = async (jobId) => {
+    try {
+        const response = await API.post(`/import-jobs/${jobId}/resume/`);
+        return response.data;
+    } catch (error) {
+        console.error('Error resuming import job:', error);
+        throw error;
+    }
+};
+
 export const getBrands = async () => {
     return fetchWithRequestCache('brands', async () => {
         try {
@@ -825,6 +858,22 @@ export const upvoteComment = async (commentId) => {
     }
 };
 
+// Upvote state for many ratings/comments in one request: { ratings: {id: bool}, comments: {id: bool} }
+export const getUpvoteState = async ({ ratingIds = [], commentIds = [] } = {}) => {
+    try {
+        const response = await API.get('upvotes/', {
+            params: {
+                ratings: ratingIds.join(','),
+                comments: commentIds.join(','),
+            },
+        });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching upvote state:', error);
+        throw error;
+    }
+};
+
 export const getCategories = async () => {
     return fetchWithRequestCache('categories', async () => {
         try {
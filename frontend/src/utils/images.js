@@ -0,0 +1,8 @@
+// `srcset` value for an `image_variants` list from the API, or undefined when
+// the image has no variants yet (still processing, or uploaded before variants).
+export const buildSrcSet = (variants) => {
+    if (!variants || variants.length === 0) {
+        return undefined;
+    }
+    return variants.map((variant) => `${variant.url} ${variant.width}w`).join(', ');
+};
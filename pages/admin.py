@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import ImageProcessingJob, ImportJob, MediaBlob, SupplementAlias
 
 # Register your models here.
+admin.site.register(SupplementAlias)
+admin.site.register(ImageProcessingJob)
+admin.site.register(MediaBlob)
+admin.site.register(ImportJob)
@@ -0,0 +1,175 @@
+# pages/cache.py
+
+import hashlib
+import json
+
+from django.core.cache import caches
+from django.http import Http404
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+
+from .models import DataVersion
+from .s3 import signing_epoch
+
+# Query parameters holding comma-separated sets, where order and duplicates do not matter
+SET_QUERY_PARAMS = {'conditions', 'benefits', 'side_effects', 'brands', 'fields', 'expand'}
+
+
+def normalize_query_params(query_params):
+    """
+    Canonical, order-independent form of a request's query string: parameters
+    sorted by name, set-like lists sorted and de-duplicated, search text folded.
+    Two URLs that produce the same response map to the same value.
+    """
+    normalized = []
+    for name in sorted(query_params):
+        values = query_params.getlist(name)
+        if name in SET_QUERY_PARAMS:
+            values = sorted({item.strip() for value in values for item in value.split(',') if item.strip()})
+        elif name == 'search':
+            values = [' '.join(value.lower().split()) for value in values]
+        normalized.append([name, values])
+    return normalized
+
+
+class DataVersionMixin:
+    """
+    Resolves the DataVersion counters a read depends on, once per request.
+    get_data_version_keys() returns the counter keys for the current action,
+    or None when the response cannot be stamped.
+    """
+
+    def get_data_version_keys(self):
+        if self.action == 'retrieve':
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            return [DataVersion.supplement_key(lookup), DataVersion.REFERENCE]
+        if self.action == 'list':
+            return [DataVersion.GLOBAL]
+        return None
+
+    def get_data_versions(self):
+        if not hasattr(self, '_data_versions'):
+            keys = self.get_data_version_keys()
+            self._data_versions = None if keys is None else DataVersion.current(keys)
+        return self._data_versions
+
+    def get_request_digest(self, request, *extra):
+        payload = json.dumps([
+            request.get_host(),
+            self.kwargs,
+            normalize_query_params(request.query_params),
+            *extra,
+        ], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ConditionalResponseMixin(DataVersionMixin):
+    """
+    Strong ETags for list/retrieve built from the DataVersion stamp, the
+    normalized request, the requesting user (has_upvoted is per user) and the
+    presigned-URL epoch (bodies embed expiring image links).
+    A matching If-None-Match is answered with 304 before anything is loaded
+    or serialized. A missing object is still a 404 (one indexed EXISTS), and
+    views with object-level permissions look the object up and check it
+    first, so a forbidden object is still a 403.
+    """
+
+    def get_etag(self, request):
+        versions = self.get_data_versions()
+        if versions is None:
+            return None
+        user_id = request.user.pk if request.user and request.user.is_authenticated else None
+        digest = self.get_request_digest(request, self.basename, self.action, user_id, versions, signing_epoch())
+        return f'"{digest}"'
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            client_etags = parse_etags(if_none_match)
+            if '*' in client_etags or etag in client_etags:
+                if self.action == 'retrieve' and getattr(self, '_retrieved_object', None) is None and not self.object_exists():
+                    raise Http404
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.checks_object_permissions():
+            # Raises 404/403 before any 304; the handler reuses the object via get_object()
+            self._retrieved_object = self.get_object()
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def checks_object_permissions(self):
+        return any(
+            type(permission).has_object_permission is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
+
+    def get_existence_queryset(self):
+        """Rows a retrieve can find; override with an unannotated queryset when get_queryset() joins or aggregates."""
+        return self.get_queryset()
+
+    def object_exists(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self.get_existence_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).exists()
+
+    def get_object(self):
+        if getattr(self, '_retrieved_object', None) is not None:
+            return self._retrieved_object
+        return super().get_object()
+
+
+class AnonymousResponseCacheMixin(DataVersionMixin):
+    """
+    Serves list/retrieve for anonymous users from the `response_cache_alias`
+    cache. Entries are keyed by action, normalized request and the DataVersion
+    stamp; writes bump the stamp, so stale entries are never read again and
+    simply age out of the size-bounded LRU backend.
+    """
+    response_cache_alias = 'responses'
+
+    def get_response_cache_key(self, request):
+        versions = self.get_data_versions()
+        if versions is None:
+            return None
+        stamp = '.'.join(str(version) for version in versions)
+        # Bodies embed presigned links, so an entry is only served in the signing epoch that built it
+        return f'{self.basename}:{self.action}:{stamp}.{signing_epoch()}:{self.get_request_digest(request)}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user and request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        cache_key = self.get_response_cache_key(request)
+        if cache_key is None:
+            return handler(request, *args, **kwargs)
+
+        cache = caches[self.response_cache_alias]
+        data = cache.get(cache_key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(cache_key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,113 @@
+# pages/comment_tree.py
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Comment
+
+DEFAULT_MAX_DEPTH = 8
+
+
+class CommentTree:
+    """
+    In-memory comment threads for one serialization pass. Whole threads are
+    fetched at once, either every comment on a set of ratings or everything
+    below a set of comments, with users, profiles and supplements joined in. Replies
+    are then read from memory instead of one query per node.
+
+    On backends with recursive CTEs (PostgreSQL, SQLite) a load is a single
+    query; elsewhere it walks the thread one level per query.
+    """
+    select_related = ('user__profile', 'supplement')
+
+    def __init__(self, max_depth=None):
+        if max_depth is None:
+            max_depth = getattr(settings, 'COMMENT_TREE_MAX_DEPTH', DEFAULT_MAX_DEPTH)
+        self.max_depth = max_depth
+        self.by_id = {}
+        self.children = defaultdict(list)
+        self.by_rating = defaultdict(list)
+        self.loaded_rating_ids = set()
+        # Comments whose complete subtree is in memory
+        self.expanded_ids = set()
+
+    def load_for_ratings(self, rating_ids):
+        rating_ids = {rating_id for rating_id in rating_ids if rating_id is not None} - self.loaded_rating_ids
+        if not rating_ids:
+            return
+        self._add(self._fetch_threads('rating_id', rating_ids))
+        self.loaded_rating_ids |= rating_ids
+
+    def load_replies(self, comment_ids):
+        comment_ids = {comment_id for comment_id in comment_ids if comment_id is not None} - self.expanded_ids
+        if not comment_ids:
+            return
+        self._add(self._fetch_threads('id', comment_ids))
+        self.expanded_ids |= comment_ids
+
+    def comments_for_rating(self, rating_id):
+        self.load_for_ratings([rating_id])
+        return self.by_rating[rating_id]
+
+    def replies(self, comment_id):
+        self.load_replies([comment_id])
+        return self.children[comment_id]
+
+    def _fetch_threads(self, seed_column, seed_values):
+        queryset = Comment.objects.select_related(*self.select_related)
+        if connection.vendor in ('postgresql', 'sqlite'):
+            return list(queryset.filter(id__in=self._thread_ids_sql(seed_column, seed_values)))
+
+        comments = list(queryset.filter(**{f'{seed_column}__in': seed_values}))
+        seen = {comment.id for comment in comments}
+        frontier = seen
+        while frontier:
+            level = [comment for comment in queryset.filter(parent_comment_id__in=frontier) if comment.id not in seen]
+            comments.extend(level)
+            frontier = {comment.id for comment in level}
+            seen |= frontier
+        return comments
+
+    def _thread_ids_sql(self, seed_column, seed_values):
+        table = connection.ops.quote_name(Comment._meta.db_table)
+        seed_values = list(seed_values)
+        placeholders = ', '.join(['%s'] * len(seed_values))
+        # UNION (not UNION ALL) drops revisited rows, so a corrupt cycle cannot recurse forever
+        sql = (
+            f'WITH RECURSIVE thread(id) AS ('
+            f'SELECT id FROM {table} WHERE {seed_column} IN ({placeholders}) '
+            f'UNION '
+            f'SELECT child.id FROM {table} child JOIN thread ON child.parent_comment_id = thread.id'
+            f') SELECT id FROM thread'
+        )
+        return RawSQL(sql, seed_values)
+
+    def _add(self, comments):
+        new_comments = [comment for comment in comments if comment.id not in self.by_id]
+        touched = {}
+        for comment in new_comments:
+            self.by_id[comment.id] = comment
+        for comment in new_comments:
+            if comment.parent_comment_id is not None:
+                self.children[comment.parent_comment_id].append(comment)
+                touched[('parent', comment.parent_comment_id)] = self.children[comment.parent_comment_id]
+                parent = self.by_id.get(comment.parent_comment_id)
+                if parent is not None:
+                    Comment.parent_comment.field.set_cached_value(comment, parent)
+            if comment.rating_id is not None:
+                self.by_rating[comment.rating_id].append(comment)
+                touched[('rating', comment.rating_id)] = self.by_rating[comment.rating_id]
+        for comments_list in touched.values():
+            comments_list.sort(key=lambda comment: comment.id)
+        # Everything fetched came with its full subtree
+        self.expanded_ids.update(comment.id for comment in new_comments)
+
+
+def get_comment_tree(context):
+    """Returns the CommentTree shared by every serializer rendering from this context."""
+    if 'comment_tree' not in context:
+        context['comment_tree'] = CommentTree(max_depth=context.get('comment_max_depth'))
+    return context['comment_tree']
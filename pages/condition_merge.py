@@ -0,0 +1,81 @@
+# pages/condition_merge.py
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Condition, DataVersion, Profile, Rating, SupplementConditionStats
+
+
+def condition_links():
+    """(name, through model, owner column) for every table that links a row to a Condition."""
+    links = [
+        (field_name, getattr(Rating, field_name).through, 'rating_id')
+        for field_name in SupplementConditionStats.ROLE_FIELDS
+    ]
+    links.append(('chronic_conditions', Profile.chronic_conditions.through, 'profile_id'))
+    return links
+
+
+class ConditionMerge:
+    """
+    Folds one condition (source) into another (target) and deletes the source.
+
+    Each through table is rewritten with two statements whatever its size: an
+    UPDATE ... WHERE NOT EXISTS repoints the links whose owner isn't already
+    linked to the target, then a DELETE drops the rest, which would be
+    duplicates. The condition cube is rebuilt for the target alone; the
+    source's rows go with the source.
+    """
+
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+        self.ratings_transferred = 0
+        self.profiles_transferred = 0
+        # Through table name -> links repointed / links dropped as already present on the target
+        self.moved = {}
+        self.already_linked = {}
+
+    def run(self):
+        with transaction.atomic():
+            list(Condition.objects.select_for_update().filter(pk__in=[self.source.pk, self.target.pk]).values_list('pk'))
+
+            rating_links = Q()
+            for field_name in SupplementConditionStats.ROLE_FIELDS:
+                through = getattr(Rating, field_name).through
+                rating_links |= Q(pk__in=through.objects.filter(condition_id=self.source.pk).values('rating_id'))
+            self.ratings_transferred = Rating.objects.filter(rating_links).count()
+            self.profiles_transferred = Profile.objects.filter(chronic_conditions=self.source).count()
+
+            for name, through, owner in condition_links():
+                already = through.objects.filter(**{owner: OuterRef(owner)}, condition_id=self.target.pk)
+                self.moved[name] = (
+                    through.objects.filter(condition_id=self.source.pk)
+                    .filter(~Exists(already))
+                    .update(condition_id=self.target.pk)
+                )
+                self.already_linked[name], _ = through.objects.filter(condition_id=self.source.pk).delete()
+
+            self.source.delete()
+
+            # Queryset writes skip the m2m_changed receivers that keep the cube and response versions in step
+            SupplementConditionStats.rebuild(condition_ids=[self.target.pk])
+            DataVersion.bump_on_commit(reference=True)
+        return self
+
+    @property
+    def message(self):
+        message = (
+            f"Condition/Purpose '{self.source.name}' deleted. "
+            f"{self.ratings_transferred} associated ratings were transferred to '{self.target.name}'."
+        )
+        if self.profiles_transferred:
+            message += f" {self.profiles_transferred} user profiles now list '{self.target.name}' instead."
+        return message
+
+    def as_response_data(self):
+        return {
+            'message': self.message,
+            'transferred': self.moved,
+            'already_linked': self.already_linked,
+        }
@@ -0,0 +1,454 @@
+# pages/csv_import.py
+
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from rest_framework import status
+
+from .models import Brand, Condition, DataVersion, Supplement, SupplementRatingStats
+from .search import invalidate_search_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 2000
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+EMPTY_CSV_ERROR = 'The uploaded CSV file is empty.'
+EMPTY_FILE_ERROR = 'The uploaded file is empty.'
+
+
+class ImportFileError(ValueError):
+    """The file as a whole can't be imported (empty, unreadable or missing a required column)."""
+
+
+class RowError(ValueError):
+    """One row is invalid; the message is reported as-is in `row_errors`."""
+
+
+@contextmanager
+def open_csv(file):
+    """
+    Streams an uploaded CSV with the stdlib csv module, decoding it chunk by
+    chunk so it is never read into memory whole. Yields (header, rows): the
+    header is [] for an empty file, and rows iterates (row_number, row dict)
+    pairs. Row numbers count the header as row 1, as in spreadsheet tools;
+    blank cells come through as None and blank lines are skipped. The upload
+    itself is left open on exit.
+    """
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    binary = isinstance(file.read(0), bytes)
+    # utf-8-sig drops the byte order mark spreadsheet exports put in front of the header
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='') if binary else file
+    reader = csv.reader(text)
+
+    def rows():
+        row_number = 1
+        try:
+            for values in reader:
+                if not any(value.strip() for value in values):
+                    continue
+                row_number += 1
+                yield row_number, {column: value or None for column, value in zip(header, values)}
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ImportFileError(f'Could not read the CSV file after row {row_number}: {e}') from e
+
+    try:
+        try:
+            header = [column.strip() for column in next(reader, [])]
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ImportFileError(f'Could not read the CSV file: {e}') from e
+        yield header, rows()
+    finally:
+        if binary:
+            # Closing the wrapper would close the upload too
+            text.detach()
+
+
+@contextmanager
+def open_ndjson(file):
+    """
+    Like open_csv for newline-delimited JSON, one object per line. The header
+    is None; row numbers are line numbers. A line that isn't a JSON object
+    comes through as {'_error': message} so it is reported as a row error.
+    """
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    binary = isinstance(file.read(0), bytes)
+    text = io.TextIOWrapper(file, encoding='utf-8-sig') if binary else file
+
+    def rows():
+        line_number = 0
+        try:
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = {'_error': f'Invalid JSON: {e}'}
+                if not isinstance(record, dict):
+                    record = {'_error': 'Each line must be a JSON object.'}
+                yield line_number, record
+        except UnicodeDecodeError as e:
+            raise ImportFileError(f'Could not read the file after line {line_number}: {e}') from e
+
+    try:
+        yield None, rows()
+    finally:
+        if binary:
+            text.detach()
+
+
+def is_ndjson(file):
+    return os.path.splitext(getattr(file, 'name', '') or '')[1].lower() in NDJSON_EXTENSIONS
+
+
+def open_records(file):
+    """open_csv or open_ndjson, by the file's extension."""
+    return open_ndjson(file) if is_ndjson(file) else open_csv(file)
+
+
+def read_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields (columns, rows) for an uploaded CSV or NDJSON file, chunk_size rows
+    at a time, where rows is a list of (row_number, row dict). columns is the
+    CSV header, or None for NDJSON.
+    """
+    with open_records(file) as (header, rows):
+        if header is not None and not any(header):
+            raise ImportFileError(EMPTY_CSV_ERROR)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield header, chunk
+
+
+def count_rows(file):
+    """Number of non-blank data rows, from one streaming pass over the file."""
+    with open_records(file) as (header, rows):
+        return sum(1 for _ in rows)
+
+
+def clean_text(value):
+    """Stripped string for a CSV cell, or '' for a blank one."""
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+class ImportSpec:
+    """
+    How one model is imported: the required columns, how a row becomes a
+    (key, values) pair, and what has to happen after rows are written
+    without save() (and so without the model's signals).
+    """
+    model = None
+    label = ''
+    key_field = 'name'
+    update_fields = ()
+    required_columns = ('name',)
+    file_extensions = ('.csv',)
+    wrong_file_error = 'File must be a CSV'
+
+    def missing_columns_error(self, missing):
+        """Message for a CSV whose header lacks some of required_columns."""
+        return f'CSV must contain at least the following columns: {", ".join(missing)}'
+
+    def clean(self, row_number, row):
+        """
+        Validates and normalizes one row; the one hook every spec must
+        implement. For BulkImporter it returns (key, {field: value}), the key
+        being matched against key_field; a spec with its own importer returns
+        whatever that importer consumes. Raises RowError for a bad row.
+        """
+        raise NotImplementedError(f'{type(self).__name__} must implement clean()')
+
+    def make_importer(self, **kwargs):
+        return BulkImporter(self, **kwargs)
+
+    def make_result(self, dry_run=False):
+        return ImportResult(self, dry_run=dry_run)
+
+    def existing(self, keys):
+        """Maps each key already in the database to its row's current values, in one query."""
+        existing = {}
+        for values in self.model.objects.filter(**{f'{self.key_field}__in': keys}).values('pk', self.key_field, *self.update_fields):
+            existing.setdefault(values[self.key_field], []).append(values)
+        return existing
+
+    def create(self, objs):
+        self.model.objects.bulk_create(objs, ignore_conflicts=True)
+
+    def after_write(self, created_keys, updated_pks):
+        DataVersion.bump_on_commit(reference=True)
+
+
+class SupplementImport(ImportSpec):
+    model = Supplement
+    label = 'supplements'
+    update_fields = ('category', 'dosage_unit')
+    required_columns = ('name', 'category')  # dosage_unit is optional
+
+    def clean(self, row_number, row):
+        name = clean_text(row.get('name'))
+        if not name:
+            raise RowError(f"Row {row_number}: Missing or invalid supplement name.")
+        category = clean_text(row.get('category'))
+        if not category:
+            raise RowError(f"Row {row_number} (Name: {name}): Missing or invalid category.")
+        return name, {'category': category, 'dosage_unit': clean_text(row.get('dosage_unit')) or None}
+
+    def create(self, objs):
+        # A supplement created concurrently under the same (name, category) just gets this row's dosage unit
+        Supplement.objects.bulk_create(
+            objs, update_conflicts=True, unique_fields=['name', 'category'], update_fields=['dosage_unit'],
+        )
+
+    def after_write(self, created_keys, updated_pks):
+        created_pks = []
+        if created_keys:
+            created_pks = list(Supplement.objects.filter(name__in=created_keys).values_list('pk', flat=True))
+            # bulk_create skips the post_save receiver that gives each supplement its stats row
+            SupplementRatingStats.objects.bulk_create(
+                [SupplementRatingStats(supplement_id=pk) for pk in created_pks], ignore_conflicts=True,
+            )
+        DataVersion.bump_on_commit(created_pks + list(updated_pks))
+        invalidate_search_index()
+
+
+class ConditionImport(ImportSpec):
+    model = Condition
+    label = 'conditions/purposes'
+
+    def missing_columns_error(self, missing):
+        return "CSV must contain a 'name' column for conditions/purposes."
+
+    def clean(self, row_number, row):
+        if row.get('name') is None:
+            raise RowError(f"Row {row_number}: Missing or invalid condition name.")
+        name = clean_text(row['name'])
+        if not name:
+            raise RowError(f"Row {row_number}: Condition name cannot be empty after stripping whitespace.")
+        return name, {}
+
+
+class BrandImport(ImportSpec):
+    model = Brand
+    label = 'brands'
+
+    def missing_columns_error(self, missing):
+        return "CSV must contain a 'name' column for brands."
+
+    def clean(self, row_number, row):
+        if row.get('name') is None:
+            raise RowError(f"Row {row_number}: Missing or invalid brand name.")
+        name = clean_text(row['name'])
+        if not name:
+            raise RowError(f"Row {row_number}: Brand name cannot be empty after stripping whitespace.")
+        return name, {}
+
+    def after_write(self, created_keys, updated_pks):
+        super().after_write(created_keys, updated_pks)
+        if created_keys:
+            # bulk_create skips the post_save receiver that links ratings already naming a new brand
+            Brand.link_ratings(Brand.objects.filter(name__in=created_keys))
+
+
+SPECS = {
+    'supplements': SupplementImport(),
+    'conditions': ConditionImport(),
+    'brands': BrandImport(),
+}
+
+
+class ImportResult:
+    """Counts, row errors and (for dry runs) the per-key diff of one import."""
+
+    def __init__(self, spec, dry_run=False):
+        self.spec = spec
+        self.dry_run = dry_run
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicates = 0
+        self.row_errors = []
+        self.diff = {'create': [], 'update': [], 'skip': []}
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.unchanged + self.duplicates
+
+    @property
+    def message(self):
+        message = (
+            f"{self.processed} {self.spec.label} processed. "
+            f"{self.created} created, {self.updated} updated, {self.unchanged} unchanged."
+        )
+        if self.duplicates:
+            message += f" {self.duplicates} duplicate rows merged into a later row."
+        if self.dry_run:
+            message = f"Dry run, nothing was saved. {message}"
+        return message
+
+    @property
+    def status_code(self):
+        if not self.row_errors:
+            return status.HTTP_200_OK
+        if self.processed > 0:
+            return status.HTTP_207_MULTI_STATUS  # Partial success
+        return status.HTTP_400_BAD_REQUEST  # All rows failed or no valid data
+
+    def as_response_data(self):
+        data = {
+            'message': self.message,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'duplicates': self.duplicates,
+        }
+        if self.row_errors:
+            data['row_errors'] = self.row_errors
+        if self.dry_run:
+            data['dry_run'] = True
+            data['diff'] = self.diff
+        return data
+
+
+class BulkImporter:
+    """
+    Imports a CSV chunk by chunk. Each chunk is normalized and deduplicated in
+    memory (the last row for a key wins), diffed against the database with a
+    single query, then written with one bulk_create and one bulk_update in
+    its own short transaction. Unchanged rows are skipped without a write.
+    A dry run does everything but the writes and records the diff instead.
+    """
+
+    def __init__(self, spec, dry_run=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.spec = spec
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.result = spec.make_result(dry_run=dry_run)
+        # Dry runs write nothing, so later chunks diff against what earlier ones would have written
+        self._planned = {}
+
+    def check_header(self, file):
+        """Raises ImportFileError unless the file has the spec's columns and at least one row, reading only that far."""
+        with open_records(file) as (header, rows):
+            self.check_columns(header)
+            if next(rows, None) is None:
+                raise ImportFileError(EMPTY_CSV_ERROR if header is not None else EMPTY_FILE_ERROR)
+
+    def check_columns(self, columns):
+        # NDJSON has no header; its rows are checked one by one
+        if columns is None:
+            return
+        if not any(columns):
+            raise ImportFileError(EMPTY_CSV_ERROR)
+        missing = [column for column in self.spec.required_columns if column not in columns]
+        if missing:
+            raise ImportFileError(self.spec.missing_columns_error(missing))
+
+    def run(self, file, skip_chunks=0, on_chunk=None):
+        """
+        Imports every chunk after the first skip_chunks. With on_chunk, each
+        chunk runs in one transaction together with on_chunk(index, rows), so
+        a caller can commit its progress with the chunk's rows.
+        """
+        has_rows = False
+        for index, (columns, rows) in enumerate(read_chunks(file, self.chunk_size)):
+            if not has_rows:
+                self.check_columns(columns)
+                has_rows = True
+            if index < skip_chunks:
+                continue
+            if on_chunk is None:
+                self.import_chunk(rows)
+                continue
+            with transaction.atomic():
+                self.import_chunk(rows)
+                on_chunk(index, rows)
+        if not has_rows:
+            raise ImportFileError(EMPTY_FILE_ERROR if is_ndjson(file) else EMPTY_CSV_ERROR)
+        return self.result
+
+    def import_chunk(self, rows):
+        result = self.result
+        pending = {}
+        for row_number, row in rows:
+            try:
+                key, values = self.spec.clean(row_number, row)
+            except RowError as e:
+                result.row_errors.append(str(e))
+                continue
+            if key in pending:
+                result.duplicates += 1
+            pending[key] = (row_number, values)
+        if not pending:
+            return
+
+        existing = self.spec.existing(list(pending))
+        creates, updates = {}, {}
+        for key, (row_number, values) in pending.items():
+            if key in self._planned:
+                current = [self._planned[key]]
+            else:
+                current = existing.get(key)
+            if current and len(current) > 1:
+                result.row_errors.append(
+                    f"Row {row_number} (Name: {key}): Error - {len(current)} existing {self.spec.label} share this name."
+                )
+                continue
+            if not current:
+                creates[key] = (row_number, values)
+                continue
+            changes = {
+                field: {'from': current[0][field], 'to': value}
+                for field, value in values.items() if current[0][field] != value
+            }
+            if changes:
+                updates[key] = (row_number, current[0]['pk'], values, changes)
+            else:
+                result.unchanged += 1
+                if self.dry_run:
+                    result.diff['skip'].append(key)
+
+        if self.dry_run:
+            for key, (row_number, values) in creates.items():
+                result.diff['create'].append(key)
+                self._planned[key] = {'pk': None, **values}
+            for key, (row_number, pk, values, changes) in updates.items():
+                result.diff['update'].append({'name': key, 'changes': changes})
+                self._planned[key] = {'pk': pk, **values}
+        else:
+            try:
+                self.write(creates, updates)
+            except IntegrityError as e:
+                logger.error(f"Integrity error importing a chunk of {self.spec.label}: {e}")
+                result.row_errors.extend(
+                    f"Row {row_number} (Name: {key}): Could not process due to a database integrity issue. {e}"
+                    for key, (row_number, *_) in sorted({**creates, **updates}.items(), key=lambda item: item[1][0])
+                )
+                return
+        result.created += len(creates)
+        result.updated += len(updates)
+
+    def write(self, creates, updates):
+        model = self.spec.model
+        key_field = self.spec.key_field
+        with transaction.atomic():
+            if creates:
+                self.spec.create([model(**{key_field: key}, **values) for key, (_, values) in creates.items()])
+            if updates:
+                changed_fields = sorted({field for (_, _, _, changes) in updates.values() for field in changes})
+                model.objects.bulk_update(
+                    [model(pk=pk, **values) for (_, pk, values, _) in updates.values()], changed_fields,
+                )
+            if creates or updates:
+                self.spec.after_write(list(creates), [pk for (_, pk, _, _) in updates.values()])
@@ -1,6 +1,6 @@
 import django_filters
-from django.db.models import Q
-from .models import Supplement, Condition
+from django.db.models import Exists, OuterRef
+from .models import Brand, Supplement, Condition, Rating, SupplementConditionStats
 
 class SupplementFilter(django_filters.FilterSet):
     conditions = django_filters.CharFilter(method='filter_by_related_condition_names')
@@ -30,23 +30,24 @@ class SupplementFilter(django_filters.FilterSet):
         if not condition_names:
             return queryset
 
-        # Build the query path based on the filter name
-        if name == 'conditions': # This is for the 'Purpose' field
-            query_path_prefix = 'ratings__conditions__name__in'
-        elif name == 'benefits':
-            query_path_prefix = 'ratings__benefits__name__in'
-        elif name == 'side_effects':
-            query_path_prefix = 'ratings__side_effects__name__in'
-        else:
+        # Each role filter is answered by an EXISTS over the indexed condition stats cube
+        # instead of joining ratings -> M2M -> conditions and de-duplicating the result.
+        role = SupplementConditionStats.ROLE_FIELDS.get(name)
+        if role is None:
             return queryset # Should not happen if only registered for these three
 
-        query = Q(**{query_path_prefix: condition_names})
-        return queryset.filter(query).distinct()
+        matching_stats = SupplementConditionStats.objects.filter(
+            supplement=OuterRef('pk'),
+            role=role,
+            condition__name__in=condition_names,
+            rating_count__gt=0,
+        )
+        return queryset.filter(Exists(matching_stats))
 
     def filter_by_brands_names(self, queryset, name, value):
         """
-        Filters supplements to those that have at least one rating whose
-        'brands' CharField contains any of the provided brand names.
+        Filters supplements to those that have at least one rating linked to
+        any of the provided brand names (matched ignoring case, via Rating.linked_brands).
         Frontend sends comma-separated brand names.
         """
         if not value:
@@ -55,8 +56,8 @@ class SupplementFilter(django_filters.FilterSet):
         if not brand_names:
             return queryset
 
-        # Use icontains OR chain so that a rating with comma-separated brands matches
-        brand_q = Q()
-        for bn in brand_names:
-            brand_q |= Q(ratings__brands__icontains=bn)
-        return queryset.filter(brand_q).distinct()
\ No newline at end of file
+        brand_links = Rating.linked_brands.through.objects.filter(
+            rating__supplement=OuterRef('pk'),
+            brand__in=Brand.named(brand_names).values('id'),
+        )
+        return queryset.filter(Exists(brand_links))
\ No newline at end of file
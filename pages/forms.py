@@ -1,7 +1,17 @@
 from django import forms
+from .image_ingest import ImageRejected, validate_upload
 from .models import Profile
 
 class ProfileUpdateForm(forms.ModelForm):
     class Meta:
         model = Profile
-        fields = ['image'] 
\ No newline at end of file
+        fields = ['image']
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if image and hasattr(image, 'content_type'):
+            try:
+                validate_upload(image, Profile.image_profile)
+            except ImageRejected as e:
+                raise forms.ValidationError(str(e))
+        return image
@@ -0,0 +1,230 @@
+# pages/image_ingest.py
+
+import logging
+import tempfile
+import time
+import tracemalloc
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PIXELS = 50_000_000
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# Like Image.thumbnail's reducing_gap: reduce() stops at twice the target before the LANCZOS pass
+REDUCING_GAP = 2
+
+
+@lru_cache(maxsize=None)
+def pil_image():
+    """
+    PIL.Image, imported on first use so Pillow (and pillow-heif) stay out of
+    worker start-up; most requests never touch an image.
+    """
+    from PIL import Image
+
+    heif_supported()
+    return Image
+
+
+@lru_cache(maxsize=None)
+def heif_supported():
+    """Registers the optional pillow-heif plugin, without which HEIC/HEIF phone photos can't be decoded."""
+    try:
+        from pillow_heif import register_heif_opener
+    except ImportError:
+        return False
+    register_heif_opener()
+    return True
+
+
+class ImageRejected(ValueError):
+    """The upload is not an image we can decode, or it exceeds the use case's pixel budget."""
+
+
+class IngestProfile:
+    """How one use case (avatar, rating, comment) turns an upload into its stored WEBP."""
+
+    def __init__(self, name, max_size, quality, lossless_png=False, max_pixels=None):
+        self.name = name
+        self.max_size = max_size
+        self.quality = quality
+        self.lossless_png = lossless_png
+        self._max_pixels = max_pixels
+
+    @property
+    def max_pixels(self):
+        if self._max_pixels is not None:
+            return self._max_pixels
+        return getattr(settings, 'IMAGE_MAX_PIXELS', DEFAULT_MAX_PIXELS)
+
+    def __repr__(self):
+        return f'<IngestProfile {self.name} {self.max_size[0]}x{self.max_size[1]}>'
+
+
+PROFILES = {
+    'avatar': IngestProfile('avatar', (300, 300), quality=80),
+    'rating': IngestProfile('rating', (1280, 1024), quality=80, lossless_png=True),
+    'comment': IngestProfile('comment', (1024, 768), quality=75, lossless_png=True),
+}
+
+
+class IngestResult:
+    """
+    The encoded WEBP plus what it cost. `peak_raster_bytes` is the largest
+    decoded pixel buffer held at once, which dominates Pillow's memory use;
+    `peak_python_bytes` is only measured when tracing was requested.
+    """
+
+    def __init__(self, buffer, width, height, source_format, source_size, peak_raster_bytes,
+                 peak_python_bytes, elapsed):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.source_format = source_format
+        self.source_size = source_size
+        self.peak_raster_bytes = peak_raster_bytes
+        self.peak_python_bytes = peak_python_bytes
+        self.elapsed = elapsed
+
+    @property
+    def peak_memory(self):
+        return self.peak_raster_bytes + (self.peak_python_bytes or 0)
+
+
+def raster_bytes(img):
+    """Bytes Pillow holds for img's decoded pixels (bands are stored in 1-byte or 4-byte lanes)."""
+    bytes_per_band = 1 if img.mode in ('1', 'L', 'P', 'RGB', 'RGBA', 'CMYK', 'YCbCr', 'LA', 'PA', 'RGBX', 'RGBa') else 4
+    lanes = 4 if len(img.getbands()) > 1 else 1
+    return img.width * img.height * lanes * bytes_per_band
+
+
+def spool_to_tempfile(file):
+    """
+    Opens `file` (an upload or a stored FieldFile) as a seekable local file.
+    Uploads already on disk are reused; anything else is copied out in chunks,
+    so remote storage reads never sit in memory whole.
+    """
+    if hasattr(file, 'temporary_file_path'):
+        return open(file.temporary_file_path(), 'rb')
+    spooled = tempfile.TemporaryFile()
+    for chunk in file.chunks(SPOOL_CHUNK_SIZE):
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def check_dimensions(img, profile):
+    """Rejects images over the profile's pixel budget using only the decoded header."""
+    pixels = img.width * img.height
+    if pixels > profile.max_pixels:
+        raise ImageRejected(
+            f'Image is {img.width}x{img.height} ({pixels} pixels); the limit is {profile.max_pixels} pixels.'
+        )
+
+
+def open_checked(fp, profile):
+    """Image.open (header only) plus the pixel budget check."""
+    PILImage = pil_image()
+    try:
+        img = PILImage.open(fp)
+    except (PILImage.DecompressionBombError, PILImage.UnidentifiedImageError, OSError) as e:
+        raise ImageRejected(str(e)) from e
+    check_dimensions(img, profile)
+    return img
+
+
+def validate_upload(file, profile_name):
+    """
+    Cheap request-time check: reads only the image header of an upload and
+    raises ImageRejected if it cannot be decoded or has too many pixels.
+    """
+    profile = PROFILES[profile_name]
+    position = file.tell() if hasattr(file, 'tell') else None
+    try:
+        open_checked(file, profile)
+    finally:
+        if position is not None:
+            file.seek(position)
+
+
+def downscale(img, max_size):
+    """
+    Decodes img close to max_size: JPEG draft mode lets libjpeg decode at 1/2,
+    1/4 or 1/8 scale, other formats are box-reduced by an integer factor right
+    after decoding, then a LANCZOS pass produces the final size.
+    Returns (image, peak raster bytes).
+    """
+    target_width, target_height = max_size
+    if img.format == 'JPEG':
+        img.draft('RGB', (target_width * REDUCING_GAP, target_height * REDUCING_GAP))
+    img.load()
+    peak = raster_bytes(img)
+
+    factor = min(img.width // (target_width * REDUCING_GAP), img.height // (target_height * REDUCING_GAP))
+    if factor > 1:
+        img = img.reduce(factor)
+    if img.width > target_width or img.height > target_height:
+        img.thumbnail(max_size, pil_image().Resampling.LANCZOS)
+    return img, peak
+
+
+def encode(img, source_format, profile):
+    save_kwargs = {'quality': profile.quality}
+    if profile.lossless_png and source_format == 'PNG':
+        save_kwargs['lossless'] = True
+    if img.mode != 'RGB' and img.mode != 'RGBA':
+        keep_alpha = 'lossless' in save_kwargs or 'A' in img.getbands() or 'transparency' in img.info
+        img = img.convert('RGBA') if keep_alpha else img.convert('RGB')
+    buffer = BytesIO()
+    img.save(buffer, format='WEBP', **save_kwargs)
+    buffer.seek(0)
+    return buffer
+
+
+def ingest(file, profile_name, trace_memory=False):
+    """
+    Turns an uploaded or stored image into the WEBP for `profile_name`
+    ('avatar', 'rating' or 'comment'). The source is streamed to a temp file,
+    checked against the pixel budget before any pixels are decoded, and
+    decoded at reduced resolution where the format allows. Raises
+    ImageRejected for undecodable or oversized images.
+
+    trace_memory adds tracemalloc's peak for Python-side allocations (slow;
+    meant for benchmarks, and not safe with concurrent tracing).
+    """
+    profile = PROFILES[profile_name]
+    started = time.perf_counter()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with spool_to_tempfile(file) as fp:
+            img = open_checked(fp, profile)
+            source_format, source_size = img.format, img.size
+            try:
+                img, peak_raster = downscale(img, profile.max_size)
+            except (pil_image().DecompressionBombError, OSError, SyntaxError) as e:
+                raise ImageRejected(str(e)) from e
+            buffer = encode(img, source_format, profile)
+        peak_python = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    result = IngestResult(
+        buffer=buffer,
+        width=img.width,
+        height=img.height,
+        source_format=source_format,
+        source_size=source_size,
+        peak_raster_bytes=peak_raster,
+        peak_python_bytes=peak_python,
+        elapsed=time.perf_counter() - started,
+    )
+    logger.info(
+        f"Ingested {profile.name} image {source_format} {source_size[0]}x{source_size[1]} -> "
+        f"{result.width}x{result.height} in {result.elapsed:.3f}s, peak raster {peak_raster / 1048576:.1f} MiB"
+    )
+    return result
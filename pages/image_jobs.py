@@ -0,0 +1,214 @@
+# pages/image_jobs.py
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .image_ingest import ImageRejected, ingest
+from .image_variants import build_variants, delete_variant_files
+from .models import (
+    IMAGE_STATUS_FAILED, IMAGE_STATUS_READY, Comment, DataVersion, ImageProcessingJob, ImageVariant, MediaBlob,
+    Rating, comment_supplement_id,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THREADS = 2
+
+
+def thread_runner():
+    return getattr(settings, 'IMAGE_JOB_RUNNER', 'thread') == 'thread'
+
+
+def claim_job(job_id):
+    """Moves a pending job to running; False if another runner got there first."""
+    return ImageProcessingJob.objects.filter(pk=job_id, status=ImageProcessingJob.PENDING).update(
+        status=ImageProcessingJob.RUNNING,
+        attempts=F('attempts') + 1,
+        updated_at=timezone.now(),
+    ) == 1
+
+
+def bump_versions_for(instance):
+    # The swap is a queryset update, so the model signals that retire cached responses do not fire
+    if isinstance(instance, Rating):
+        DataVersion.bump_on_commit([instance.supplement_id])
+    elif isinstance(instance, Comment):
+        DataVersion.bump_on_commit([comment_supplement_id(instance)])
+    else:
+        # Avatars appear next to ratings and comments on every supplement
+        DataVersion.bump_on_commit(reference=True)
+
+
+def apply_job(job):
+    """
+    Converts the job's upload, renders its width variants and swaps it into
+    the row. The swap only happens while the row still points at the upload,
+    so a newer upload or a deleted row just discards the result. Returns True
+    when the row was updated.
+    """
+    model = apps.get_model(job.model_label)
+    instance = model.objects.filter(pk=job.object_id).first()
+    if instance is None or instance.image.name != job.source_name:
+        logger.info(f"Image job {job.pk}: {job.model_label} {job.object_id} no longer has {job.source_name}, skipping")
+        return False
+
+    storage = instance.image.storage
+    if job.content_hash:
+        blob = MediaBlob.acquire(job.content_hash, instance.image_profile)
+        if blob is not None:
+            # The same bytes finished processing after this upload arrived
+            return swap_to_blob(job, model, instance, blob)
+
+    buffer = ingest(instance.image, instance.image_profile).buffer
+
+    file_name_without_ext, _ = os.path.splitext(os.path.basename(job.source_name))
+    instance.image.save(file_name_without_ext + '.webp', ContentFile(buffer.getvalue()), save=False)
+    new_name = instance.image.name
+    buffer.seek(0)
+    variants = build_variants(buffer, new_name, storage)
+
+    updates = {'image': new_name, 'image_status': IMAGE_STATUS_READY}
+    updates.update(instance.processed_image_updates(buffer))
+    with transaction.atomic():
+        updated = model.objects.filter(pk=job.object_id, image=job.source_name).update(**updates)
+        if updated:
+            ImageVariant.objects.bulk_create(variants, ignore_conflicts=True)
+            if job.content_hash:
+                register_blob(job, instance, new_name, updates.get('public_image', ''))
+            bump_versions_for(instance)
+
+    if updated:
+        storage.delete(job.source_name)
+    else:
+        delete_variant_files(variants, storage)
+        storage.delete(new_name)
+    return bool(updated)
+
+
+def register_blob(job, instance, name, public_name):
+    """Records the processed image as a MediaBlob holding the row's reference."""
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(
+                content_hash=job.content_hash,
+                image_profile=instance.image_profile,
+                name=name,
+                public_name=public_name,
+                ref_count=1,
+            )
+    except IntegrityError:
+        # A concurrent job registered the same content first; this row keeps its own, untracked copy
+        pass
+
+
+def swap_to_blob(job, model, instance, blob):
+    """Points the row at an existing blob (already referenced by the caller) instead of processing its upload."""
+    updates = {'image': blob.name, 'image_status': IMAGE_STATUS_READY}
+    if hasattr(instance, 'public_image'):
+        updates['public_image'] = blob.public_name
+    with transaction.atomic():
+        updated = model.objects.filter(pk=job.object_id, image=job.source_name).update(**updates)
+        if updated:
+            bump_versions_for(instance)
+    if updated:
+        instance.image.storage.delete(job.source_name)
+    else:
+        MediaBlob.release(blob.name)
+    return bool(updated)
+
+
+def process_job(job_id):
+    """Claims and runs one job. Failures are retried up to MAX_ATTEMPTS, after which the row is marked failed."""
+    if not claim_job(job_id):
+        return False
+    job = ImageProcessingJob.objects.get(pk=job_id)
+    try:
+        apply_job(job)
+    except Exception as e:
+        logger.error(f"Image job {job.pk} ({job.model_label} {job.object_id}) failed: {e}", exc_info=True)
+        # A rejected image fails the same way every time, so it is not retried
+        if job.attempts < ImageProcessingJob.MAX_ATTEMPTS and not isinstance(e, ImageRejected):
+            status = ImageProcessingJob.PENDING
+        else:
+            status = ImageProcessingJob.FAILED
+            # The original upload stays in place and keeps being served
+            apps.get_model(job.model_label).objects.filter(pk=job.object_id, image=job.source_name).update(
+                image_status=IMAGE_STATUS_FAILED
+            )
+        ImageProcessingJob.objects.filter(pk=job.pk).update(status=status, error=str(e), updated_at=timezone.now())
+        if status == ImageProcessingJob.PENDING and thread_runner():
+            # Nothing else would pick the retry up
+            submit_job(job.pk)
+        return False
+    ImageProcessingJob.objects.filter(pk=job.pk).update(status=ImageProcessingJob.DONE, error='', updated_at=timezone.now())
+    return True
+
+
+def requeue_stale_jobs(stale_after):
+    """Returns jobs left running by a crashed runner to the queue (or fails them once out of attempts)."""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = ImageProcessingJob.objects.filter(status=ImageProcessingJob.RUNNING, updated_at__lt=cutoff)
+    stale.filter(attempts__gte=ImageProcessingJob.MAX_ATTEMPTS).update(
+        status=ImageProcessingJob.FAILED, error='Abandoned by runner', updated_at=timezone.now()
+    )
+    return stale.update(status=ImageProcessingJob.PENDING, updated_at=timezone.now())
+
+
+def pending_job_ids(limit):
+    return list(
+        ImageProcessingJob.objects.filter(status=ImageProcessingJob.PENDING)
+        .order_by('created_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def run_job_in_thread(job_id):
+    try:
+        return process_job(job_id)
+    except Exception as e:
+        logger.error(f"Image job {job_id} crashed: {e}", exc_info=True)
+        return False
+    finally:
+        # Connections are per thread; don't leave this worker's open
+        connections.close_all()
+
+
+def run_pending_jobs(limit=100, workers=1):
+    """Runs up to `limit` pending jobs on `workers` threads; returns how many completed."""
+    job_ids = pending_job_ids(limit)
+    if workers <= 1:
+        return sum(process_job(job_id) for job_id in job_ids)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-jobs') as executor:
+        return sum(executor.map(run_job_in_thread, job_ids))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide pool for the 'thread' runner (IMAGE_JOB_THREADS workers)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_JOB_THREADS', DEFAULT_THREADS),
+                    thread_name_prefix='image-jobs',
+                )
+    return _executor
+
+
+def submit_job(job_id):
+    """Hands a committed job to the in-process pool; the row stays pending for a worker if this process dies."""
+    get_executor().submit(run_job_in_thread, job_id)
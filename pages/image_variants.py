@@ -0,0 +1,81 @@
+# pages/image_variants.py
+
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .image_ingest import pil_image
+from .models import ImageVariant
+
+DEFAULT_WIDTHS = (160, 320, 640)
+VARIANT_QUALITY = 80
+
+
+def variant_widths():
+    return sorted(set(getattr(settings, 'IMAGE_VARIANT_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def build_variants(image_file, image_name, storage):
+    """
+    Writes a WEBP downscale of the processed image for each configured width
+    narrower than it and returns the unsaved ImageVariant rows, the full-size
+    image itself included as the widest entry.
+    """
+    PILImage = pil_image()
+    img = PILImage.open(image_file)
+    img.load()
+    full_width, full_height = img.size
+    file_name_without_ext, _ = os.path.splitext(image_name)
+
+    variants = []
+    for width in variant_widths():
+        if width >= full_width:
+            break
+        height = max(1, round(full_height * width / full_width))
+        buffer = BytesIO()
+        img.resize((width, height), PILImage.Resampling.LANCZOS).save(buffer, format='WEBP', quality=VARIANT_QUALITY)
+        name = storage.save(f'{file_name_without_ext}_w{width}.webp', ContentFile(buffer.getvalue()))
+        variants.append(ImageVariant(image_name=image_name, width=width, height=height, name=name))
+    variants.append(ImageVariant(image_name=image_name, width=full_width, height=full_height, name=image_name))
+    return variants
+
+
+def delete_variant_files(variants, storage):
+    for variant in variants:
+        if variant.name != variant.image_name:
+            storage.delete(variant.name)
+
+
+class VariantLookup:
+    """
+    ImageVariant rows by image name for one serialization pass. List
+    serializers prime it with every image on the page in one query; anything
+    not primed is fetched on first use.
+    """
+
+    def __init__(self):
+        self.by_image = {}
+
+    def prime(self, image_names):
+        missing = {name for name in image_names if name and name not in self.by_image}
+        if not missing:
+            return
+        for name in missing:
+            self.by_image[name] = []
+        for variant in ImageVariant.objects.filter(image_name__in=missing).order_by('width'):
+            self.by_image[variant.image_name].append(variant)
+
+    def variants(self, image_name):
+        if not image_name:
+            return []
+        self.prime([image_name])
+        return self.by_image[image_name]
+
+
+def get_variant_lookup(context):
+    """Returns the VariantLookup shared by every serializer rendering from this context."""
+    if 'image_variants' not in context:
+        context['image_variants'] = VariantLookup()
+    return context['image_variants']
@@ -0,0 +1,173 @@
+# pages/import_jobs.py
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .csv_import import SPECS, ImportFileError, count_rows
+from .models import ImportJob
+from .rating_import import RatingImport
+
+logger = logging.getLogger(__name__)
+
+# ImportJob.kind -> how that kind of file is imported
+IMPORT_SPECS = {**SPECS, 'ratings': RatingImport()}
+
+
+def thread_runner():
+    return getattr(settings, 'IMPORT_JOB_RUNNER', 'thread') == 'thread'
+
+
+def claim_job(job_id):
+    """Moves a pending job to running; False if another runner got there first."""
+    now = timezone.now()
+    return ImportJob.objects.filter(pk=job_id, status=ImportJob.PENDING).update(
+        status=ImportJob.RUNNING,
+        attempts=F('attempts') + 1,
+        run_started_at=now,
+        run_started_rows=F('rows_processed'),
+        updated_at=now,
+    ) == 1
+
+
+def import_result_for(job):
+    """The job's committed counts as an ImportResult."""
+    result = IMPORT_SPECS[job.kind].make_result()
+    result.created = job.created_count
+    result.updated = job.updated_count
+    result.unchanged = job.unchanged_count
+    result.duplicates = job.duplicate_count
+    return result
+
+
+def run_import(job):
+    """
+    Imports the job's file from its first uncommitted chunk. Each chunk's
+    rows and the job's progress commit in the same transaction.
+    """
+    importer = IMPORT_SPECS[job.kind].make_importer(chunk_size=job.chunk_size)
+    # Counts carry over from the chunks earlier runs committed
+    result = importer.result = import_result_for(job)
+
+    def save_progress(index, rows):
+        new_errors = list(result.row_errors)
+        result.row_errors.clear()
+        job.next_chunk = index + 1
+        job.rows_processed += len(rows)
+        job.created_count = result.created
+        job.updated_count = result.updated
+        job.unchanged_count = result.unchanged
+        job.duplicate_count = result.duplicates
+        job.row_error_count += len(new_errors)
+        job.row_errors = (job.row_errors + new_errors)[:ImportJob.MAX_STORED_ROW_ERRORS]
+        job.save(update_fields=[
+            'next_chunk', 'rows_processed', 'created_count', 'updated_count', 'unchanged_count',
+            'duplicate_count', 'row_error_count', 'row_errors', 'updated_at',
+        ])
+
+    with job.file.open('rb') as fp:
+        if job.total_rows is None:
+            job.total_rows = count_rows(fp)
+            job.save(update_fields=['total_rows', 'updated_at'])
+        importer.run(fp, skip_chunks=job.next_chunk, on_chunk=save_progress)
+
+
+def process_job(job_id):
+    """
+    Claims and runs one job. A chunk that fails rolls back on its own and is
+    retried, up to MAX_ATTEMPTS runs, from where the job left off; a file that
+    can't be read at all fails the job straight away.
+    """
+    if not claim_job(job_id):
+        return False
+    job = ImportJob.objects.get(pk=job_id)
+    try:
+        run_import(job)
+    except Exception as e:
+        logger.error(f"Import job {job.pk} ({job.kind}) failed at chunk {job.next_chunk}: {e}", exc_info=True)
+        if job.attempts < ImportJob.MAX_ATTEMPTS and not isinstance(e, ImportFileError):
+            status = ImportJob.PENDING
+        else:
+            status = ImportJob.FAILED
+        ImportJob.objects.filter(pk=job.pk).update(status=status, error=str(e), updated_at=timezone.now())
+        if status == ImportJob.PENDING and thread_runner():
+            # Nothing else would pick the retry up
+            submit_job(job.pk)
+        return False
+    # The upload is only kept while the job may still need it
+    file_name = job.file.name
+    ImportJob.objects.filter(pk=job.pk).update(
+        status=ImportJob.DONE, error='', file='', finished_at=timezone.now(), updated_at=timezone.now()
+    )
+    job.file.storage.delete(file_name)
+    return True
+
+
+def resume_job(job):
+    """Puts a failed job back in the queue; it continues from its first uncommitted chunk."""
+    if not ImportJob.objects.filter(pk=job.pk, status=ImportJob.FAILED).update(
+        status=ImportJob.PENDING, attempts=0, error='', updated_at=timezone.now()
+    ):
+        return False
+    if thread_runner():
+        transaction.on_commit(lambda: submit_job(job.pk))
+    return True
+
+
+def requeue_stale_jobs(stale_after):
+    """Returns jobs left running by a crashed runner to the queue (or fails them once out of attempts)."""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = ImportJob.objects.filter(status=ImportJob.RUNNING, updated_at__lt=cutoff)
+    stale.filter(attempts__gte=ImportJob.MAX_ATTEMPTS).update(
+        status=ImportJob.FAILED, error='Abandoned by runner', updated_at=timezone.now()
+    )
+    return stale.update(status=ImportJob.PENDING, updated_at=timezone.now())
+
+
+def pending_job_ids(limit):
+    return list(
+        ImportJob.objects.filter(status=ImportJob.PENDING)
+        .order_by('created_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def run_pending_jobs(limit=10):
+    """Runs up to `limit` pending jobs one after another; returns how many completed."""
+    return sum(process_job(job_id) for job_id in pending_job_ids(limit))
+
+
+def run_job_in_thread(job_id):
+    try:
+        return process_job(job_id)
+    except Exception as e:
+        logger.error(f"Import job {job_id} crashed: {e}", exc_info=True)
+        return False
+    finally:
+        # Connections are per thread; don't leave this worker's open
+        connections.close_all()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide single worker for the 'thread' runner, so imports in one process run one at a time."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='import-jobs')
+    return _executor
+
+
+def submit_job(job_id):
+    """Hands a committed job to the in-process worker; the row stays pending for a runner if this process dies."""
+    get_executor().submit(run_job_in_thread, job_id)
@@ -0,0 +1,78 @@
+import os
+import resource
+import tempfile
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from PIL import Image as PILImage
+
+from pages.image_ingest import PROFILES, ImageRejected, heif_supported, ingest
+
+
+def noise_image(size, mode):
+    bands = [PILImage.effect_noise(size, 64) for _ in PILImage.new(mode, (1, 1)).getbands()]
+    return PILImage.merge(mode, bands)
+
+
+class Command(BaseCommand):
+    help = 'Times pages.image_ingest on large synthetic JPEG, PNG and HEIC-like uploads and reports peak memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='*', default=list(PROFILES), choices=list(PROFILES))
+        parser.add_argument('--jpeg-size', default='8000x6000', help='WIDTHxHEIGHT of the JPEG input.')
+        parser.add_argument('--png-size', default='6000x4000', help='WIDTHxHEIGHT of the RGBA PNG input.')
+
+    def build_inputs(self, directory, options):
+        def size(value):
+            width, height = value.lower().split('x')
+            return int(width), int(height)
+
+        inputs = []
+        path = os.path.join(directory, 'large.jpg')
+        noise_image(size(options['jpeg_size']), 'RGB').save(path, format='JPEG', quality=90)
+        inputs.append(('jpeg', path))
+
+        path = os.path.join(directory, 'large.png')
+        noise_image(size(options['png_size']), 'RGBA').save(path, format='PNG', compress_level=1)
+        inputs.append(('png', path))
+
+        # A 12 MP phone photo. Without pillow-heif it is written as lossless WEBP,
+        # which like HEIC has no reduced-resolution decode and is fully decoded.
+        phone_photo = noise_image((4032, 3024), 'RGB')
+        if heif_supported():
+            path = os.path.join(directory, 'photo.heic')
+            phone_photo.save(path, format='HEIF')
+            inputs.append(('heic', path))
+        else:
+            path = os.path.join(directory, 'photo.webp')
+            phone_photo.save(path, format='WEBP', lossless=True, method=0)
+            inputs.append(('heic-like (webp)', path))
+        return inputs
+
+    def handle(self, *args, **options):
+        mib = 1024 * 1024
+        with tempfile.TemporaryDirectory() as directory:
+            inputs = self.build_inputs(directory, options)
+            self.stdout.write(
+                f"{'input':<18} {'profile':<8} {'source':>11} {'output':>10} {'seconds':>8} "
+                f"{'raster MiB':>10} {'full MiB':>9} {'python MiB':>10} {'out KiB':>8}"
+            )
+            for label, path in inputs:
+                with PILImage.open(path) as img:
+                    width, height = img.size
+                    full_decode = width * height * 4 / mib
+                for profile_name in options['profiles']:
+                    with open(path, 'rb') as fp:
+                        try:
+                            result = ingest(File(fp, name=os.path.basename(path)), profile_name, trace_memory=True)
+                        except ImageRejected as e:
+                            self.stdout.write(f'{label:<18} {profile_name:<8} rejected: {e}')
+                            continue
+                    self.stdout.write(
+                        f"{label:<18} {profile_name:<8} {f'{width}x{height}':>11} "
+                        f"{f'{result.width}x{result.height}':>10} {result.elapsed:>8.3f} "
+                        f"{result.peak_raster_bytes / mib:>10.1f} {full_decode:>9.1f} "
+                        f"{result.peak_python_bytes / mib:>10.1f} {len(result.buffer.getvalue()) / 1024:>8.1f}"
+                    )
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(f'Process peak RSS {peak_rss:.0f} MiB (includes building the inputs).'))
@@ -0,0 +1,97 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Imports that are expensive enough to matter at worker start-up
+HEAVY_MODULES = ('pandas', 'numpy', 'PIL.Image', 'pillow_heif', 'google.oauth2.id_token', 'boto3', 'botocore')
+
+# Runs in a fresh interpreter: boots Django the way a WSGI worker does and
+# loads the URLconf (and with it every view module), then reports.
+BOOT_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+get_wsgi_application()
+get_resolver().url_patterns
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+class Command(BaseCommand):
+    help = (
+        'Boots Django in fresh worker processes and reports boot time, peak RSS and which heavy '
+        'modules were imported. Save a run with --save and compare a later one with --baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--save', metavar='FILE', help='Write this run\'s results to FILE as JSON.')
+        parser.add_argument('--baseline', metavar='FILE', help='Compare against results saved with --save.')
+        parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                            help='Also list the N slowest imports (cumulative, via python -X importtime).')
+
+    def boot(self, *extra_args):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        completed = subprocess.run(
+            [sys.executable, *extra_args, '-c', BOOT_SCRIPT],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+    def handle(self, *args, **options):
+        samples = [self.boot()[0] for _ in range(options['runs'])]
+        result = {
+            'runs': len(samples),
+            'median_seconds': statistics.median(sample['seconds'] for sample in samples),
+            'min_seconds': min(sample['seconds'] for sample in samples),
+            'median_rss_mib': statistics.median(sample['rss_mib'] for sample in samples),
+            'heavy_modules': samples[-1]['heavy_modules'],
+        }
+
+        self.stdout.write(
+            f"{result['runs']} boots: median {result['median_seconds']:.3f}s (min {result['min_seconds']:.3f}s), "
+            f"median peak RSS {result['median_rss_mib']:.1f} MiB"
+        )
+        self.stdout.write(f"Heavy modules loaded at boot: {', '.join(result['heavy_modules']) or 'none'}")
+
+        if options['baseline']:
+            with open(options['baseline']) as fp:
+                baseline = json.load(fp)
+            self.stdout.write(
+                f"vs baseline: boot {result['median_seconds'] - baseline['median_seconds']:+.3f}s "
+                f"({baseline['median_seconds']:.3f}s -> {result['median_seconds']:.3f}s), "
+                f"RSS {result['median_rss_mib'] - baseline['median_rss_mib']:+.1f} MiB "
+                f"({baseline['median_rss_mib']:.1f} -> {result['median_rss_mib']:.1f} MiB)"
+            )
+            dropped = sorted(set(baseline['heavy_modules']) - set(result['heavy_modules']))
+            if dropped:
+                self.stdout.write(f"No longer loaded at boot: {', '.join(dropped)}")
+
+        if options['importtime']:
+            _, stderr = self.boot('-X', 'importtime')
+            timings = []
+            for line in stderr.splitlines():
+                if not line.startswith('import time:') or 'cumulative' in line:
+                    continue
+                _, cumulative, name = line[len('import time:'):].split('|')
+                # Only top-level packages, so nested imports aren't counted twice
+                if not name.startswith('  ') and name.strip():
+                    timings.append((int(cumulative), name.strip()))
+            self.stdout.write("Slowest top-level imports:")
+            for microseconds, name in sorted(timings, reverse=True)[:options['importtime']]:
+                self.stdout.write(f"  {microseconds / 1000:>8.1f} ms  {name}")
+
+        if options['save']:
+            with open(options['save'], 'w') as fp:
+                json.dump(result, fp, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved to {options['save']}"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from pages.image_variants import build_variants
+from pages.models import IMAGE_STATUS_PROCESSING, Comment, ImageVariant, Profile, Rating
+
+
+class Command(BaseCommand):
+    help = 'Renders width variants for processed images stored before image_variants existed.'
+
+    def handle(self, *args, **options):
+        has_variants = ImageVariant.objects.filter(image_name=OuterRef('image'))
+        for model in (Profile, Rating, Comment):
+            queryset = (
+                model.objects.exclude(image='').exclude(image__isnull=True)
+                .exclude(image='profile_pics/default.jpg')
+                .exclude(image_status=IMAGE_STATUS_PROCESSING)
+                .exclude(Exists(has_variants))
+            )
+            written = 0
+            for instance in queryset.iterator():
+                try:
+                    with instance.image.open('rb'):
+                        variants = build_variants(instance.image, instance.image.name, instance.image.storage)
+                except Exception as e:
+                    self.stderr.write(f'{model.__name__} {instance.pk} ({instance.image.name}): {e}')
+                    continue
+                ImageVariant.objects.bulk_create(variants, ignore_conflicts=True)
+                written += 1
+            self.stdout.write(self.style.SUCCESS(f'Built variants for {written} {model._meta.verbose_name_plural}.'))
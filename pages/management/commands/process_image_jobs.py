@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pages.image_jobs import requeue_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Converts queued Profile/Rating/Comment uploads to their processed WEBP images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Threads converting images in parallel.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Jobs fetched per poll.')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help='Seconds after which a running job is assumed abandoned and requeued.'
+        )
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit instead of polling.')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            requeued = requeue_stale_jobs(options['stale_after'])
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale jobs.')
+            processed = run_pending_jobs(limit=options['batch_size'], workers=options['workers'])
+            total += processed
+            if processed:
+                self.stdout.write(f'Processed {processed} images.')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} images in total.'))
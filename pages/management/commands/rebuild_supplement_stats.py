@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from pages.models import SupplementConditionStats, SupplementRatingStats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored per-supplement and per-condition rating statistics from the ratings table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'supplement_ids', nargs='*', type=int,
+            help='Only rebuild these supplements (default: all supplements).'
+        )
+
+    def handle(self, *args, **options):
+        supplement_ids = options['supplement_ids'] or None
+        written = SupplementRatingStats.rebuild(supplement_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating stats for {written} supplements.'))
+        written = SupplementConditionStats.rebuild(supplement_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} supplement/condition stats rows.'))
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.19 on 2026-10-16 22:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Sum
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Supplement = apps.get_model('pages', 'Supplement')
+    Rating = apps.get_model('pages', 'Rating')
+    SupplementRatingStats = apps.get_model('pages', 'SupplementRatingStats')
+
+    aggregates = {
+        row['supplement_id']: row
+        for row in Rating.objects.values('supplement_id').annotate(
+            total=Sum('score'), count=Count('id'), last=Max('created_at')
+        )
+    }
+    rows = []
+    for supplement_id in Supplement.objects.values_list('id', flat=True):
+        row = aggregates.get(supplement_id)
+        count = row['count'] if row else 0
+        total = row['total'] if row else 0
+        rows.append(SupplementRatingStats(
+            supplement_id=supplement_id,
+            rating_sum=total,
+            rating_count=count,
+            avg_rating=round(total / count, 2) if count else None,
+            last_rated_at=row['last'] if row else None,
+        ))
+    SupplementRatingStats.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0016_merge_20250818_1757'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplementRatingStats',
+            fields=[
+                ('supplement', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='pages.supplement')),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('avg_rating', models.FloatField(blank=True, null=True)),
+                ('last_rated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-avg_rating', '-rating_count'], name='pages_stats_ranking_idx'), models.Index(fields=['-rating_count'], name='pages_stats_count_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
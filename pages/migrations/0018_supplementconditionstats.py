@@ -0,0 +1,58 @@
+# Generated by Django 4.2.19 on 2026-10-16 22:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+
+
+ROLE_FIELDS = {
+    'conditions': 'purpose',
+    'benefits': 'benefit',
+    'side_effects': 'side_effect',
+}
+
+
+def backfill_condition_stats(apps, schema_editor):
+    Rating = apps.get_model('pages', 'Rating')
+    SupplementConditionStats = apps.get_model('pages', 'SupplementConditionStats')
+
+    rows = []
+    for field_name, role in ROLE_FIELDS.items():
+        through = Rating._meta.get_field(field_name).remote_field.through
+        for row in through.objects.values('rating__supplement_id', 'condition_id').annotate(
+            total=Sum('rating__score'), count=Count('rating_id')
+        ):
+            rows.append(SupplementConditionStats(
+                supplement_id=row['rating__supplement_id'],
+                condition_id=row['condition_id'],
+                role=role,
+                rating_sum=row['total'],
+                rating_count=row['count'],
+            ))
+    SupplementConditionStats.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0017_supplementratingstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplementConditionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('purpose', 'Purpose'), ('benefit', 'Benefit'), ('side_effect', 'Side Effect')], max_length=20)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('condition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supplement_stats', to='pages.condition')),
+                ('supplement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='condition_stats', to='pages.supplement')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['role', 'condition', 'supplement'], name='pages_cond_stats_lookup_idx')],
+                'unique_together': {('supplement', 'condition', 'role')},
+            },
+        ),
+        migrations.RunPython(backfill_condition_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.19 on 2026-10-16 22:59
+
+from django.db import DatabaseError, migrations, models, transaction
+import django.db.models.deletion
+
+
+TRIGRAM_INDEXES = [
+    ('pages_supplement_name_trgm', 'pages_supplement', 'name'),
+    ('pages_supplement_category_trgm', 'pages_supplement', 'category'),
+    ('pages_supplementalias_alias_trgm', 'pages_supplementalias', 'alias'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # pg_trgm GIN indexes back word-similarity and (I)LIKE lookups used by search; PostgreSQL only.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic():
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        # Extension not installed on this server; search falls back to the in-process index.
+        return
+    for index_name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index_name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0018_supplementconditionstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplementAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=255, unique=True)),
+                ('supplement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='pages.supplement')),
+            ],
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.19 on 2026-10-16 23:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_comment_threads(apps, schema_editor):
+    Comment = apps.get_model('pages', 'Comment')
+    Rating = apps.get_model('pages', 'Rating')
+
+    supplement_by_rating = dict(Rating.objects.values_list('id', 'supplement_id'))
+    rows = {
+        comment_id: (rating_id, parent_id)
+        for comment_id, rating_id, parent_id in Comment.objects.values_list('id', 'rating_id', 'parent_comment_id')
+    }
+
+    def find_root(comment_id):
+        # Top-most rating on the reply chain; replies created by the API also carry it directly
+        root_rating_id = None
+        seen = set()
+        while comment_id is not None and comment_id in rows and comment_id not in seen:
+            seen.add(comment_id)
+            rating_id, parent_id = rows[comment_id]
+            if rating_id is not None:
+                root_rating_id = rating_id
+            comment_id = parent_id
+        return root_rating_id
+
+    updates = []
+    for comment_id in rows:
+        root_rating_id = find_root(comment_id)
+        if root_rating_id is not None:
+            updates.append(Comment(
+                id=comment_id,
+                root_rating_id=root_rating_id,
+                supplement_id=supplement_by_rating.get(root_rating_id),
+            ))
+    Comment.objects.bulk_update(updates, ['root_rating', 'supplement'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0020_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='root_rating',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='pages.rating'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='supplement',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='pages.supplement'),
+        ),
+        migrations.RunPython(backfill_comment_threads, migrations.RunPython.noop),
+    ]
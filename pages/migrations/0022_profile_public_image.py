@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-16 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0021_comment_root_rating_supplement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='public_image',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.19 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0024_imagevariant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageprocessingjob',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('image_profile', models.CharField(max_length=16)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('public_name', models.CharField(blank=True, default='', max_length=255)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('content_hash', 'image_profile')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-16 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0026_import_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='kind',
+            field=models.CharField(choices=[('supplements', 'Supplements'), ('conditions', 'Conditions/purposes'), ('brands', 'Brands'), ('ratings', 'Ratings')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.19 on 2026-10-16 23:43
+
+from django.db import migrations, models
+
+
+def link_existing_brands(apps, schema_editor):
+    Brand = apps.get_model('pages', 'Brand')
+    Rating = apps.get_model('pages', 'Rating')
+    Link = Rating.linked_brands.through
+
+    # Same matching as Rating.sync_brand_links: comma-separated names, case-insensitive
+    brand_ids = {name.lower(): brand_id for brand_id, name in Brand.objects.values_list('id', 'name')}
+    links = []
+    ratings = Rating.objects.exclude(brands__isnull=True).exclude(brands='').values_list('id', 'brands')
+    for rating_id, text in ratings:
+        linked = {brand_ids[name.strip().lower()] for name in text.split(',') if name.strip().lower() in brand_ids}
+        links.extend(Link(rating_id=rating_id, brand_id=brand_id) for brand_id in linked)
+    Link.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0027_import_job_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='linked_brands',
+            field=models.ManyToManyField(blank=True, related_name='ratings', to='pages.brand'),
+        ),
+        migrations.RunPython(link_existing_brands, migrations.RunPython.noop),
+    ]
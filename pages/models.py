@@ -3,21 +3,142 @@ from django.contrib.auth.models import User
 import uuid
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.core.files.base import ContentFile
-from PIL import Image as PILImage
-from io import BytesIO
-import os
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Sum
+from django.db.models.functions import Lower
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator, MaxValueValidator
 import logging
+from .storage import get_public_storage, public_media_enabled, save_content_addressed
+from .uploads import upload_sha256
 
 logger = logging.getLogger(__name__)
 
+# Lifecycle of an uploaded image: stored as-is and 'processing' until the
+# background job has written the converted file ('' when there is no upload)
+IMAGE_STATUS_PROCESSING = 'processing'
+IMAGE_STATUS_READY = 'ready'
+IMAGE_STATUS_FAILED = 'failed'
+IMAGE_STATUS_CHOICES = [
+    (IMAGE_STATUS_PROCESSING, 'Processing'),
+    (IMAGE_STATUS_READY, 'Ready'),
+    (IMAGE_STATUS_FAILED, 'Failed'),
+]
 
-class Profile(models.Model):
+
+class TrackedFieldsMixin:
+    """
+    Remembers the column values an instance was loaded with (in from_db), so
+    save() can tell what changed without re-reading the row, and writes only
+    the changed columns (plus auto_now timestamps) via update_fields. A save
+    that changes nothing writes nothing.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._current_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            self._loaded_values = self._current_values()
+        elif '_loaded_values' in self.__dict__ and self._loaded_values is not None:
+            # Only the columns just re-read; the others keep any unsaved assignment
+            attnames = {self._meta.get_field(name).attname for name in fields}
+            self._loaded_values.update(
+                (name, value) for name, value in self._current_values().items() if name in attnames
+            )
+
+    @staticmethod
+    def _comparable(field, value):
+        if isinstance(field, models.FileField):
+            return (getattr(value, 'name', value) or '')
+        return value
+
+    def _current_values(self):
+        return {
+            field.attname: self._comparable(field, self.__dict__[field.attname])
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def get_loaded_values(self):
+        """
+        {attname: value} as last loaded or saved; read from the database for an
+        instance that was built with a pk rather than loaded. None if that row is gone.
+        """
+        if not hasattr(self, '_loaded_values'):
+            fields = [field.attname for field in self._meta.concrete_fields]
+            row = type(self)._base_manager.filter(pk=self.pk).values(*fields).first()
+            self._loaded_values = None if row is None else {
+                field.attname: self._comparable(field, row[field.attname]) for field in self._meta.concrete_fields
+            }
+        return self._loaded_values
+
+    def has_changed(self, name):
+        field = self._meta.get_field(name)
+        loaded = self.get_loaded_values()
+        if loaded is None:
+            return True
+        if field.attname not in self.__dict__:
+            return False  # still deferred, so never assigned
+        return field.attname not in loaded or loaded[field.attname] != self._comparable(field, self.__dict__[field.attname])
+
+    def changed_fields(self):
+        loaded = self.get_loaded_values()
+        if loaded is None:
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and self.has_changed(field.name)
+        ]
+
+    def save(self, *args, **kwargs):
+        if (not args and self.pk is not None and not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert') and not kwargs.get('force_update')):
+            changed = self.changed_fields()
+            if changed is not None:
+                if changed:
+                    changed += [
+                        field.name for field in self._meta.concrete_fields
+                        if getattr(field, 'auto_now', False) and field.name not in changed
+                    ]
+                kwargs['update_fields'] = changed
+        super().save(*args, **kwargs)
+        self._loaded_values = self._current_values()
+
+
+def attach_uploaded_image(instance):
+    """
+    Called from save() when instance.image holds a fresh upload. If the same
+    bytes were already processed for this use case, the row takes a reference
+    on that MediaBlob and nothing is stored or processed again. Otherwise the
+    upload is stored as-is and marked 'processing'. Returns True when an
+    ImageProcessingJob is needed.
+    """
+    instance._upload_hash = upload_sha256(instance.image.file)
+    blob = MediaBlob.acquire(instance._upload_hash, instance.image_profile)
+    if blob is None:
+        instance.image_status = IMAGE_STATUS_PROCESSING
+        return True
+    instance.image = blob.name
+    instance.image_status = IMAGE_STATUS_READY
+    if hasattr(instance, 'public_image'):
+        instance.public_image = blob.public_name
+    return False
+
+
+class Profile(TrackedFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.ImageField(default='profile_pics/default.jpg', upload_to='profile_pics/')
+    # Content-addressed copy of the processed avatar in public storage (PUBLIC_MEDIA_ENABLED)
+    public_image = models.CharField(max_length=255, blank=True, default='')
+    image_status = models.CharField(max_length=12, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
+    image_profile = 'avatar'  # pages.image_ingest.PROFILES entry used to process uploads
     chronic_conditions = models.ManyToManyField('Condition', blank=True, related_name='user_profiles')
 
     def __str__(self):
@@ -26,16 +147,17 @@ class Profile(models.Model):
     def save(self, *args, **kwargs):
         logger.debug(f"Starting Profile.save() for user: {self.user.username}")
         process_image = False
+        previous_image_name = None
         if self.pk:
-            try:
-                old_instance = Profile.objects.get(pk=self.pk)
-                if old_instance.image != self.image:
-                    logger.debug("Profile image has changed. Scheduling for processing.")
-                    process_image = True
-            except Profile.DoesNotExist:
+            loaded = self.get_loaded_values()
+            if loaded is None:
                 logger.warning(f"Profile with pk={self.pk} not found, but pk exists. Assuming new image for processing.")
                 if self.image:
                     process_image = True
+            elif self.has_changed('image'):
+                logger.debug("Profile image has changed. Scheduling for processing.")
+                process_image = True
+                previous_image_name = loaded['image']
         elif self.image:
             logger.debug("New profile instance with an image. Scheduling for processing.")
             process_image = True
@@ -44,54 +166,42 @@ class Profile(models.Model):
         if self.image and self.image.name and 'default.jpg' in self.image.name:
             logger.debug("Image is 'default.jpg', skipping processing.")
             process_image = False
+            self.public_image = ''
 
         # An uploaded file will have a 'file' attribute. An image from the DB won't until opened.
         # Only check for the presence of a file handle if we actually intend to process the image.
+        enqueue_processing = False
         if process_image and hasattr(self.image, 'file'):
-            try:
-                logger.info(f"Processing profile image for {self.user.username}. Original name: {self.image.name}")
-                img = PILImage.open(self.image)
-                logger.debug(f"Image opened with Pillow. Format: {img.format}, Size: {img.size}, Mode: {img.mode}")
-
-                if img.height > 300 or img.width > 300:
-                    output_size = (300, 300)
-                    logger.debug(f"Resizing image to {output_size}")
-                    img.thumbnail(output_size, PILImage.Resampling.LANCZOS)
-                
-                buffer = BytesIO()
-                save_format = 'WEBP'
-                save_kwargs = {'quality': 80}
-                
-                if img.mode != 'RGB' and img.mode != 'RGBA':
-                        logger.warning(f"Image mode is {img.mode}. Converting to RGBA for WEBP saving.")
-                        img = img.convert('RGBA') if save_format == 'WEBP' else img.convert('RGB')
-
-                logger.debug(f"Saving processed image to buffer in {save_format} format.")
-                img.save(buffer, format=save_format, **save_kwargs)
-                
-                file_name_without_ext, _ = os.path.splitext(self.image.name)
-                new_file_name = file_name_without_ext + '.webp'
-                logger.debug(f"New file name will be: {new_file_name}")
-                
-                # Replace the in-memory file with the processed version before saving
-                self.image.save(new_file_name, ContentFile(buffer.getvalue()), save=False)
-                logger.info(f"Successfully processed and replaced image in memory for {self.user.username}.")
-            except Exception as e:
-                logger.error(f"Error processing profile image for {self.user.username}: {e}", exc_info=True)
+            logger.info(f"New profile image for {self.user.username}. Original name: {self.image.name}")
+            self.public_image = ''
+            enqueue_processing = attach_uploaded_image(self)
 
         logger.debug(f"Calling super().save() for profile of {self.user.username}")
         super().save(*args, **kwargs)
+        if enqueue_processing:
+            ImageProcessingJob.enqueue(self)
+        if previous_image_name:
+            MediaBlob.release_on_commit(previous_image_name)
+
+    def processed_image_updates(self, buffer):
+        """Extra columns written alongside the processed image."""
+        if not public_media_enabled():
+            return {'public_image': ''}
+        public_image = save_content_addressed(buffer.getvalue(), 'avatars', 'webp')
+        logger.debug(f"Stored public avatar copy at {public_image}")
+        return {'public_image': public_image}
 
 
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     if created:
-        Profile.objects.create(user=instance)
-    else:
+        instance.profile = Profile.objects.create(user=instance)
+    elif not User.profile.is_cached(instance):
         # For existing users (not newly created), ensure a profile exists.
-        Profile.objects.get_or_create(user=instance)
+        instance.profile = Profile.objects.get_or_create(user=instance)[0]
     
     # Now that the profile is guaranteed to exist, call save() on it.
+    # Profile tracks its loaded values, so this only writes if something changed.
     try:
         instance.profile.save()
     except Exception as e:
@@ -110,6 +220,15 @@ class Supplement(models.Model):
         unique_together = ('name', 'category')
 
 
+class SupplementAlias(models.Model):
+    """Shorthand or alternate name that search resolves to a supplement (e.g. "Vit D")."""
+    supplement = models.ForeignKey(Supplement, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return f'{self.alias} -> {self.supplement.name}'
+
+
 class Condition(models.Model):
     name = models.CharField(max_length=255, unique=True)
 
@@ -117,7 +236,28 @@ class Condition(models.Model):
         return self.name
 
 
-class Rating(models.Model):
+def split_brand_names(text):
+    """Brand names in a rating's comma-separated brands text, stripped, without repeats."""
+    names = []
+    for name in (text or '').split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def replace_brand_name(text, old_name, new_name=None):
+    """brands text with old_name (any case) swapped for new_name, or dropped when new_name is None."""
+    names = []
+    for name in split_brand_names(text):
+        if name.lower() == old_name.lower():
+            name = new_name
+        if name and name not in names:
+            names.append(name)
+    return ', '.join(names)
+
+
+class Rating(TrackedFieldsMixin, models.Model):
     FREQUENCY_CHOICES = [
         ('day', 'Per Day'),
         ('week', 'Per Week'),
@@ -140,60 +280,366 @@ class Rating(models.Model):
         blank=True,
         null=True
     )
+    # Comma-separated text as the user entered it; what the API reads and writes
     brands = models.CharField(max_length=255, blank=True, null=True)
+    # The Brand rows that text names, kept in step by save() and sync_brand_links(), for indexed brand filters
+    linked_brands = models.ManyToManyField('Brand', related_name='ratings', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     upvotes = models.PositiveIntegerField(default=0)
     is_edited = models.BooleanField(default=False)
     image = models.ImageField(upload_to='ratings/', blank=True, null=True)
+    image_status = models.CharField(max_length=12, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
+    image_profile = 'rating'
 
     def __str__(self):
         return f'{self.user.username} - {self.supplement.name} - {self.score}'
 
     def save(self, *args, **kwargs):
         process_image = False
+        previous_image_name = None
         if self.pk:
-            try:
-                old_instance = Rating.objects.get(pk=self.pk)
-                if old_instance.image != self.image:
-                    process_image = True
-            except Rating.DoesNotExist:
+            loaded = self.get_loaded_values()
+            if self.has_changed('image'):
                 process_image = True
+                previous_image_name = loaded['image'] if loaded else None
         elif self.image:
             process_image = True
+        relink_brands = self.pk is None or self.has_changed('brands')
 
+        enqueue_processing = False
         if process_image and self.image and hasattr(self.image.file, 'content_type'):
-            try:
-                img = PILImage.open(self.image)
-                original_format = img.format
-
-                max_width = 1280
-                max_height = 1024
-                img.thumbnail((max_width, max_height), PILImage.Resampling.LANCZOS)
-
-                buffer = BytesIO()
-                save_format = 'WEBP'
-                save_kwargs = {'quality': 80}
-
-                if original_format == 'PNG':
-                    save_kwargs['lossless'] = True
-                
-                if img.mode != 'RGB' and img.mode != 'RGBA':
-                    img = img.convert('RGBA') if save_format == 'WEBP' and 'lossless' in save_kwargs else img.convert('RGB')
-
-                img.save(buffer, format=save_format, **save_kwargs)
-                
-                file_name_without_ext, _ = os.path.splitext(self.image.name)
-                new_file_name = file_name_without_ext + '.webp'
-                
-                self.image.save(new_file_name, ContentFile(buffer.getvalue()), save=False)
-            except Exception as e:
-                print(f"Error processing image for Rating {self.pk}: {e}")
-        
+            enqueue_processing = attach_uploaded_image(self)
+        elif process_image and not self.image:
+            self.image_status = ''
+
         super().save(*args, **kwargs)
+        if relink_brands:
+            Rating.sync_brand_links([self])
+        if enqueue_processing:
+            ImageProcessingJob.enqueue(self)
+        if previous_image_name:
+            MediaBlob.release_on_commit(previous_image_name)
+
+    def processed_image_updates(self, buffer):
+        return {}
+
+    @classmethod
+    def sync_brand_links(cls, ratings):
+        """
+        Relinks saved ratings to the Brand rows their brands text names (matched
+        case-insensitively; other names stay text only). Three queries however
+        many ratings are passed.
+        """
+        names = {rating.pk: split_brand_names(rating.brands) for rating in ratings}
+        if not names:
+            return
+        wanted = {name.lower() for rating_names in names.values() for name in rating_names}
+        brand_ids = dict(
+            Brand.objects.annotate(key=Lower('name')).filter(key__in=wanted).values_list('key', 'id')
+        ) if wanted else {}
+        through = cls.linked_brands.through
+        with transaction.atomic():
+            through.objects.filter(rating_id__in=names).delete()
+            through.objects.bulk_create(
+                [
+                    through(rating_id=rating_id, brand_id=brand_id)
+                    for rating_id, rating_names in names.items()
+                    for brand_id in {brand_ids[name.lower()] for name in rating_names if name.lower() in brand_ids}
+                ],
+                batch_size=1000,
+            )
+
+
+class SupplementRatingStats(models.Model):
+    """
+    Stored rating aggregates for a supplement, kept in step with Rating writes
+    so listings can sort on indexed columns instead of aggregating per request.
+    """
+    supplement = models.OneToOneField(Supplement, on_delete=models.CASCADE, primary_key=True, related_name='rating_stats')
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    avg_rating = models.FloatField(blank=True, null=True)
+    last_rated_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-avg_rating', '-rating_count'], name='pages_stats_ranking_idx'),
+            models.Index(fields=['-rating_count'], name='pages_stats_count_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.supplement_id}: {self.avg_rating} ({self.rating_count})'
+
+    def recalculate_avg(self):
+        self.avg_rating = round(self.rating_sum / self.rating_count, 2) if self.rating_count > 0 else None
+
+    @classmethod
+    def apply_delta(cls, supplement_id, score_delta, count_delta, added_created_at=None, removed_created_at=None):
+        """
+        Adjusts the stored aggregates for one supplement under a row lock.
+        Creates the row if it is missing, unless the change is a removal (the
+        supplement may itself be in the middle of a cascade delete).
+        """
+        with transaction.atomic():
+            stats = cls.objects.select_for_update().filter(supplement_id=supplement_id).first()
+            if stats is None:
+                if count_delta > 0 or score_delta > 0:
+                    cls.rebuild([supplement_id])
+                return
+
+            stats.rating_sum += score_delta
+            stats.rating_count += count_delta
+            stats.recalculate_avg()
+
+            if added_created_at and (stats.last_rated_at is None or added_created_at > stats.last_rated_at):
+                stats.last_rated_at = added_created_at
+            if removed_created_at and stats.last_rated_at and removed_created_at >= stats.last_rated_at:
+                stats.last_rated_at = Rating.objects.filter(supplement_id=supplement_id).aggregate(
+                    last=Max('created_at')
+                )['last']
+
+            stats.save()
+
+    @classmethod
+    def rebuild(cls, supplement_ids=None):
+        """
+        Recomputes stats from the Rating table. Rebuilds every supplement when
+        supplement_ids is None. Returns the number of rows written.
+
+        The rows are created if missing and locked before the ratings are read,
+        so a concurrent apply_delta either lands before the read (and is
+        counted) or waits and applies on top of the rebuilt row.
+        """
+        supplements = Supplement.objects.all()
+        if supplement_ids is not None:
+            supplements = supplements.filter(id__in=supplement_ids)
+        target_ids = list(supplements.values_list('id', flat=True))
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(supplement_id=supplement_id) for supplement_id in target_ids],
+                ignore_conflicts=True, batch_size=1000,
+            )
+            rows = list(cls.objects.select_for_update().filter(supplement_id__in=target_ids).order_by('pk'))
+            aggregates = {
+                row['supplement_id']: row
+                for row in Rating.objects.filter(supplement_id__in=target_ids)
+                .values('supplement_id')
+                .annotate(total=Sum('score'), count=Count('id'), last=Max('created_at'))
+            }
+            for stats in rows:
+                row = aggregates.get(stats.supplement_id)
+                stats.rating_sum = row['total'] if row else 0
+                stats.rating_count = row['count'] if row else 0
+                stats.last_rated_at = row['last'] if row else None
+                stats.recalculate_avg()
+            cls.objects.bulk_update(rows, ['rating_sum', 'rating_count', 'avg_rating', 'last_rated_at'], batch_size=1000)
+        return len(rows)
 
 
-class Comment(models.Model):
+class SupplementConditionStats(models.Model):
+    """
+    Rating aggregates per (supplement, condition, role) so condition-filtered
+    rankings are answered with index lookups instead of M2M joins.
+    """
+    ROLE_PURPOSE = 'purpose'
+    ROLE_BENEFIT = 'benefit'
+    ROLE_SIDE_EFFECT = 'side_effect'
+    ROLE_CHOICES = [
+        (ROLE_PURPOSE, 'Purpose'),
+        (ROLE_BENEFIT, 'Benefit'),
+        (ROLE_SIDE_EFFECT, 'Side Effect'),
+    ]
+    # Rating M2M field name -> role stored in this table
+    ROLE_FIELDS = {
+        'conditions': ROLE_PURPOSE,
+        'benefits': ROLE_BENEFIT,
+        'side_effects': ROLE_SIDE_EFFECT,
+    }
+
+    supplement = models.ForeignKey(Supplement, on_delete=models.CASCADE, related_name='condition_stats')
+    condition = models.ForeignKey(Condition, on_delete=models.CASCADE, related_name='supplement_stats')
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('supplement', 'condition', 'role')
+        indexes = [
+            models.Index(fields=['role', 'condition', 'supplement'], name='pages_cond_stats_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.supplement_id}/{self.condition_id}/{self.role}: {self.rating_sum}/{self.rating_count}'
+
+    @classmethod
+    def apply_delta(cls, supplement_id, role, condition_ids, score_delta, count_delta):
+        condition_ids = list(condition_ids)
+        if not condition_ids or (score_delta == 0 and count_delta == 0):
+            return
+        with transaction.atomic():
+            if count_delta > 0:
+                cls.objects.bulk_create(
+                    [cls(supplement_id=supplement_id, condition_id=cid, role=role) for cid in condition_ids],
+                    ignore_conflicts=True,
+                )
+            rows = cls.objects.filter(supplement_id=supplement_id, role=role, condition_id__in=condition_ids)
+            rows.update(rating_sum=F('rating_sum') + score_delta, rating_count=F('rating_count') + count_delta)
+            if count_delta < 0:
+                rows.filter(rating_count__lte=0).delete()
+
+    @classmethod
+    def rating_condition_ids(cls, rating):
+        """Returns {role: [condition ids]} for a saved rating, one query per role."""
+        return {
+            role: list(getattr(rating, field_name).values_list('id', flat=True))
+            for field_name, role in cls.ROLE_FIELDS.items()
+        }
+
+    @classmethod
+    def apply_rating(cls, supplement_id, score, condition_ids_by_role, sign):
+        for role, condition_ids in condition_ids_by_role.items():
+            cls.apply_delta(supplement_id, role, condition_ids, sign * score, sign)
+
+    @classmethod
+    def rebuild(cls, supplement_ids=None, condition_ids=None):
+        """
+        Recomputes the cube from the three Rating through tables. Rebuilds
+        every supplement (or condition) when supplement_ids (or condition_ids)
+        is None. Returns rows written.
+        """
+        rows = []
+        for field_name, role in cls.ROLE_FIELDS.items():
+            through = getattr(Rating, field_name).through
+            links = through.objects.all()
+            if supplement_ids is not None:
+                links = links.filter(rating__supplement_id__in=supplement_ids)
+            if condition_ids is not None:
+                links = links.filter(condition_id__in=condition_ids)
+            for row in links.values('rating__supplement_id', 'condition_id').annotate(
+                total=Sum('rating__score'), count=Count('rating_id')
+            ):
+                rows.append(cls(
+                    supplement_id=row['rating__supplement_id'],
+                    condition_id=row['condition_id'],
+                    role=role,
+                    rating_sum=row['total'],
+                    rating_count=row['count'],
+                ))
+
+        with transaction.atomic():
+            existing = cls.objects.all()
+            if supplement_ids is not None:
+                existing = existing.filter(supplement_id__in=supplement_ids)
+            if condition_ids is not None:
+                existing = existing.filter(condition_id__in=condition_ids)
+            existing.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+@receiver(post_save, sender=Supplement)
+def create_supplement_rating_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        SupplementRatingStats.objects.get_or_create(supplement=instance)
+
+
+@receiver(pre_save, sender=Rating)
+def capture_rating_before_save(sender, instance, raw=False, **kwargs):
+    # Taken before the write, so an instance that was never loaded diffs against its old row, not the new one
+    instance._previous_values = None if raw or instance.pk is None else instance.get_loaded_values()
+
+
+@receiver(post_save, sender=Rating)
+def update_stats_on_rating_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_values', None) or {}
+    previous_supplement_id = previous.get('supplement_id')
+    previous_score = previous.get('score')
+
+    if created:
+        # M2M links do not exist yet; the condition cube is updated from m2m_changed.
+        SupplementRatingStats.apply_delta(instance.supplement_id, instance.score, 1, added_created_at=instance.created_at)
+    elif previous_supplement_id is None or previous_score is None:
+        # No baseline to diff against (the row was gone, or the fields were deferred).
+        SupplementRatingStats.rebuild([instance.supplement_id])
+        SupplementConditionStats.rebuild([instance.supplement_id])
+    elif previous_supplement_id != instance.supplement_id:
+        SupplementRatingStats.apply_delta(previous_supplement_id, -previous_score, -1, removed_created_at=instance.created_at)
+        SupplementRatingStats.apply_delta(instance.supplement_id, instance.score, 1, added_created_at=instance.created_at)
+        condition_ids_by_role = SupplementConditionStats.rating_condition_ids(instance)
+        SupplementConditionStats.apply_rating(previous_supplement_id, previous_score, condition_ids_by_role, -1)
+        SupplementConditionStats.apply_rating(instance.supplement_id, instance.score, condition_ids_by_role, 1)
+    elif previous_score != instance.score:
+        SupplementRatingStats.apply_delta(instance.supplement_id, instance.score - previous_score, 0)
+        for role, condition_ids in SupplementConditionStats.rating_condition_ids(instance).items():
+            SupplementConditionStats.apply_delta(instance.supplement_id, role, condition_ids, instance.score - previous_score, 0)
+
+
+@receiver(pre_delete, sender=Rating)
+def capture_rating_conditions_before_delete(sender, instance, **kwargs):
+    # The through rows are removed by the cascade before post_delete, without m2m_changed.
+    instance._condition_ids_by_role = SupplementConditionStats.rating_condition_ids(instance)
+    instance._previous_values = instance.get_loaded_values()
+
+
+@receiver(post_delete, sender=Rating)
+def update_stats_on_rating_delete(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_values', None) or {}
+    supplement_id = previous.get('supplement_id') or instance.supplement_id
+    score = previous.get('score') or instance.score
+    SupplementRatingStats.apply_delta(supplement_id, -score, -1, removed_created_at=instance.created_at)
+    SupplementConditionStats.apply_rating(supplement_id, score, getattr(instance, '_condition_ids_by_role', {}), -1)
+
+
+def update_condition_stats_on_m2m_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Keeps SupplementConditionStats in step with Rating.conditions/benefits/side_effects,
+    including the remove/add pairs issued by RelatedManager.set().
+    """
+    role = SupplementConditionStats.ROLE_FIELDS[sender._role_field_name]
+
+    related_manager = getattr(instance, sender._reverse_accessor if reverse else sender._role_field_name)
+
+    if action in ('pre_clear', 'pre_remove'):
+        # Capture the links that actually exist; remove() is a no-op for ids that are not linked.
+        linked = related_manager.all()
+        if action == 'pre_remove':
+            linked = linked.filter(id__in=pk_set)
+        instance._unlinked_ids = list(linked.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    sign = 1
+    linked_ids = pk_set
+    if action != 'post_add':
+        sign = -1
+        linked_ids = getattr(instance, '_unlinked_ids', [])
+
+    if not reverse:
+        SupplementConditionStats.apply_delta(instance.supplement_id, role, linked_ids, sign * instance.score, sign)
+    else:
+        # instance is a Condition and the ids are ratings
+        for rating in Rating.objects.filter(id__in=linked_ids).only('id', 'supplement_id', 'score'):
+            SupplementConditionStats.apply_delta(rating.supplement_id, role, [instance.id], sign * rating.score, sign)
+
+
+for _field_name in SupplementConditionStats.ROLE_FIELDS:
+    _field = Rating._meta.get_field(_field_name)
+    _field.remote_field.through._role_field_name = _field_name
+    _field.remote_field.through._reverse_accessor = _field.remote_field.related_name
+    m2m_changed.connect(
+        update_condition_stats_on_m2m_change,
+        sender=_field.remote_field.through,
+        dispatch_uid=f'condition_stats_{_field_name}',
+    )
+
+
+class Comment(TrackedFieldsMixin, models.Model):
     rating = models.ForeignKey(Rating, related_name='comments', on_delete=models.CASCADE, null=True, blank=True)
     parent_comment = models.ForeignKey('self', related_name='replies', on_delete=models.CASCADE, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -203,53 +649,54 @@ class Comment(models.Model):
     is_edited = models.BooleanField(default=False)
     upvotes = models.PositiveIntegerField(default=0)
     image = models.ImageField(upload_to='comments/', blank=True, null=True)
+    image_status = models.CharField(max_length=12, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
+    image_profile = 'comment'
+    # Denormalized thread root: the rating at the top of the reply chain and its supplement
+    root_rating = models.ForeignKey(Rating, related_name='thread_comments', on_delete=models.CASCADE, null=True, blank=True)
+    supplement = models.ForeignKey(Supplement, related_name='comments', on_delete=models.CASCADE, null=True, blank=True)
 
     def __str__(self):
         if self.rating:
             return f"Comment on rating {self.rating}"
         return f"Reply to comment {self.parent_comment_id}"
 
+    def assign_thread(self):
+        """Copies root_rating/supplement from the parent comment, or takes them from rating for top-level comments."""
+        if self.parent_comment_id is not None and self.parent_comment.root_rating_id is not None:
+            self.root_rating_id = self.parent_comment.root_rating_id
+            self.supplement_id = self.parent_comment.supplement_id
+        elif self.rating_id is not None:
+            self.root_rating_id = self.rating_id
+            self.supplement_id = self.rating.supplement_id
+
     def save(self, *args, **kwargs):
+        if self.root_rating_id is None:
+            self.assign_thread()
+
         process_image = False
+        previous_image_name = None
         if self.pk:
-            try:
-                old_instance = Comment.objects.get(pk=self.pk)
-                if old_instance.image != self.image:
-                    process_image = True
-            except Comment.DoesNotExist:
+            loaded = self.get_loaded_values()
+            if self.has_changed('image'):
                 process_image = True
+                previous_image_name = loaded['image'] if loaded else None
         elif self.image:
             process_image = True
 
+        enqueue_processing = False
         if process_image and self.image and hasattr(self.image.file, 'content_type'):
-            try:
-                img = PILImage.open(self.image)
-                original_format = img.format
-
-                max_width = 1024
-                max_height = 768
-                img.thumbnail((max_width, max_height), PILImage.Resampling.LANCZOS)
-
-                buffer = BytesIO()
-                save_format = 'WEBP'
-                save_kwargs = {'quality': 75}
-
-                if original_format == 'PNG':
-                    save_kwargs['lossless'] = True
-                
-                if img.mode != 'RGB' and img.mode != 'RGBA':
-                    img = img.convert('RGBA') if save_format == 'WEBP' and 'lossless' in save_kwargs else img.convert('RGB')
-
-                img.save(buffer, format=save_format, **save_kwargs)
-                
-                file_name_without_ext, _ = os.path.splitext(self.image.name)
-                new_file_name = file_name_without_ext + '.webp'
-                
-                self.image.save(new_file_name, ContentFile(buffer.getvalue()), save=False)
-            except Exception as e:
-                print(f"Error processing image for Comment {self.pk}: {e}")
-        
+            enqueue_processing = attach_uploaded_image(self)
+        elif process_image and not self.image:
+            self.image_status = ''
+
         super().save(*args, **kwargs)
+        if enqueue_processing:
+            ImageProcessingJob.enqueue(self)
+        if previous_image_name:
+            MediaBlob.release_on_commit(previous_image_name)
+
+    def processed_image_updates(self, buffer):
+        return {}
 
 
 class EmailVerificationToken(models.Model):
@@ -273,6 +720,44 @@ class Brand(models.Model):
     def __str__(self):
         return self.name
 
+    # Caps the OR'd name matches in one relinking query
+    LINK_BATCH_SIZE = 100
+
+    @classmethod
+    def named(cls, names):
+        """Brands whose name is any of names, ignoring case (as ratings' brands text is linked)."""
+        return cls.objects.annotate(key=Lower('name')).filter(key__in={name.lower() for name in names})
+
+    @classmethod
+    def link_ratings(cls, brands):
+        """Relinks the ratings that mention or are linked to any of brands, e.g. after they are created or renamed."""
+        brands = list(brands)
+        for start in range(0, len(brands), cls.LINK_BATCH_SIZE):
+            batch = brands[start:start + cls.LINK_BATCH_SIZE]
+            mentions = Q(linked_brands__in=batch)
+            for brand in batch:
+                mentions |= Q(brands__icontains=brand.name)
+            Rating.sync_brand_links(Rating.objects.filter(mentions).distinct().only('id', 'brands'))
+
+    def remove_from_ratings(self, replacement=None):
+        """
+        Takes this brand off every rating linked to it, putting replacement in
+        its place when given. The links move with one through-table UPDATE
+        (dropping pairs a rating already had) and the brands text is rewritten
+        with one bulk_update. Returns how many ratings changed.
+        """
+        through = Rating.linked_brands.through
+        ratings = list(Rating.objects.filter(linked_brands=self).only('id', 'brands'))
+        for rating in ratings:
+            rating.brands = replace_brand_name(rating.brands, self.name, replacement.name if replacement else None)
+        with transaction.atomic():
+            if replacement is not None:
+                already = through.objects.filter(rating_id=OuterRef('rating_id'), brand_id=replacement.pk)
+                through.objects.filter(brand_id=self.pk).filter(~Exists(already)).update(brand_id=replacement.pk)
+            through.objects.filter(brand_id=self.pk).delete()
+            Rating.objects.bulk_update(ratings, ['brands'], batch_size=1000)
+        return len(ratings)
+
 
 class UserUpvote(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -293,4 +778,420 @@ class UserUpvote(models.Model):
     def __str__(self):
         if self.rating:
             return f"{self.user.username} upvoted rating {self.rating.id}"
-        return f"{self.user.username} upvoted comment {self.comment.id}"
\ No newline at end of file
+        return f"{self.user.username} upvoted comment {self.comment.id}"
+
+
+class ImageProcessingJob(models.Model):
+    """
+    Deferred conversion of an uploaded Profile/Rating/Comment image to its
+    processed WEBP. Jobs are claimed with a conditional UPDATE, so the in-process
+    thread runner and any number of `process_image_jobs` workers can share the
+    table. See pages/image_jobs.py.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    MAX_ATTEMPTS = 3
+
+    model_label = models.CharField(max_length=64)  # e.g. 'pages.rating'
+    object_id = models.PositiveBigIntegerField()
+    # Stored name of the upload being converted; a newer upload supersedes the job
+    source_name = models.CharField(max_length=255)
+    # SHA-256 of the upload, so the finished image can be registered as a MediaBlob
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label}:{self.object_id} {self.source_name} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, instance):
+        """Records a job for instance's just-saved upload and, with the thread runner, starts it after commit."""
+        job = cls.objects.create(
+            model_label=instance._meta.label_lower,
+            object_id=instance.pk,
+            source_name=instance.image.name,
+            content_hash=getattr(instance, '_upload_hash', ''),
+        )
+        from .image_jobs import submit_job, thread_runner
+        if thread_runner():
+            transaction.on_commit(lambda: submit_job(job.pk))
+        return job
+
+
+class ImportJob(models.Model):
+    """
+    A catalog CSV accepted by one of the upload views and imported in the
+    background, chunk by chunk (pages/import_jobs.py). Each chunk commits
+    together with the job's progress, so a failed or interrupted job resumes
+    at the first chunk that didn't commit instead of starting over.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('supplements', 'Supplements'),
+        ('conditions', 'Conditions/purposes'),
+        ('brands', 'Brands'),
+        ('ratings', 'Ratings'),
+    ]
+    MAX_ATTEMPTS = 3
+    # Only the first row errors are kept; row_error_count has the total
+    MAX_STORED_ROW_ERRORS = 1000
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    file = models.FileField(upload_to='imports/')
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    chunk_size = models.PositiveIntegerField(default=2000)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    # Chunks before next_chunk are committed and skipped when the job resumes
+    next_chunk = models.PositiveIntegerField(default=0)
+    rows_processed = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    unchanged_count = models.PositiveIntegerField(default=0)
+    duplicate_count = models.PositiveIntegerField(default=0)
+    row_error_count = models.PositiveIntegerField(default=0)
+    row_errors = models.JSONField(default=list, blank=True)
+    # Where the current run started, for the ETA
+    run_started_at = models.DateTimeField(null=True, blank=True)
+    run_started_rows = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} import {self.pk} ({self.status}, {self.rows_processed}/{self.total_rows})"
+
+    @property
+    def percent(self):
+        if self.status == self.DONE:
+            return 100.0
+        if not self.total_rows:
+            return 0.0
+        return round(100 * self.rows_processed / self.total_rows, 1)
+
+    @property
+    def eta_seconds(self):
+        """Seconds left at the current run's pace; None until a chunk of this run has committed."""
+        if self.status != self.RUNNING or not self.total_rows or self.run_started_at is None:
+            return None
+        done = self.rows_processed - self.run_started_rows
+        if done <= 0:
+            return None
+        elapsed = (timezone.now() - self.run_started_at).total_seconds()
+        return round(elapsed / done * max(self.total_rows - self.rows_processed, 0), 1)
+
+    @classmethod
+    def enqueue(cls, kind, file, user=None):
+        """Stores the upload as a pending job and, with the thread runner, starts it after commit."""
+        job = cls.objects.create(kind=kind, file=file, created_by=user)
+        from .import_jobs import submit_job, thread_runner
+        if thread_runner():
+            transaction.on_commit(lambda: submit_job(job.pk))
+        return job
+
+
+class ImageVariant(models.Model):
+    """
+    One rendition of a processed image, keyed by the image's stored name: a
+    downscaled copy at a fixed width, or the image itself at its full width.
+    See pages/image_variants.py.
+    """
+    image_name = models.CharField(max_length=255)
+    width = models.PositiveSmallIntegerField()
+    height = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = ('image_name', 'width')
+
+    def __str__(self):
+        return f"{self.image_name} @{self.width}w"
+
+
+class MediaBlob(models.Model):
+    """
+    A processed image shared by every Profile/Rating/Comment that uploaded the
+    same bytes for the same use case. ref_count is the number of rows whose
+    image is `name`; when the last one lets go, the file, its variants, its
+    public copy (unless still in use) and this row are deleted. Images stored
+    before deduplication have no blob and are never deleted.
+    """
+    content_hash = models.CharField(max_length=64)
+    image_profile = models.CharField(max_length=16)
+    name = models.CharField(max_length=255, unique=True)
+    # Profile.public_image of the processed avatar, when public media is enabled
+    public_name = models.CharField(max_length=255, blank=True, default='')
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('content_hash', 'image_profile')
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+    @classmethod
+    def acquire(cls, content_hash, image_profile):
+        """Takes a reference on the blob for this content, or returns None if there is no live one."""
+        blob = cls.objects.filter(content_hash=content_hash, image_profile=image_profile).first()
+        if blob is None:
+            return None
+        # A blob at zero is being deleted and must not be revived
+        if not cls.objects.filter(pk=blob.pk, ref_count__gt=0).update(ref_count=F('ref_count') + 1):
+            return None
+        return blob
+
+    @classmethod
+    def release(cls, name):
+        """Drops one reference to the blob stored as `name`, deleting it and its files at zero."""
+        if not name or not cls.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1):
+            return
+        with transaction.atomic():
+            public_name = cls.objects.filter(name=name, ref_count=0).values_list('public_name', flat=True).first()
+            if public_name is None or not cls.objects.filter(name=name, ref_count=0).delete()[0]:
+                return
+            variant_names = list(ImageVariant.objects.filter(image_name=name).values_list('name', flat=True))
+            ImageVariant.objects.filter(image_name=name).delete()
+            # Public copies are named by their bytes, so another blob or an older profile may share this one
+            if public_name and (
+                cls.objects.filter(public_name=public_name).exists()
+                or Profile.objects.filter(public_image=public_name).exists()
+            ):
+                public_name = ''
+
+        def delete_files():
+            from django.core.files.storage import default_storage
+            for file_name in {name, *variant_names}:
+                default_storage.delete(file_name)
+            if public_name:
+                get_public_storage().delete(public_name)
+        transaction.on_commit(delete_files)
+
+    @classmethod
+    def release_on_commit(cls, name):
+        transaction.on_commit(lambda: cls.release(name))
+
+
+class DataVersion(models.Model):
+    """
+    Monotonic counters that stamp cached API responses. 'global' moves on any
+    catalogue write and keys supplement listings; 'supplement:<id>' moves when that
+    supplement, its ratings or their comments/upvotes change; 'reference' moves
+    when conditions, brands, usernames or avatars change, since they appear in
+    every detail; 'search' moves when supplement names or aliases change and
+    retires each process's in-memory search index.
+    """
+    GLOBAL = 'global'
+    REFERENCE = 'reference'
+    SEARCH = 'search'
+
+    key = models.CharField(max_length=64, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.key}@{self.version}"
+
+    @staticmethod
+    def supplement_key(supplement_id):
+        return f'supplement:{supplement_id}'
+
+    @classmethod
+    def current(cls, keys):
+        """Returns the versions for keys, in order, as one query (0 for keys never bumped)."""
+        versions = dict(cls.objects.filter(key__in=keys).values_list('key', 'version'))
+        return [versions.get(key, 0) for key in keys]
+
+    @classmethod
+    def bump(cls, keys):
+        keys = set(keys)
+        if not keys:
+            return
+        cls.objects.bulk_create([cls(key=key, version=0) for key in keys], ignore_conflicts=True)
+        cls.objects.filter(key__in=keys).update(version=F('version') + 1)
+
+    @classmethod
+    def bump_on_commit(cls, supplement_ids=(), reference=False):
+        """
+        Bumps 'global' plus the given supplements (and 'reference') once the current
+        transaction commits, so a reader never caches new data under an old version
+        that is about to be retired, nor old data under the new one.
+        """
+        keys = {cls.GLOBAL}
+        keys.update(cls.supplement_key(supplement_id) for supplement_id in supplement_ids if supplement_id)
+        if reference:
+            keys.add(cls.REFERENCE)
+        transaction.on_commit(lambda: cls.bump(keys))
+
+
+def comment_supplement_id(comment):
+    """The supplement a comment's thread belongs to, walking the reply chain for rows without one."""
+    if comment.supplement_id is not None:
+        return comment.supplement_id
+    rating_id, parent_id = comment.rating_id, comment.parent_comment_id
+    seen = set()
+    while rating_id is None and parent_id is not None and parent_id not in seen:
+        seen.add(parent_id)
+        row = Comment.objects.filter(pk=parent_id).values_list('rating_id', 'parent_comment_id').first()
+        if row is None:
+            return None
+        rating_id, parent_id = row
+    if rating_id is None:
+        return None
+    return Rating.objects.filter(pk=rating_id).values_list('supplement_id', flat=True).first()
+
+
+@receiver(post_save, sender=Supplement)
+@receiver(post_delete, sender=Supplement)
+def bump_version_on_supplement_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        DataVersion.bump_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=SupplementAlias)
+@receiver(post_delete, sender=SupplementAlias)
+def bump_version_on_alias_change(sender, instance, raw=False, **kwargs):
+    # Aliases change which supplements a cached ?search= list matches
+    if not raw:
+        DataVersion.bump_on_commit([instance.supplement_id])
+
+
+@receiver(post_save, sender=Condition)
+@receiver(post_delete, sender=Condition)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def bump_version_on_reference_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        DataVersion.bump_on_commit(reference=True)
+
+
+@receiver(pre_save, sender=User)
+def capture_username_before_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or (update_fields is not None and 'username' not in update_fields):
+        return
+    instance._previous_username = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def bump_version_on_username_change(sender, instance, created, raw=False, **kwargs):
+    # Usernames appear next to ratings and comments on every supplement
+    previous_username = getattr(instance, '_previous_username', None)
+    if not (created or raw) and previous_username is not None and previous_username != instance.username:
+        DataVersion.bump_on_commit(reference=True)
+    instance._previous_username = None
+
+
+@receiver(post_save, sender=Profile)
+def bump_version_on_avatar_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Profile saves write only their changed columns, so update_fields says whether the avatar moved
+    if created or raw:
+        return
+    if update_fields is None or {'image', 'public_image', 'image_status'} & set(update_fields):
+        DataVersion.bump_on_commit(reference=True)
+
+
+@receiver(post_save, sender=Brand)
+def link_ratings_to_brand(sender, instance, created, raw=False, **kwargs):
+    # Ratings entered before the brand existed (or under its new name) name it only in their text
+    if not raw:
+        Brand.link_ratings([instance])
+
+
+@receiver(post_save, sender=Rating)
+def bump_version_on_rating_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        previous = getattr(instance, '_previous_values', None) or {}
+        DataVersion.bump_on_commit([instance.supplement_id, previous.get('supplement_id')])
+
+
+@receiver(post_save, sender=Rating)
+def move_comments_with_rating(sender, instance, created, raw=False, **kwargs):
+    previous_supplement_id = (getattr(instance, '_previous_values', None) or {}).get('supplement_id')
+    if not (created or raw) and previous_supplement_id not in (None, instance.supplement_id):
+        Comment.objects.filter(root_rating=instance).update(supplement_id=instance.supplement_id)
+
+
+@receiver(post_delete, sender=Rating)
+def bump_version_on_rating_delete(sender, instance, **kwargs):
+    DataVersion.bump_on_commit([instance.supplement_id])
+
+
+def bump_version_on_rating_m2m_change(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Condition-side edits touch ratings on many supplements
+        DataVersion.bump_on_commit(reference=True)
+    else:
+        DataVersion.bump_on_commit([instance.supplement_id])
+
+
+for _field_name in SupplementConditionStats.ROLE_FIELDS:
+    m2m_changed.connect(
+        bump_version_on_rating_m2m_change,
+        sender=Rating._meta.get_field(_field_name).remote_field.through,
+        dispatch_uid=f'data_version_{_field_name}',
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(pre_delete, sender=Comment)
+def bump_version_on_comment_change(sender, instance, raw=False, **kwargs):
+    # pre_delete: the reply chain may already be gone by post_delete during a cascade
+    if not raw:
+        DataVersion.bump_on_commit([comment_supplement_id(instance)])
+
+
+@receiver(post_save, sender=UserUpvote)
+@receiver(pre_delete, sender=UserUpvote)
+def bump_version_on_upvote_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.rating_id:
+        supplement_id = Rating.objects.filter(pk=instance.rating_id).values_list('supplement_id', flat=True).first()
+    elif instance.comment_id:
+        comment = Comment.objects.filter(pk=instance.comment_id).only('rating_id', 'parent_comment_id').first()
+        supplement_id = comment_supplement_id(comment) if comment else None
+    else:
+        supplement_id = None
+    DataVersion.bump_on_commit([supplement_id])
+
+
+@receiver(post_delete, sender=Profile)
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=Comment)
+def release_media_on_delete(sender, instance, **kwargs):
+    if instance.image:
+        MediaBlob.release_on_commit(instance.image.name)
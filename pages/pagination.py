@@ -0,0 +1,152 @@
+# pages/pagination.py
+
+import base64
+import binascii
+import json
+
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """
+    Keyset (seek) pagination over whatever ordering the view and its filter
+    backends put on the queryset, including expression orderings such as
+    F('avg_rating').desc(nulls_last=True). The last row's sort key is encoded
+    in an opaque ?cursor=, so every page is a WHERE on the sort columns with
+    no OFFSET and no COUNT.
+
+    Requests that pass ?offset= keep the LimitOffsetPagination behaviour
+    (admin screens rely on the total count); requests with neither ?limit=
+    nor ?cursor= stay unpaginated, as before.
+    """
+    cursor_query_param = 'cursor'
+    default_keyset_limit = 20
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = False
+        if self.offset_query_param in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+
+        encoded_cursor = request.query_params.get(self.cursor_query_param)
+        limit = self.get_limit(request)
+        if limit is None and encoded_cursor is None:
+            return None
+
+        keys = self.get_ordering_keys(queryset)
+        if keys is None:
+            # Ordering we cannot seek on (random, related lookups, raw expressions)
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset_mode = True
+        self.request = request
+        self.limit = limit or self.default_keyset_limit
+        self.keys = keys
+
+        queryset = queryset.order_by(*[
+            OrderBy(F(name), descending=descending, nulls_last=True if nulls_last else None,
+                    nulls_first=None if nulls_last else True)
+            for name, descending, nulls_last in keys
+        ])
+        if encoded_cursor is not None:
+            queryset = queryset.filter(self.build_seek_filter(self.decode_cursor(encoded_cursor)))
+
+        page = list(queryset[:self.limit + 1])
+        self.has_next = len(page) > self.limit
+        self.page = page[:self.limit]
+        return self.page
+
+    def get_ordering_keys(self, queryset):
+        """
+        Returns [(field_name, descending, nulls_last), ...] for the queryset ordering,
+        with the primary key appended as a tiebreaker, or None if unsupported.
+        """
+        keys = []
+        for term in queryset.query.order_by or ():
+            if isinstance(term, str):
+                descending = term.startswith('-')
+                name = term.lstrip('-')
+                nulls_last = None
+            elif isinstance(term, OrderBy) and isinstance(term.expression, F):
+                name = term.expression.name
+                descending = term.descending
+                nulls_last = True if term.nulls_last else (False if term.nulls_first else None)
+            else:
+                return None
+            if name == '?' or '__' in name:
+                return None
+            if nulls_last is None:
+                # Make the backend default explicit (PostgreSQL: NULLs sort as the largest value)
+                nulls_last = not descending
+            keys.append((name, descending, nulls_last))
+
+        if not any(name in ('id', 'pk') for name, _, _ in keys):
+            keys.append(('id', False, True))
+        return keys
+
+    def build_seek_filter(self, values):
+        """
+        (k1 after v1) OR (k1 = v1 AND k2 after v2) OR ... for the current sort keys,
+        treating NULL according to each key's nulls placement.
+        """
+        seek = Q()
+        prefix = Q()
+        for (name, descending, nulls_last), value in zip(self.keys, values):
+            if value is None:
+                # Only non-NULL rows can follow a NULL that sorts first; nothing follows a trailing NULL
+                after = None if nulls_last else Q(**{f'{name}__isnull': False})
+                equal = Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+                if nulls_last:
+                    after |= Q(**{f'{name}__isnull': True})
+                equal = Q(**{name: value})
+            if after is not None:
+                seek |= prefix & after
+            prefix &= equal
+        return seek
+
+    def encode_cursor(self, obj):
+        payload = {
+            'k': [name if not descending else f'-{name}' for name, descending, _ in self.keys],
+            'v': [getattr(obj, name) for name, _, _ in self.keys],
+        }
+        data = json.dumps(payload, default=str, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, encoded_cursor):
+        try:
+            padded = encoded_cursor + '=' * (-len(encoded_cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            keys = payload['k']
+            values = payload['v']
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        expected = [name if not descending else f'-{name}' for name, descending, _ in self.keys]
+        if keys != expected or len(values) != len(self.keys):
+            # Cursor was issued for a different ordering
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
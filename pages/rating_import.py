@@ -0,0 +1,293 @@
+# pages/rating_import.py
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .csv_import import BulkImporter, ImportResult, ImportSpec, RowError, clean_text
+from .models import Condition, DataVersion, Rating, Supplement, SupplementConditionStats, SupplementRatingStats
+
+BATCH_SIZE = 1000
+# Separates condition names within one CSV cell; NDJSON may use a list instead
+LIST_SEPARATOR = ';'
+CONDITION_FIELDS = ('conditions', 'benefits', 'side_effects')
+FREQUENCY_UNITS = {unit for unit, _ in Rating.FREQUENCY_CHOICES}
+
+
+def name_list(value):
+    """Condition names from a JSON list or a ';'-separated cell, stripped and deduplicated in order."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    names = []
+    for name in value:
+        name = clean_text(name)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def optional_int(value):
+    value = clean_text(value)
+    if not value:
+        return None
+    number = float(value)
+    if number != int(number):
+        raise ValueError(value)
+    return int(number)
+
+
+class RatingImportResult(ImportResult):
+    """Ratings are insert-only: a row is created or reported, and duplicates are skipped rather than merged."""
+
+    @property
+    def processed(self):
+        return self.created
+
+    @property
+    def message(self):
+        message = f"{self.created} ratings imported."
+        if self.duplicates:
+            message += f" {self.duplicates} duplicate (user, supplement) rows skipped."
+        if self.dry_run:
+            message = f"Dry run, nothing was saved. {message}"
+        return message
+
+
+class RatingImport(ImportSpec):
+    """
+    Historical ratings from CSV or NDJSON. Users are matched by username and
+    supplements by name (plus supplement_category when a name is shared);
+    conditions, benefits and side_effects are lists of existing condition
+    names. created_at, when given, is kept.
+    """
+    model = Rating
+    label = 'ratings'
+    required_columns = ('user', 'supplement', 'score')
+    file_extensions = ('.csv', '.ndjson', '.jsonl')
+    wrong_file_error = 'File must be a CSV or NDJSON (.ndjson, .jsonl) file'
+
+    def make_importer(self, **kwargs):
+        return RatingImporter(self, **kwargs)
+
+    def make_result(self, dry_run=False):
+        return RatingImportResult(self, dry_run=dry_run)
+
+    def clean(self, row_number, row):
+        if '_error' in row:
+            raise RowError(f"Row {row_number}: {row['_error']}")
+        username = clean_text(row.get('user'))
+        if not username:
+            raise RowError(f"Row {row_number}: Missing user.")
+        supplement = clean_text(row.get('supplement'))
+        if not supplement:
+            raise RowError(f"Row {row_number} (User: {username}): Missing supplement.")
+        prefix = f"Row {row_number} (User: {username}, Supplement: {supplement})"
+
+        try:
+            score = optional_int(row.get('score'))
+        except (TypeError, ValueError):
+            score = None
+        if score is None or not 1 <= score <= 5:
+            raise RowError(f"{prefix}: Score must be a whole number from 1 to 5.")
+        try:
+            dosage_frequency = optional_int(row.get('dosage_frequency'))
+        except (TypeError, ValueError):
+            dosage_frequency = -1
+        if dosage_frequency is not None and dosage_frequency < 0:
+            raise RowError(f"{prefix}: dosage_frequency must be a whole number of 0 or more.")
+        frequency_unit = clean_text(row.get('frequency_unit')) or None
+        if frequency_unit is not None and frequency_unit not in FREQUENCY_UNITS:
+            raise RowError(f"{prefix}: frequency_unit must be one of {', '.join(sorted(FREQUENCY_UNITS))}.")
+        dosage = clean_text(row.get('dosage')) or None
+        if dosage and len(dosage) > Rating._meta.get_field('dosage').max_length:
+            raise RowError(f"{prefix}: dosage is too long.")
+        brands = clean_text(row.get('brands')) or None
+        if brands and len(brands) > Rating._meta.get_field('brands').max_length:
+            raise RowError(f"{prefix}: brands is too long.")
+
+        created_at = None
+        if clean_text(row.get('created_at')):
+            created_at = parse_datetime(clean_text(row['created_at']))
+            if created_at is None:
+                raise RowError(f"{prefix}: created_at is not an ISO 8601 date and time.")
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+
+        comment = row.get('comment')
+        return {
+            'user': username,
+            'supplement': supplement,
+            'supplement_category': clean_text(row.get('supplement_category')) or None,
+            'score': score,
+            'comment': str(comment) if comment not in (None, '') else None,
+            'dosage': dosage,
+            'dosage_frequency': dosage_frequency,
+            'frequency_unit': frequency_unit,
+            'brands': brands,
+            'created_at': created_at,
+            **{field: name_list(row.get(field)) for field in CONDITION_FIELDS},
+        }
+
+
+class RatingImporter(BulkImporter):
+    """
+    Inserts ratings chunk by chunk. Per chunk, usernames, supplement names,
+    condition names and existing (user, supplement) ratings are each resolved
+    with one query; the ratings go in with bulk_create and the three condition
+    through tables and the brand links with one bulk insert each. A user can
+    rate a supplement once, so rows matching an existing rating or an earlier
+    row are reported as duplicates. Stored stats are rebuilt for the
+    supplements touched.
+    """
+
+    def __init__(self, spec, dry_run=False, chunk_size=BATCH_SIZE):
+        super().__init__(spec, dry_run=dry_run, chunk_size=chunk_size)
+        # (user_id, supplement_id) -> row number of the first row that rated it
+        self._seen_pairs = {}
+
+    def import_chunk(self, rows):
+        errors = []
+        try:
+            self.import_records(rows, errors)
+        finally:
+            # Rows fail at different stages; report them in file order
+            self.result.row_errors.extend(message for _, message in sorted(errors, key=lambda error: error[0]))
+
+    def import_records(self, rows, errors):
+        result = self.result
+        records = []
+        for row_number, row in rows:
+            try:
+                records.append((row_number, self.spec.clean(row_number, row)))
+            except RowError as e:
+                errors.append((row_number, str(e)))
+        if not records:
+            return
+
+        users = dict(User.objects.filter(username__in={record['user'] for _, record in records}).values_list('username', 'id'))
+        supplements = {}
+        for pk, name, category in Supplement.objects.filter(
+            name__in={record['supplement'] for _, record in records}
+        ).values_list('id', 'name', 'category'):
+            supplements.setdefault(name, []).append((pk, category))
+        condition_names = {name for _, record in records for field in CONDITION_FIELDS for name in record[field]}
+        conditions = dict(Condition.objects.filter(name__in=condition_names).values_list('name', 'id')) if condition_names else {}
+
+        resolved = []
+        for row_number, record in records:
+            try:
+                resolved.append((row_number, record, *self.resolve(row_number, record, users, supplements, conditions)))
+            except RowError as e:
+                errors.append((row_number, str(e)))
+        if not resolved:
+            return
+
+        existing = set(
+            Rating.objects.filter(
+                user_id__in={user_id for _, _, user_id, _, _ in resolved},
+                supplement_id__in={supplement_id for _, _, _, supplement_id, _ in resolved},
+            ).values_list('user_id', 'supplement_id')
+        )
+        new = []
+        for row_number, record, user_id, supplement_id, condition_ids in resolved:
+            pair = (user_id, supplement_id)
+            prefix = f"Row {row_number} (User: {record['user']}, Supplement: {record['supplement']})"
+            if pair in existing:
+                result.duplicates += 1
+                errors.append((row_number, f"{prefix}: Duplicate - this user has already rated this supplement."))
+            elif pair in self._seen_pairs:
+                result.duplicates += 1
+                errors.append((row_number, f"{prefix}: Duplicate of row {self._seen_pairs[pair]}."))
+            else:
+                self._seen_pairs[pair] = row_number
+                new.append((record, user_id, supplement_id, condition_ids))
+
+        if self.dry_run:
+            result.diff['create'].extend(
+                {'user': record['user'], 'supplement': record['supplement']} for record, *_ in new
+            )
+        elif new:
+            self.write(new)
+        result.created += len(new)
+
+    def resolve(self, row_number, record, users, supplements, conditions):
+        """(user_id, supplement_id, {field: condition ids}) for a cleaned row, or RowError."""
+        prefix = f"Row {row_number} (User: {record['user']}, Supplement: {record['supplement']})"
+        user_id = users.get(record['user'])
+        if user_id is None:
+            raise RowError(f"{prefix}: Unknown user.")
+
+        candidates = supplements.get(record['supplement'], [])
+        if record['supplement_category'] is not None:
+            candidates = [candidate for candidate in candidates if candidate[1] == record['supplement_category']]
+        if not candidates:
+            raise RowError(f"{prefix}: Unknown supplement.")
+        if len(candidates) > 1:
+            raise RowError(f"{prefix}: {len(candidates)} supplements share this name; add a supplement_category column.")
+
+        condition_ids = {}
+        for field in CONDITION_FIELDS:
+            unknown = [name for name in record[field] if name not in conditions]
+            if unknown:
+                raise RowError(f"{prefix}: Unknown {field.replace('_', ' ')}: {', '.join(unknown)}.")
+            condition_ids[field] = [conditions[name] for name in record[field]]
+        return user_id, candidates[0][0], condition_ids
+
+    def write(self, new):
+        with transaction.atomic():
+            ratings = [
+                Rating(
+                    user_id=user_id,
+                    supplement_id=supplement_id,
+                    score=record['score'],
+                    comment=record['comment'],
+                    dosage=record['dosage'],
+                    dosage_frequency=record['dosage_frequency'],
+                    frequency_unit=record['frequency_unit'],
+                    brands=record['brands'],
+                )
+                for record, user_id, supplement_id, _ in new
+            ]
+            Rating.objects.bulk_create(ratings, batch_size=BATCH_SIZE)
+            if any(rating.pk is None for rating in ratings):
+                # Backends that can't return ids from a bulk insert: one user rates a supplement once
+                ids = {
+                    (user_id, supplement_id): pk
+                    for pk, user_id, supplement_id in Rating.objects.filter(
+                        user_id__in={rating.user_id for rating in ratings},
+                        supplement_id__in={rating.supplement_id for rating in ratings},
+                    ).values_list('id', 'user_id', 'supplement_id')
+                }
+                for rating in ratings:
+                    rating.pk = ids[(rating.user_id, rating.supplement_id)]
+
+            Rating.sync_brand_links([rating for rating in ratings if rating.brands])
+
+            # auto_now_add overwrote created_at on insert; put historical timestamps back
+            historical = []
+            for rating, (record, *_) in zip(ratings, new):
+                if record['created_at'] is not None:
+                    rating.created_at = record['created_at']
+                    historical.append(rating)
+            if historical:
+                Rating.objects.bulk_update(historical, ['created_at'], batch_size=BATCH_SIZE)
+
+            for field in CONDITION_FIELDS:
+                through = getattr(Rating, field).through
+                through.objects.bulk_create(
+                    [
+                        through(rating_id=rating.pk, condition_id=condition_id)
+                        for rating, (_, _, _, condition_ids) in zip(ratings, new)
+                        for condition_id in condition_ids[field]
+                    ],
+                    batch_size=BATCH_SIZE,
+                )
+
+            # bulk_create skips the Rating and m2m_changed receivers that keep stats in step
+            supplement_ids = sorted({rating.supplement_id for rating in ratings})
+            SupplementRatingStats.rebuild(supplement_ids)
+            SupplementConditionStats.rebuild(supplement_ids)
+            DataVersion.bump_on_commit(supplement_ids)
@@ -0,0 +1,185 @@
+# pages/s3.py
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAFETY_MARGIN = 600
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def s3_key_for(name):
+    """Bucket key for a stored file name, with AWS_LOCATION prepended when missing."""
+    location = getattr(settings, 'AWS_LOCATION', '')
+    if location and not name.startswith(location + '/'):
+        return f"{location.strip('/')}/{name.lstrip('/')}"
+    return name
+
+
+class FakeS3Client:
+    """
+    Offline stand-in for a boto3 S3 client. Produces deterministic presigned-looking
+    URLs and counts signing calls, so the signer can be exercised without AWS.
+    """
+
+    def __init__(self, bucket='local-bucket', endpoint='http://fake-s3.local'):
+        self.bucket = bucket
+        self.endpoint = endpoint
+        self.sign_count = 0
+        self._lock = threading.Lock()
+
+    def generate_presigned_url(self, operation, Params=None, ExpiresIn=3600):
+        with self._lock:
+            self.sign_count += 1
+            sequence = self.sign_count
+        key = Params['Key']
+        signature = hashlib.sha256(f'{key}:{sequence}'.encode('utf-8')).hexdigest()
+        return f"{self.endpoint}/{Params.get('Bucket', self.bucket)}/{quote(key)}?X-Amz-Expires={ExpiresIn}&X-Amz-Signature={signature}"
+
+
+class PresignedURLSigner:
+    """
+    Process-wide presigned GET URL source. One S3 client is created lazily and
+    shared; signed URLs are cached per key and reused until `safety_margin`
+    seconds before they expire, so every response hands out links that stay
+    valid for at least that long. The cache is LRU-bounded and thread-safe.
+    """
+
+    def __init__(self, client_factory, bucket, expires_in, safety_margin=DEFAULT_SAFETY_MARGIN,
+                 max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.client_factory = client_factory
+        self.bucket = bucket
+        self.expires_in = expires_in
+        # A margin of at least half the lifetime would make URLs unusable almost immediately
+        self.safety_margin = min(safety_margin, expires_in // 2)
+        self.max_entries = max_entries
+        self.clock = clock
+        self._client = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.client_factory()
+        return self._client
+
+    @property
+    def reuse_window(self):
+        return self.expires_in - self.safety_margin
+
+    def sign(self, key):
+        return self.sign_many([key]).get(key)
+
+    def sign_many(self, keys):
+        """Returns {key: url} for the given bucket keys, signing only those not cached."""
+        now = self.clock()
+        urls = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in urls:
+                    continue
+                cached = self._cache.get(key)
+                if cached is not None and cached[1] > now:
+                    self._cache.move_to_end(key)
+                    urls[key] = cached[0]
+                else:
+                    missing.append(key)
+
+        signed = {}
+        for key in dict.fromkeys(missing):
+            try:
+                signed[key] = self.client.generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': self.bucket, 'Key': key},
+                    ExpiresIn=self.expires_in,
+                )
+            except Exception as e:
+                logger.error(f"Error generating presigned URL for S3 key {key}: {e}")
+                urls[key] = None
+
+        if signed:
+            reuse_until = now + self.reuse_window
+            with self._lock:
+                for key, url in signed.items():
+                    self._cache[key] = (url, reuse_until)
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            urls.update(signed)
+        return urls
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def boto3_client_factory():
+    import boto3
+    from botocore.client import Config
+
+    return boto3.client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME,
+        config=Config(signature_version='s3v4'),
+    )
+
+
+_signer = None
+_signer_lock = threading.Lock()
+
+
+def get_signer():
+    """The shared signer, built from settings on first use (FakeS3Client when S3_FAKE_SIGNING is set)."""
+    global _signer
+    if _signer is None:
+        with _signer_lock:
+            if _signer is None:
+                if getattr(settings, 'S3_FAKE_SIGNING', False):
+                    factory = FakeS3Client
+                    bucket = getattr(settings, 'AWS_STORAGE_BUCKET_NAME', 'local-bucket')
+                else:
+                    factory = boto3_client_factory
+                    bucket = settings.AWS_STORAGE_BUCKET_NAME
+                _signer = PresignedURLSigner(
+                    factory,
+                    bucket=bucket,
+                    expires_in=getattr(settings, 'AWS_QUERYSTRING_EXPIRE', 3600),
+                    safety_margin=getattr(settings, 'S3_PRESIGN_SAFETY_MARGIN', DEFAULT_SAFETY_MARGIN),
+                    max_entries=getattr(settings, 'S3_PRESIGN_CACHE_SIZE', DEFAULT_MAX_ENTRIES),
+                )
+    return _signer
+
+
+def set_signer(signer):
+    """Replaces the shared signer (e.g. with one wrapping FakeS3Client); returns the previous one."""
+    global _signer
+    with _signer_lock:
+        previous, _signer = _signer, signer
+    return previous
+
+
+def signing_epoch():
+    """
+    Changes every `safety_margin` seconds. Mixed into ETags and response cache
+    keys: links in a body built during an epoch were signed at most one reuse
+    window earlier, so they stay valid for at least `safety_margin` seconds,
+    and by then the epoch has moved on and a revalidating client gets a fresh
+    body instead of a 304.
+    """
+    if not getattr(settings, 'IS_PRODUCTION', False):
+        return 0
+    signer = get_signer()
+    return int(time.time() // max(signer.safety_margin, 1))
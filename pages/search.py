@@ -0,0 +1,215 @@
+# pages/search.py
+
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import filters
+
+from .models import DataVersion, Supplement, SupplementAlias
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Relative weight of a hit by field and by how the query token matched
+FIELD_WEIGHTS = {'name': 1.0, 'alias': 0.9, 'category': 0.4}
+MATCH_WEIGHTS = {'exact': 1.0, 'prefix': 0.75, 'fuzzy': 0.5}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def max_typos(token):
+    """Edits tolerated for a query token; short tokens must match exactly or by prefix."""
+    if len(token) >= 8:
+        return 2
+    if len(token) >= 4:
+        return 1
+    return 0
+
+
+def within_edit_distance(a, b, limit):
+    """Bounded Levenshtein distance check (early exit once every cell exceeds limit)."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, start=1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            )
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+class InMemorySearchIndex:
+    """
+    Inverted index over supplement names, categories and aliases, used when the
+    database has no trigram support (SQLite dev and test runs, or PostgreSQL
+    without pg_trgm). Supports exact, prefix and typo-tolerant token matches;
+    every query token must match.
+    """
+
+    def __init__(self, documents):
+        # token -> {supplement_id: best field weight}
+        self.postings = defaultdict(dict)
+        for supplement_id, field, text in documents:
+            for token in tokenize(text):
+                weight = FIELD_WEIGHTS[field]
+                if self.postings[token].get(supplement_id, 0) < weight:
+                    self.postings[token][supplement_id] = weight
+        self.vocabulary = sorted(self.postings)
+
+    @classmethod
+    def build(cls):
+        documents = []
+        for supplement_id, name, category in Supplement.objects.values_list('id', 'name', 'category'):
+            documents.append((supplement_id, 'name', name))
+            documents.append((supplement_id, 'category', category))
+        for supplement_id, alias in SupplementAlias.objects.values_list('supplement_id', 'alias'):
+            documents.append((supplement_id, 'alias', alias))
+        return cls(documents)
+
+    def matching_tokens(self, query_token):
+        """Yields (index token, match kind) for one query token."""
+        if query_token in self.postings:
+            yield query_token, 'exact'
+        position = bisect_left(self.vocabulary, query_token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(query_token):
+            if self.vocabulary[position] != query_token:
+                yield self.vocabulary[position], 'prefix'
+            position += 1
+        limit = max_typos(query_token)
+        if limit:
+            for token in self.vocabulary:
+                if token != query_token and not token.startswith(query_token) and within_edit_distance(query_token, token, limit):
+                    yield token, 'fuzzy'
+
+    def search(self, query):
+        """Returns {supplement_id: score} for documents matching every query token."""
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return {}
+        scores = None
+        for query_token in query_tokens:
+            token_scores = {}
+            for token, kind in self.matching_tokens(query_token):
+                for supplement_id, field_weight in self.postings[token].items():
+                    score = field_weight * MATCH_WEIGHTS[kind]
+                    if token_scores.get(supplement_id, 0) < score:
+                        token_scores[supplement_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {sid: scores[sid] + score for sid, score in token_scores.items() if sid in scores}
+            if not scores:
+                return {}
+        return scores
+
+
+_index_lock = threading.Lock()
+_index = None
+# The 'search' DataVersion the index was built at; every process rebuilds once it moves
+_index_version = None
+_trigram_support = {}
+
+
+def has_trigram_support():
+    """True when the default database is PostgreSQL with pg_trgm installed (checked once per process)."""
+    if connection.vendor != 'postgresql':
+        return False
+    if connection.alias not in _trigram_support:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_support[connection.alias] = cursor.fetchone() is not None
+    return _trigram_support[connection.alias]
+
+
+def get_search_index():
+    global _index, _index_version
+    # Read before building, so a write that lands mid-build leaves the index behind the stamp, not ahead of it
+    version = DataVersion.current([DataVersion.SEARCH])[0]
+    with _index_lock:
+        if _index is None or _index_version != version:
+            _index = InMemorySearchIndex.build()
+            _index_version = version
+        return _index
+
+
+def invalidate_search_index():
+    """Retires the index in every process once the current transaction commits."""
+    transaction.on_commit(lambda: DataVersion.bump([DataVersion.SEARCH]))
+
+
+@receiver(post_save, sender=Supplement)
+@receiver(post_delete, sender=Supplement)
+@receiver(post_save, sender=SupplementAlias)
+@receiver(post_delete, sender=SupplementAlias)
+def invalidate_search_index_on_change(sender, **kwargs):
+    invalidate_search_index()
+
+
+class SupplementSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on SupplementViewSet. On PostgreSQL with
+    pg_trgm it matches through GIN-indexed word similarity and prefix LIKE plus
+    the alias table; elsewhere it uses the in-process InMemorySearchIndex.
+    Results are annotated with `search_rank` and, unless the client chose an
+    ordering, ranked by it ahead of the view's default ordering.
+    """
+    rank_annotation = 'search_rank'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = ' '.join(self.get_search_terms(request)).strip()
+        if not terms:
+            return queryset
+
+        if has_trigram_support():
+            queryset = self.filter_trigram(queryset, terms)
+        else:
+            queryset = self.filter_inverted_index(queryset, terms)
+
+        if request.query_params.get(filters.OrderingFilter.ordering_param) is None:
+            queryset = queryset.order_by(F(self.rank_annotation).desc(), *queryset.query.order_by)
+        return queryset
+
+    def filter_trigram(self, queryset, terms):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        alias_match = SupplementAlias.objects.filter(supplement=OuterRef('pk')).filter(
+            Q(alias__iexact=terms) | Q(alias__istartswith=terms) | Q(alias__trigram_word_similar=terms)
+        )
+        queryset = queryset.annotate(search_alias_match=Exists(alias_match)).filter(
+            Q(name__istartswith=terms)
+            | Q(name__trigram_word_similar=terms)
+            | Q(category__trigram_word_similar=terms)
+            | Q(search_alias_match=True)
+        )
+        return queryset.annotate(**{self.rank_annotation: (
+            Case(When(name__iexact=terms, then=Value(2.0)), default=Value(0.0), output_field=FloatField())
+            + Case(When(name__istartswith=terms, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+            + Case(When(search_alias_match=True, then=Value(FIELD_WEIGHTS['alias'])), default=Value(0.0), output_field=FloatField())
+            + Greatest(
+                TrigramWordSimilarity(terms, 'name'),
+                Coalesce(TrigramWordSimilarity(terms, 'category'), Value(0.0)) * FIELD_WEIGHTS['category'],
+            )
+        )})
+
+    def filter_inverted_index(self, queryset, terms):
+        scores = get_search_index().search(terms)
+        return queryset.filter(id__in=list(scores)).annotate(**{self.rank_annotation: Case(
+            *[When(id=supplement_id, then=Value(round(score, 4))) for supplement_id, score in scores.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )})
@@ -1,12 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from .models import Supplement, Rating, Comment, Condition, Brand, UserUpvote, Profile
+from .models import Supplement, Rating, Comment, Condition, Brand, Profile, MediaBlob, ImportJob
+from .upvotes import get_upvote_lookup
+from .comment_tree import get_comment_tree
+from .image_ingest import ImageRejected, validate_upload
+from .image_variants import get_variant_lookup
+from .import_jobs import import_result_for
+from .s3 import get_signer, s3_key_for
+from .storage import public_media_enabled, public_media_url
 import logging
 from django.conf import settings
-import boto3
-from botocore.client import Config
-from botocore.exceptions import ClientError
+from django.core.files.storage import default_storage
+from django.db import models
 from django.db.models import Count
 import os
 
@@ -14,41 +20,162 @@ logger = logging.getLogger(__name__)
 
 def get_presigned_s3_url(image_field):
     """
-    Generates a presigned S3 URL for a given ImageField.
+    Returns a presigned S3 URL for a given ImageField, from the shared signer's cache when possible.
     Returns None if generation fails or the image does not exist.
     """
     if not image_field or not hasattr(image_field, 'name') or not image_field.name:
         return None
-    
-    try:
-        s3_key = image_field.name
-        # Prepend AWS_LOCATION if it's not already part of the key
-        if settings.AWS_LOCATION and not s3_key.startswith(settings.AWS_LOCATION + '/'):
-                s3_key = f"{settings.AWS_LOCATION.strip('/')}/{s3_key.lstrip('/')}"
-        
-        logger.info(f"Generating presigned URL for S3 key: {s3_key}")
-
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME,
-            config=Config(signature_version='s3v4')
-        )
-        
-        presigned_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': s3_key},
-            ExpiresIn=settings.AWS_QUERYSTRING_EXPIRE
-        )
-        logger.info(f"Successfully generated presigned URL for key: {s3_key}")
-        return presigned_url
-    except ClientError as e:
-        logger.error(f"ClientError generating presigned URL for S3 key {s3_key}: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected error in get_presigned_s3_url for key {s3_key if 's3_key' in locals() else 'unknown'}: {e}", exc_info=True)
+    return get_signer().sign(s3_key_for(image_field.name))
+
+def get_profile_picture_url(profile):
+    """
+    Stable unsigned URL of the content-addressed public copy when public media
+    is enabled and one exists; otherwise a presigned URL for the private image.
+    """
+    if public_media_enabled() and profile.public_image:
+        return public_media_url(profile.public_image)
+    return get_presigned_s3_url(profile.image)
+
+def presign_images(objects):
+    """
+    Signs the images of a page of ratings/comments (and their authors' profile
+    pictures) in one sign_many call, so per-object get_presigned_s3_url calls hit the cache.
+    """
+    if not settings.IS_PRODUCTION:
+        return
+    keys = []
+    for obj in objects:
+        image = getattr(obj, 'image', None)
+        if image and image.name:
+            keys.append(s3_key_for(image.name))
+        profile = getattr(getattr(obj, 'user', None), 'profile', None)
+        if profile is not None and profile.public_image and public_media_enabled():
+            profile = None  # served unsigned from public storage
+        if profile is not None and profile.image and profile.image.name and 'default.jpg' not in profile.image.name:
+            keys.append(s3_key_for(profile.image.name))
+    if keys:
+        get_signer().sign_many(keys)
+
+def validate_image_upload(value, profile_name):
+    """Rejects undecodable or oversized uploads from the header alone, before anything is stored."""
+    if value:
+        try:
+            validate_upload(value, profile_name)
+        except ImageRejected as e:
+            raise serializers.ValidationError(str(e))
+    return value
+
+def delete_unshared_image(image_field):
+    """
+    Deletes an image file that is being replaced, unless it is a deduplicated
+    MediaBlob; those are released by the model's save() and only deleted once
+    no row references them.
+    """
+    if MediaBlob.objects.filter(name=image_field.name).exists():
+        return
+    image_field.delete(save=False)
+
+def get_media_url(name, request=None):
+    """URL for a stored file name: presigned in production, absolute local media URL otherwise."""
+    if settings.IS_PRODUCTION:
+        return get_signer().sign(s3_key_for(name))
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+def get_image_variants(image_field, context):
+    """
+    Width renditions of a processed image as [{width, height, url}], narrowest
+    first and ending with the full-size image; [] while the upload is still
+    processing and for images stored before variants existed.
+    """
+    if not image_field or not image_field.name or 'default.jpg' in image_field.name:
+        return []
+    request = context.get('request')
+    return [
+        {'width': variant.width, 'height': variant.height, 'url': get_media_url(variant.name, request)}
+        for variant in get_variant_lookup(context).variants(image_field.name)
+    ]
+
+def prime_image_variants(context, objects):
+    """
+    Loads the variants of a page of ratings/comments and their authors' profile
+    pictures in one query, and signs their URLs in one batch in production.
+    """
+    names = []
+    for obj in objects:
+        image = getattr(obj, 'image', None)
+        if image and image.name:
+            names.append(image.name)
+        profile = getattr(getattr(obj, 'user', None), 'profile', None)
+        if profile is not None and profile.image and profile.image.name:
+            names.append(profile.image.name)
+    lookup = get_variant_lookup(context)
+    lookup.prime(names)
+    if settings.IS_PRODUCTION:
+        keys = [
+            s3_key_for(variant.name)
+            for name in names for variant in lookup.variants(name)
+            if variant.name != variant.image_name
+        ]
+        if keys:
+            get_signer().sign_many(keys)
+
+def parse_field_paths(value):
+    """
+    Turns a comma-separated list of dotted paths ("ratings,ratings.comments")
+    into a nested dict ({'ratings': {'comments': {}}}). Returns None when no
+    value is given, which callers treat as "no restriction".
+    """
+    if value is None:
         return None
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in [p.strip() for p in path.split('.') if p.strip()]:
+            node = node.setdefault(part, {})
+    return tree
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin for sparse fieldsets (`fields`) and nested expansion (`expand`).
+    Both take the nested dicts built by parse_field_paths. Fields listed in
+    `expandable_fields` are only rendered when expanded; dropped fields are removed
+    before representation, so their nested querysets are never built.
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        self._requested_fields = kwargs.pop('fields', None)
+        self._expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self._requested_fields:
+            keep = set(self._requested_fields) | set(self._expand or {})
+            for name in list(fields):
+                if name not in keep:
+                    fields.pop(name)
+        for name in self.expandable_fields:
+            if not self.is_expanded(name):
+                fields.pop(name, None)
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, DynamicFieldsMixin):
+                options = self.nested_options(name)
+                nested._requested_fields = options['fields']
+                nested._expand = options['expand']
+        return fields
+
+    def nested_options(self, name):
+        """kwargs to hand to a serializer built for the nested field `name`."""
+        return {
+            'fields': (self._requested_fields or {}).get(name) or None,
+            'expand': None if self._expand is None else self._expand.get(name, {}),
+        }
+
+    def is_expanded(self, name):
+        return self._expand is None or name in self._expand
 
 class ConditionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -57,11 +184,12 @@ class ConditionSerializer(serializers.ModelSerializer):
 
 class PublicProfileUserSerializer(serializers.ModelSerializer):
     profile_image_url = serializers.SerializerMethodField()
+    profile_image_variants = serializers.SerializerMethodField()
     # Explicitly NOT including chronic_conditions here
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'profile_image_url']
+        fields = ['id', 'username', 'profile_image_url', 'profile_image_variants']
 
     def get_profile_image_url(self, obj):
         request = self.context.get('request')
@@ -69,7 +197,7 @@ class PublicProfileUserSerializer(serializers.ModelSerializer):
 
         if hasattr(obj, 'profile') and obj.profile.image and obj.profile.image.name and 'default.jpg' not in obj.profile.image.name:
             if settings.IS_PRODUCTION:
-                image_url = get_presigned_s3_url(obj.profile.image)
+                image_url = get_profile_picture_url(obj.profile)
             elif hasattr(obj.profile.image, 'url'):
                 if request:
                     image_url = request.build_absolute_uri(obj.profile.image.url)
@@ -87,6 +215,10 @@ class PublicProfileUserSerializer(serializers.ModelSerializer):
                 
         return image_url
 
+    def get_profile_image_variants(self, obj):
+        profile = getattr(obj, 'profile', None)
+        return get_image_variants(profile.image if profile is not None else None, self.context)
+
 class RegisterUserSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(required=True)
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -129,7 +261,7 @@ class RegisterUserSerializer(serializers.ModelSerializer):
 
         if hasattr(obj, 'profile') and obj.profile.image and obj.profile.image.name and 'default.jpg' not in obj.profile.image.name:
             if settings.IS_PRODUCTION:
-                image_url = get_presigned_s3_url(obj.profile.image)
+                image_url = get_profile_picture_url(obj.profile)
             elif hasattr(obj.profile.image, 'url'):
                 if request:
                     image_url = request.build_absolute_uri(obj.profile.image.url)
@@ -155,12 +287,13 @@ class RegisterUserSerializer(serializers.ModelSerializer):
 
 class BasicUserSerializer(serializers.ModelSerializer):
     profile_image_url = serializers.SerializerMethodField()
+    profile_image_variants = serializers.SerializerMethodField()
     chronic_conditions = serializers.SerializerMethodField()
     comments = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'profile_image_url', 'chronic_conditions', 'is_staff', 'comments']
+        fields = ['id', 'username', 'profile_image_url', 'profile_image_variants', 'chronic_conditions', 'is_staff', 'comments']
 
     def get_profile_image_url(self, obj):
         request = self.context.get('request')
@@ -168,7 +301,7 @@ class BasicUserSerializer(serializers.ModelSerializer):
 
         if hasattr(obj, 'profile') and obj.profile.image and obj.profile.image.name and 'default.jpg' not in obj.profile.image.name:
             if settings.IS_PRODUCTION:
-                image_url = get_presigned_s3_url(obj.profile.image)
+                image_url = get_profile_picture_url(obj.profile)
             elif hasattr(obj.profile.image, 'url'):
                 if request:
                     image_url = request.build_absolute_uri(obj.profile.image.url)
@@ -186,6 +319,10 @@ class BasicUserSerializer(serializers.ModelSerializer):
                 
         return image_url
 
+    def get_profile_image_variants(self, obj):
+        profile = getattr(obj, 'profile', None)
+        return get_image_variants(profile.image if profile is not None else None, self.context)
+
     def get_chronic_conditions(self, obj):
         if hasattr(obj, 'profile') and hasattr(obj.profile, 'chronic_conditions'):
             conditions = obj.profile.chronic_conditions.all()
@@ -196,25 +333,66 @@ class BasicUserSerializer(serializers.ModelSerializer):
         comments_queryset = obj.comment_set.all()
         return CommentSerializer(comments_queryset, many=True, context=self.context).data
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentListSerializer(serializers.ListSerializer):
+    """Loads the reply threads and upvote state of every comment in the list, one fetch each."""
+
+    def to_representation(self, data):
+        comments = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        comment_ids = [comment.id for comment in comments]
+        if 'replies' in self.child.fields:
+            tree = get_comment_tree(self.context)
+            tree.load_replies(comment_ids)
+            comment_ids += tree.by_id
+            presign_images(tree.by_id.values())
+            prime_image_variants(self.context, tree.by_id.values())
+        upvotes = get_upvote_lookup(self.context)
+        if upvotes is not None and 'has_upvoted' in self.child.fields:
+            upvotes.load(comment_ids=comment_ids)
+        presign_images(comments)
+        prime_image_variants(self.context, comments)
+        return super().to_representation(comments)
+
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('replies',)
+
     user = PublicProfileUserSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
+    # Direct replies left out because the thread reached the tree's max depth
+    more_replies = serializers.SerializerMethodField()
     is_edited = serializers.BooleanField(read_only=True)
     has_upvoted = serializers.SerializerMethodField()
     supplement_id = serializers.SerializerMethodField()
     supplement_name = serializers.SerializerMethodField()
     rating_id = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
         fields = ['id', 'user', 'rating', 'parent_comment', 'content', 
-                 'created_at', 'replies', 'is_edited', 'upvotes', 'has_upvoted', 'image',
-                 'supplement_id', 'supplement_name', 'rating_id']
-        read_only_fields = ['is_edited', 'upvotes', 'has_upvoted']
+                 'created_at', 'replies', 'more_replies', 'is_edited', 'upvotes', 'has_upvoted', 'image',
+                 'image_variants', 'image_status', 'supplement_id', 'supplement_name', 'rating_id']
+        read_only_fields = ['is_edited', 'upvotes', 'has_upvoted', 'image_status']
+        list_serializer_class = CommentListSerializer
+
+    def __init__(self, *args, **kwargs):
+        # How far below the first serialized comment this one is nested
+        self.reply_depth = kwargs.pop('reply_depth', 0)
+        super().__init__(*args, **kwargs)
 
     def get_replies(self, obj):
-        replies_queryset = Comment.objects.filter(parent_comment=obj)
-        return CommentSerializer(replies_queryset, many=True, context=self.context).data
+        tree = get_comment_tree(self.context)
+        if self.reply_depth >= tree.max_depth:
+            return []
+        return CommentSerializer(
+            tree.replies(obj.id), many=True, context=self.context,
+            reply_depth=self.reply_depth + 1, **self.nested_options('replies')
+        ).data
+
+    def get_more_replies(self, obj):
+        tree = get_comment_tree(self.context)
+        if self.reply_depth >= tree.max_depth:
+            return len(tree.replies(obj.id))
+        return 0
 
     def update(self, instance, validated_data):
         instance.is_edited = True
@@ -223,44 +401,36 @@ class CommentSerializer(serializers.ModelSerializer):
         return instance
 
     def get_has_upvoted(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserUpvote.objects.filter(user=request.user, comment=obj).exists()
-        return False
+        upvotes = get_upvote_lookup(self.context)
+        if upvotes is None:
+            return False
+        return upvotes.has_upvoted_comment(obj.id)
 
     def get_supplement_id(self, obj):
-        comment = obj
-        while comment:
-            if comment.rating:
-                return comment.rating.supplement_id
-            comment = comment.parent_comment
-        return None
+        return obj.supplement_id
 
     def get_supplement_name(self, obj):
-        comment = obj
-        while comment:
-            if comment.rating and comment.rating.supplement:
-                return comment.rating.supplement.name
-            comment = comment.parent_comment
-        return None
+        return obj.supplement.name if obj.supplement_id else None
 
     def get_rating_id(self, obj):
-        comment = obj
-        while comment:
-            if comment.rating:
-                return comment.rating.id
-            comment = comment.parent_comment
-        return None
+        return obj.root_rating_id
+
+    def validate_image(self, value):
+        return validate_image_upload(value, Comment.image_profile)
+
+    def get_image_variants(self, obj):
+        return get_image_variants(obj.image, self.context)
 
 class ProfileSerializer(serializers.ModelSerializer):
     user = BasicUserSerializer(read_only=True)
     chronic_conditions = ConditionSerializer(many=True, read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
-        fields = ['user', 'image', 'chronic_conditions', 'image_url']
-        read_only_fields = ['user', 'image']
+        fields = ['user', 'image', 'chronic_conditions', 'image_url', 'image_variants', 'image_status']
+        read_only_fields = ['user', 'image', 'image_status']
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -270,7 +440,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         if obj.image and hasattr(obj.image, 'name') and obj.image.name and 'default.jpg' not in obj.image.name:
             # In production, we need to generate a presigned URL for S3
             if settings.IS_PRODUCTION:
-                image_url = get_presigned_s3_url(obj.image)
+                image_url = get_profile_picture_url(obj)
             # In development, just build the full local URL
             elif hasattr(obj.image, 'url'):
                 image_url = request.build_absolute_uri(obj.image.url) if request else obj.image.url
@@ -286,6 +456,9 @@ class ProfileSerializer(serializers.ModelSerializer):
 
         return image_url
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj.image, self.context)
+
 class ProfileImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
@@ -293,10 +466,11 @@ class ProfileImageSerializer(serializers.ModelSerializer):
 
 class ProfileImageUrlSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
-        fields = ['image_url']
+        fields = ['image_url', 'image_variants', 'image_status']
 
     def get_image_url(self, obj):
         logger.info("SUCCESS: Using ProfileImageUrlSerializer to generate image URL.")
@@ -312,7 +486,7 @@ class ProfileImageUrlSerializer(serializers.ModelSerializer):
 
         # Production: Generate a presigned URL for non-default images
         if settings.IS_PRODUCTION:
-            return get_presigned_s3_url(obj.image)
+            return get_profile_picture_url(obj)
         
         # Development: Build absolute URI for non-default images
         if hasattr(obj.image, 'url'):
@@ -322,12 +496,37 @@ class ProfileImageUrlSerializer(serializers.ModelSerializer):
         
         return None # Should not be reached
 
-class RatingSerializer(serializers.ModelSerializer):
+    def get_image_variants(self, obj):
+        return get_image_variants(obj.image, self.context)
+
+class RatingListSerializer(serializers.ListSerializer):
+    """Loads the comment threads and upvote state of every rating in the list, one fetch each."""
+
+    def to_representation(self, data):
+        ratings = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        comment_ids = []
+        if 'comments' in self.child.fields:
+            tree = get_comment_tree(self.context)
+            tree.load_for_ratings(rating.id for rating in ratings)
+            comment_ids = list(tree.by_id)
+            presign_images(tree.by_id.values())
+            prime_image_variants(self.context, tree.by_id.values())
+        upvotes = get_upvote_lookup(self.context)
+        if upvotes is not None and 'has_upvoted' in self.child.fields:
+            # The threads' comments ride along, so has_upvoted across the whole page is one query
+            upvotes.load(rating_ids=[rating.id for rating in ratings], comment_ids=comment_ids)
+        presign_images(ratings)
+        prime_image_variants(self.context, ratings)
+        return super().to_representation(ratings)
+
+class RatingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('comments',)
+
     user = PublicProfileUserSerializer(read_only=True)
     condition_names = serializers.SerializerMethodField()
     benefit_names = serializers.SerializerMethodField()
     side_effect_names = serializers.SerializerMethodField()
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
     has_upvoted = serializers.SerializerMethodField()
     conditions = serializers.PrimaryKeyRelatedField(
         many=True, queryset=Condition.objects.all()
@@ -341,6 +540,7 @@ class RatingSerializer(serializers.ModelSerializer):
     supplement = serializers.PrimaryKeyRelatedField(queryset=Supplement.objects.all())
     supplement_display = serializers.StringRelatedField(source='supplement', read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     comments_count = serializers.IntegerField(read_only=True)
 
     class Meta:
@@ -353,12 +553,15 @@ class RatingSerializer(serializers.ModelSerializer):
             'upvotes', 'has_upvoted', 
             'image',
             'image_url',
+            'image_variants',
+            'image_status',
             'comments_count'
         ]
-        read_only_fields = ['user', 'upvotes', 'has_upvoted']
+        read_only_fields = ['user', 'upvotes', 'has_upvoted', 'image_status']
         extra_kwargs = {
             'image': {'write_only': True, 'required': False}
         }
+        list_serializer_class = RatingListSerializer
 
     def get_condition_names(self, obj):
         return [condition.name for condition in obj.conditions.all()]
@@ -390,6 +593,12 @@ class RatingSerializer(serializers.ModelSerializer):
         
         return None
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj.image, self.context)
+
+    def validate_image(self, value):
+        return validate_image_upload(value, Rating.image_profile)
+
     def create(self, validated_data):
         conditions_data = validated_data.pop('conditions', [])
         benefits_data = validated_data.pop('benefits', [])
@@ -437,14 +646,14 @@ class RatingSerializer(serializers.ModelSerializer):
             if image_payload is None or image_payload == '': # Explicitly clearing the image
                 if instance.image:
                     try:
-                        instance.image.delete(save=False) # save=False as instance.save() is called later
+                        delete_unshared_image(instance.image) # instance.save() is called later
                     except Exception as e:
                         logger.error(f"Error deleting existing image for rating {instance.id}: {e}")
                 instance.image = None # Set field to None
             else: # New image uploaded (image_payload is a File object)
                 if instance.image: # If there's an old image, delete it first
                     try:
-                        instance.image.delete(save=False)
+                        delete_unshared_image(instance.image)
                     except Exception as e:
                         logger.error(f"Error deleting old image for rating {instance.id} before update: {e}")
                 instance.image = image_payload # Assign new image file
@@ -466,13 +675,19 @@ class RatingSerializer(serializers.ModelSerializer):
         return instance
 
     def get_has_upvoted(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserUpvote.objects.filter(user=request.user, rating=obj).exists()
-        return False
+        upvotes = get_upvote_lookup(self.context)
+        if upvotes is None:
+            return False
+        return upvotes.has_upvoted_rating(obj.id)
 
+    def get_comments(self, obj):
+        comments = get_comment_tree(self.context).comments_for_rating(obj.id)
+        return CommentSerializer(comments, many=True, context=self.context, **self.nested_options('comments')).data
+
+
+class SupplementSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('ratings',)
 
-class SupplementSerializer(serializers.ModelSerializer):
     ratings = serializers.SerializerMethodField()
     avg_rating = serializers.FloatField(read_only=True)
     rating_count = serializers.IntegerField(read_only=True)
@@ -496,7 +711,7 @@ class SupplementSerializer(serializers.ModelSerializer):
         #         if condition_names:
         #             ratings_queryset = ratings_queryset.filter(conditions__name__in=condition_names).distinct()
 
-        return RatingSerializer(ratings_queryset, many=True, context=self.context).data
+        return RatingSerializer(ratings_queryset, many=True, context=self.context, **self.nested_options('ratings')).data
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -505,6 +720,27 @@ class BrandSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 
+class ImportJobSerializer(serializers.ModelSerializer):
+    """Progress of a background CSV import, polled by the admin upload page."""
+    percent = serializers.FloatField(read_only=True)
+    eta_seconds = serializers.FloatField(read_only=True)
+    message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'kind', 'status', 'total_rows', 'rows_processed', 'percent', 'eta_seconds',
+            'created_count', 'updated_count', 'unchanged_count', 'duplicate_count',
+            'row_error_count', 'row_errors', 'error', 'message', 'created_at', 'updated_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_message(self, obj):
+        if obj.status != ImportJob.DONE:
+            return None
+        return import_result_for(obj).message
+
+
 class PublicRatingSerializer(RatingSerializer):
     # Explicitly define supplement_name to ensure it's correctly populated
     supplement_name = serializers.SerializerMethodField()
@@ -519,6 +755,8 @@ class PublicRatingSerializer(RatingSerializer):
             'comment', 
             'created_at', 
             'image_url', 
+            'image_variants',
+            'image_status',
             'condition_names', 
             'benefit_names', 
             'side_effect_names', 
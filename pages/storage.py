@@ -0,0 +1,64 @@
+# pages/storage.py
+
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_public_storage = None
+
+
+def public_media_enabled():
+    return getattr(settings, 'PUBLIC_MEDIA_ENABLED', False)
+
+
+def get_public_storage():
+    """
+    Storage for processed, shareable images (avatars, thumbnails) under the
+    PUBLIC_MEDIA_LOCATION prefix. On S3 objects are written with an immutable
+    Cache-Control and served by unsigned URLs (the prefix is made public-read by
+    bucket policy, or by PUBLIC_MEDIA_ACL where ACLs are enabled); in development
+    it is a folder under MEDIA_ROOT.
+    """
+    global _public_storage
+    if _public_storage is None:
+        location = getattr(settings, 'PUBLIC_MEDIA_LOCATION', 'public')
+        if settings.IS_PRODUCTION:
+            from storages.backends.s3boto3 import S3Boto3Storage
+
+            _public_storage = S3Boto3Storage(
+                location=f"{settings.AWS_LOCATION.strip('/')}/{location}",
+                querystring_auth=False,
+                file_overwrite=True,
+                default_acl=getattr(settings, 'PUBLIC_MEDIA_ACL', None),
+                object_parameters={'CacheControl': IMMUTABLE_CACHE_CONTROL},
+                custom_domain=getattr(settings, 'PUBLIC_MEDIA_DOMAIN', None) or settings.AWS_S3_CUSTOM_DOMAIN,
+            )
+        else:
+            _public_storage = FileSystemStorage(
+                location=os.path.join(settings.MEDIA_ROOT, location),
+                base_url=f"{settings.MEDIA_URL}{location}/",
+            )
+    return _public_storage
+
+
+def save_content_addressed(content, prefix, extension):
+    """
+    Stores bytes under <prefix>/<sha256>.<extension> and returns that name. The
+    name changes whenever the content does, so the object can be cached forever;
+    identical content is written once.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    name = f'{prefix}/{digest}.{extension}'
+    storage = get_public_storage()
+    if not storage.exists(name):
+        storage.save(name, ContentFile(content))
+    return name
+
+
+def public_media_url(name):
+    return get_public_storage().url(name)
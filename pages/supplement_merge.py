@@ -0,0 +1,194 @@
+# pages/supplement_merge.py
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, Value, When
+
+from .models import (
+    Comment, DataVersion, MediaBlob, Rating, Supplement, SupplementAlias, SupplementConditionStats,
+    SupplementRatingStats, UserUpvote,
+)
+
+# Caps the WHEN branches in one remapping UPDATE
+REMAP_BATCH_SIZE = 500
+
+
+def remap(queryset, field, mapping):
+    """Rewrites field from each key of mapping to its value, a batch of keys per UPDATE. Returns rows changed."""
+    changed = 0
+    items = list(mapping.items())
+    for start in range(0, len(items), REMAP_BATCH_SIZE):
+        batch = dict(items[start:start + REMAP_BATCH_SIZE])
+        changed += queryset.filter(**{f'{field}__in': batch}).update(**{
+            field: Case(*[When(**{field: old}, then=Value(new)) for old, new in batch.items()])
+        })
+    return changed
+
+
+class SupplementMerge:
+    """
+    Folds one supplement (source) into another (target) and deletes the source.
+
+    Ratings move with one UPDATE ... WHERE NOT EXISTS. A user who rated both
+    supplements is a conflict: the target's rating is kept, or with keep_newer
+    whichever was updated last. The rating that loses hands its comments and
+    any upvotes its winner doesn't already have to the winner and is deleted.
+    plan() only reads, so a dry run reports exactly what apply() would do.
+    """
+
+    def __init__(self, source, target, keep_newer=False):
+        self.source = source
+        self.target = target
+        self.keep_newer = keep_newer
+        self.transferred = 0
+        self.comments_moved = 0
+        self.upvotes_moved = 0
+        # One entry per user who rated both: username, both rating ids and which one is kept
+        self.conflicts = []
+        # Losing rating id -> the rating it folds into
+        self.replaced = {}
+        # UserUpvote id -> the winning rating it moves to
+        self.upvote_moves = {}
+
+    def plan(self):
+        target_rating = Rating.objects.filter(supplement=self.target, user=OuterRef('user_id'))
+        overlapping = (
+            Rating.objects.filter(supplement=self.source)
+            .annotate(
+                target_rating_id=Subquery(target_rating.values('id')[:1]),
+                target_updated_at=Subquery(target_rating.values('updated_at')[:1]),
+            )
+            .filter(target_rating_id__isnull=False)
+            .order_by('user__username')
+            .values_list('id', 'user__username', 'updated_at', 'target_rating_id', 'target_updated_at')
+        )
+        for source_id, username, source_updated_at, target_id, target_updated_at in overlapping:
+            keep_source = self.keep_newer and source_updated_at > target_updated_at
+            self.conflicts.append({
+                'user': username,
+                'source_rating': source_id,
+                'target_rating': target_id,
+                'kept': 'source' if keep_source else 'target',
+            })
+            if keep_source:
+                self.replaced[target_id] = source_id
+            else:
+                self.replaced[source_id] = target_id
+
+        self.transferred = Rating.objects.filter(supplement=self.source).count() - len(self.conflicts)
+        if self.keep_newer:
+            self.transferred += sum(conflict['kept'] == 'source' for conflict in self.conflicts)
+
+        if self.replaced:
+            already_upvoted = set(
+                UserUpvote.objects.filter(rating_id__in=set(self.replaced.values())).values_list('user_id', 'rating_id')
+            )
+            for upvote_id, user_id, rating_id in UserUpvote.objects.filter(
+                rating_id__in=self.replaced
+            ).values_list('id', 'user_id', 'rating_id'):
+                if (user_id, self.replaced[rating_id]) not in already_upvoted:
+                    self.upvote_moves[upvote_id] = self.replaced[rating_id]
+        self.upvotes_moved = len(self.upvote_moves)
+        self.comments_moved = Comment.objects.filter(
+            Q(supplement=self.source) | Q(root_rating_id__in=self.replaced)
+        ).count()
+        return self
+
+    def apply(self):
+        """Carries out the plan; call inside the transaction plan() ran in."""
+        if self.replaced:
+            self.fold_conflicts()
+
+        clashing = Rating.objects.filter(supplement=self.target, user=OuterRef('user_id'))
+        self.transferred = (
+            Rating.objects.filter(supplement=self.source)
+            .filter(~Exists(clashing))
+            .update(supplement=self.target)
+        )
+        # Comments carry their thread's supplement; everything still under the source now hangs off the target
+        Comment.objects.filter(supplement=self.source).update(supplement=self.target)
+        SupplementAlias.objects.filter(supplement=self.source).update(supplement=self.target)
+
+        source_id = self.source.pk
+        self.source.delete()
+
+        # Queryset updates skip the receivers that maintain stats and response versions
+        SupplementRatingStats.rebuild([self.target.pk])
+        SupplementConditionStats.rebuild([self.target.pk])
+        DataVersion.bump_on_commit([source_id, self.target.pk])
+
+    def fold_conflicts(self):
+        remap(Comment.objects.all(), 'rating_id', self.replaced)
+        remap(Comment.objects.all(), 'root_rating_id', self.replaced)
+
+        if self.upvote_moves:
+            moved_to = {}
+            for winner_id in self.upvote_moves.values():
+                moved_to[winner_id] = moved_to.get(winner_id, 0) + 1
+            upvote_ids = list(self.upvote_moves)
+            for start in range(0, len(upvote_ids), REMAP_BATCH_SIZE):
+                batch = upvote_ids[start:start + REMAP_BATCH_SIZE]
+                UserUpvote.objects.filter(pk__in=batch).update(rating_id=Case(
+                    *[When(pk=upvote_id, then=Value(self.upvote_moves[upvote_id])) for upvote_id in batch]
+                ))
+            # Add to the stored counters rather than recounting, which would drop upvotes recorded without a row
+            for start in range(0, len(moved_to), REMAP_BATCH_SIZE):
+                batch = dict(list(moved_to.items())[start:start + REMAP_BATCH_SIZE])
+                Rating.objects.filter(pk__in=batch).update(upvotes=Case(
+                    *[When(pk=winner_id, then=F('upvotes') + count) for winner_id, count in batch.items()]
+                ))
+
+        self.delete_losers()
+
+    def delete_losers(self):
+        """
+        Deletes the losing ratings set-wise. A queryset delete() would run the
+        per-row stats and version receivers for each one; apply() rebuilds
+        stats and bumps versions once instead, so only their media is released here.
+        """
+        losers = Rating.objects.filter(pk__in=self.replaced)
+        for image_name in losers.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True):
+            MediaBlob.release_on_commit(image_name)
+        for field_name in (*SupplementConditionStats.ROLE_FIELDS, 'linked_brands'):
+            getattr(Rating, field_name).through.objects.filter(rating_id__in=self.replaced).delete()
+        # Upvotes their winner already had; the rest moved in fold_conflicts
+        UserUpvote.objects.filter(rating_id__in=self.replaced)._raw_delete(UserUpvote.objects.db)
+        losers._raw_delete(Rating.objects.db)
+
+    def run(self, dry_run=False):
+        with transaction.atomic():
+            if not dry_run:
+                # Writing a rating takes a key-share lock on its supplement, so this holds off new ratings until commit
+                list(Supplement.objects.select_for_update().filter(pk__in=[self.source.pk, self.target.pk]).values_list('pk'))
+            self.plan()
+            if not dry_run:
+                self.apply()
+        return self
+
+    def message(self, dry_run=False):
+        source_name, target_name = self.source.name, self.target.name
+        if dry_run:
+            message = (
+                f"Dry run, nothing was changed. Deleting '{source_name}' would transfer "
+                f"{self.transferred} ratings to '{target_name}'."
+            )
+        else:
+            message = f"Supplement '{source_name}' deleted. {self.transferred} ratings transferred to '{target_name}'."
+        if self.conflicts:
+            kept_source = sum(conflict['kept'] == 'source' for conflict in self.conflicts)
+            message += f" {len(self.conflicts)} users had rated both supplements;"
+            if self.keep_newer:
+                message += f" the newer rating was kept ({kept_source} from '{source_name}')"
+            else:
+                message += f" their ratings on '{target_name}' were kept"
+            message += " and the other rating's comments and upvotes moved to it."
+        return message
+
+    def as_response_data(self, dry_run=False):
+        return {
+            'message': self.message(dry_run),
+            'dry_run': dry_run,
+            'transferred': self.transferred,
+            'conflicts': self.conflicts,
+            'comments_moved': self.comments_moved,
+            'upvotes_moved': self.upvotes_moved,
+        }
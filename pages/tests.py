@@ -1,3 +1,1037 @@
-from django.test import TestCase
+import io
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import image_jobs, import_jobs, search, storage
+from .condition_merge import ConditionMerge
+from .csv_import import SPECS, BulkImporter, ImportFileError, ImportSpec
+from .import_jobs import IMPORT_SPECS
+from .models import (
+    IMAGE_STATUS_READY, Brand, Comment, Condition, DataVersion, ImageProcessingJob, ImageVariant, ImportJob, MediaBlob,
+    Profile, Rating, Supplement, SupplementAlias, SupplementConditionStats, SupplementRatingStats, UserUpvote,
+)
+from .s3 import FakeS3Client, PresignedURLSigner, set_signer
+from .supplement_merge import SupplementMerge
+from .upvotes import toggle_upvote
+
+# Anonymous list/detail bodies would otherwise be served from the response cache, which outlives each test's data
+without_response_cache = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'responses': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+})
+
+
+@without_response_cache
+class SigningEpochETagTests(TestCase):
+    """ETags must change before any presigned link in the body they stand for expires."""
+
+    def setUp(self):
+        self.supplement = Supplement.objects.create(name='Magnesium', category='Mineral')
+        # Aligned to both the reuse window and the safety margin, so the offsets below cover every phase
+        self.now = 3000 * 600000.0
+        self.signer = PresignedURLSigner(
+            FakeS3Client, 'test-bucket', expires_in=3600, safety_margin=600, clock=lambda: self.now,
+        )
+        self.addCleanup(set_signer, set_signer(self.signer))
+        patcher = mock.patch('pages.s3.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def etag(self):
+        response = self.client.get(f'/api/supplements/{self.supplement.pk}/')
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    @override_settings(IS_PRODUCTION=True)
+    def test_etag_changes_by_the_time_a_reused_link_expires(self):
+        base = self.now
+        for offset in range(0, 3600, 300):
+            self.signer.clear()
+            signed_at = base + offset
+            self.now = signed_at
+            url = self.signer.sign('ratings/photo.jpg')
+
+            # Served near the end of the reuse window, the body still carries the link signed earlier
+            self.now = signed_at + self.signer.reuse_window - 10
+            self.assertEqual(self.signer.sign('ratings/photo.jpg'), url)
+            etag = self.etag()
+
+            self.now = signed_at + self.signer.expires_in
+            self.assertNotEqual(self.etag(), etag, f'ETag outlived a link signed at +{offset}s')
+
+    def test_etag_is_stable_outside_production(self):
+        etag = self.etag()
+        self.now += 10 * 3600
+        self.assertEqual(self.etag(), etag)
+
+
+@without_response_cache
+class ConditionalResponseTests(TestCase):
+    """A 304 is only ever a stand-in for a 200 the same request would have received."""
+
+    def setUp(self):
+        self.supplement = Supplement.objects.create(name='Magnesium', category='Mineral')
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.other = User.objects.create_user('other', password='pw')
+        rating = Rating.objects.create(user=self.owner, supplement=self.supplement, score=4)
+        self.comment = Comment.objects.create(rating=rating, user=self.owner, content='Helped me sleep')
+        self.api = APIClient()
+
+    def get(self, url, **headers):
+        return self.api.get(url, headers=headers)
+
+    def test_matching_etag_is_not_modified(self):
+        url = f'/api/supplements/{self.supplement.pk}/'
+        etag = self.get(url)['ETag']
+        response = self.get(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_not_modified_detail_loads_no_object(self):
+        url = f'/api/supplements/{self.supplement.pk}/'
+        etag = self.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        # The version stamp and one EXISTS; never the annotated row
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(any('ratingstats' in query['sql'] for query in queries.captured_queries))
+
+    def test_missing_object_is_not_found_whatever_the_etag(self):
+        response = self.get('/api/supplements/999999/', **{'If-None-Match': '*'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_object_permissions_apply_before_not_modified(self):
+        url = f'/api/comments/{self.comment.pk}/'
+        self.api.force_authenticate(self.other)
+        self.assertEqual(self.get(url, **{'If-None-Match': '*'}).status_code, 403)
+
+        self.api.force_authenticate(self.owner)
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.get(url, **{'If-None-Match': '*'}).status_code, 304)
+
+    def test_username_change_retires_etag(self):
+        url = f'/api/supplements/{self.supplement.pk}/'
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.username = 'renamed'
+            self.owner.save()
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 200)
+
+    def test_avatar_change_retires_etag(self):
+        url = f'/api/supplements/{self.supplement.pk}/'
+        etag = self.get(url)['ETag']
+        profile = self.owner.profile
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.image_status = IMAGE_STATUS_READY
+            profile.save()
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 200)
+
+    def test_unrelated_user_save_keeps_etag(self):
+        url = f'/api/supplements/{self.supplement.pk}/'
+        etag = self.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.first_name = 'Ann'
+            self.owner.save()
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 304)
+
+
+@override_settings(IMAGE_JOB_RUNNER='thread')
+class ImageJobRetryTests(TestCase):
+    def setUp(self):
+        self.job = ImageProcessingJob.objects.create(model_label='pages.rating', object_id=1, source_name='ratings/upload.png')
+        for name, replacement in (('apply_job', mock.Mock(side_effect=OSError('storage unavailable'))), ('submit_job', mock.Mock())):
+            patcher = mock.patch.object(image_jobs, name, replacement)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_retryable_failure_is_resubmitted(self):
+        self.assertFalse(image_jobs.process_job(self.job.pk))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ImageProcessingJob.PENDING)
+        self.submit_job.assert_called_once_with(self.job.pk)
+
+    def test_last_attempt_is_not_resubmitted(self):
+        ImageProcessingJob.objects.filter(pk=self.job.pk).update(attempts=ImageProcessingJob.MAX_ATTEMPTS - 1)
+        image_jobs.process_job(self.job.pk)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ImageProcessingJob.FAILED)
+        self.submit_job.assert_not_called()
+
+    @override_settings(IMAGE_JOB_RUNNER='worker')
+    def test_worker_runner_leaves_retry_to_the_queue(self):
+        image_jobs.process_job(self.job.pk)
+        self.submit_job.assert_not_called()
+
+
+
+def png_upload(name='upload.png', color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(IMAGE_JOB_RUNNER='worker')
+class MediaBlobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch.object(storage, '_public_storage', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.supplement = Supplement.objects.create(name='Magnesium', category='Mineral')
+        self.first = Rating.objects.create(
+            user=User.objects.create_user('first'), supplement=self.supplement, score=4, image=png_upload(),
+        )
+        image_jobs.process_job(ImageProcessingJob.objects.get().pk)
+        self.first.refresh_from_db()
+        self.blob = MediaBlob.objects.get()
+
+    def rate_with_same_bytes(self):
+        return Rating.objects.create(
+            user=User.objects.create_user('second'), supplement=self.supplement, score=5, image=png_upload('again.png'),
+        )
+
+    def test_same_bytes_share_one_blob(self):
+        self.assertEqual(self.first.image.name, self.blob.name)
+        second = self.rate_with_same_bytes()
+        self.assertEqual(second.image.name, self.blob.name)
+        self.assertEqual(second.image_status, IMAGE_STATUS_READY)
+        self.assertEqual(ImageProcessingJob.objects.count(), 1)
+        self.blob.refresh_from_db()
+        self.assertEqual(self.blob.ref_count, 2)
+
+    def test_file_lives_until_the_last_reference_goes(self):
+        second = self.rate_with_same_bytes()
+        self.assertTrue(ImageVariant.objects.filter(image_name=self.blob.name).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.blob.refresh_from_db()
+        self.assertEqual(self.blob.ref_count, 1)
+        self.assertTrue(default_storage.exists(self.blob.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = png_upload('other.png', color='blue')
+            second.save()
+        self.assertFalse(MediaBlob.objects.filter(pk=self.blob.pk).exists())
+        self.assertFalse(ImageVariant.objects.filter(image_name=self.blob.name).exists())
+        self.assertFalse(default_storage.exists(self.blob.name))
+
+    def test_replacing_one_reference_keeps_the_file(self):
+        self.rate_with_same_bytes()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.image = png_upload('other.png', color='blue')
+            self.first.save()
+        self.blob.refresh_from_db()
+        self.assertEqual(self.blob.ref_count, 1)
+        self.assertTrue(default_storage.exists(self.blob.name))
+
+    def test_acquire_does_not_revive_a_blob_at_zero(self):
+        MediaBlob.objects.filter(pk=self.blob.pk).update(ref_count=0)
+        self.assertIsNone(MediaBlob.acquire(self.blob.content_hash, self.blob.image_profile))
+        self.blob.refresh_from_db()
+        self.assertEqual(self.blob.ref_count, 0)
+
+    def test_public_copy_goes_with_the_last_reference_unless_shared(self):
+        public = storage.get_public_storage()
+        public_name = public.save('avatars/copy.webp', ContentFile(b'webp'))
+        MediaBlob.objects.filter(pk=self.blob.pk).update(public_name=public_name)
+        # A profile from before deduplication still shows the same bytes
+        Profile.objects.filter(user=self.first.user).update(public_image=public_name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.assertFalse(MediaBlob.objects.filter(pk=self.blob.pk).exists())
+        self.assertTrue(public.exists(public_name))
+
+        blob = MediaBlob.objects.create(
+            content_hash='other', image_profile='avatar', name='profile_pics/other.webp', public_name=public_name, ref_count=1,
+        )
+        Profile.objects.filter(user=self.first.user).update(public_image='')
+        with self.captureOnCommitCallbacks(execute=True):
+            MediaBlob.release(blob.name)
+        self.assertFalse(public.exists(public_name))
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        # Versions roll back with each test, so never reuse an index built by another one
+        patcher = mock.patch.object(search, '_index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Supplement.objects.create(name='Ashwagandha', category='Herb')
+
+    def test_index_follows_a_write_committed_by_another_process(self):
+        self.assertEqual(search.get_search_index().search('rhodiola'), {})
+        # Another worker's write: none of this process's signals fire, only its stamp moves
+        Supplement.objects.bulk_create([Supplement(name='Rhodiola', category='Herb')])
+        DataVersion.bump([DataVersion.SEARCH])
+        rhodiola = Supplement.objects.get(name='Rhodiola')
+        self.assertIn(rhodiola.pk, search.get_search_index().search('rhodiola'))
+
+    def test_saving_a_supplement_bumps_the_stamp_on_commit(self):
+        index = search.get_search_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplement.objects.create(name='Rhodiola', category='Herb')
+        self.assertEqual(DataVersion.current([DataVersion.SEARCH]), [1])
+        self.assertIsNot(search.get_search_index(), index)
+
+    def test_index_is_reused_while_the_stamp_holds(self):
+        self.assertIs(search.get_search_index(), search.get_search_index())
+
+
+
+# A real backend for the response cache, so a receiver that forgets to move the stamp serves a stale HIT
+with_response_cache = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-responses'},
+})
+
+
+@with_response_cache
+class AnonymousResponseCacheTests(TestCase):
+    def setUp(self):
+        caches['responses'].clear()
+        patcher = mock.patch.object(search, '_index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.magnesium = Supplement.objects.create(name='Magnesium', category='Mineral')
+
+    def search(self, term):
+        response = self.client.get('/api/supplements/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeated_request_is_a_hit(self):
+        self.assertEqual(self.search('magnesium')['X-Cache'], 'MISS')
+        self.assertEqual(self.search('magnesium')['X-Cache'], 'HIT')
+
+    def test_detail_hit_loads_no_object(self):
+        url = f'/api/supplements/{self.magnesium.pk}/'
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertFalse(any('pages_supplement' in query['sql'] for query in queries.captured_queries))
+
+    def test_alias_changes_retire_cached_search_results(self):
+        self.assertEqual(self.search('epsomsalt').data, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            alias = SupplementAlias.objects.create(supplement=self.magnesium, alias='epsomsalt')
+        response = self.search('epsomsalt')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([row['id'] for row in response.data], [self.magnesium.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alias.delete()
+        response = self.search('epsomsalt')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data, [])
+
+class UpvoteLookupTests(TestCase):
+    def setUp(self):
+        self.voter = User.objects.create_user('voter')
+        supplements = Supplement.objects.bulk_create(
+            [Supplement(name=f'Supplement {i}', category='Test') for i in range(4)]
+        )
+        self.supplement = supplements[0]
+        authors = [User.objects.create_user(f'author{i}') for i in range(3)]
+        self.ratings = [
+            Rating.objects.create(user=author, supplement=supplement, score=3)
+            for author in authors for supplement in supplements
+        ]
+        self.comment = Comment.objects.create(rating=self.ratings[0], user=authors[1], content='Same here')
+        # Upvotes everywhere, so loading them all would be visible in the results and the query
+        UserUpvote.objects.bulk_create([UserUpvote(user=self.voter, rating=rating) for rating in self.ratings[1:]])
+        UserUpvote.objects.create(user=self.voter, comment=self.comment)
+        self.api = APIClient()
+        self.api.force_authenticate(self.voter)
+
+    def test_page_upvotes_are_loaded_for_its_ids_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get(f'/api/ratings/?supplement={self.supplement.pk}&expand=comments')
+        self.assertEqual(response.status_code, 200)
+        upvote_queries = [q['sql'] for q in queries.captured_queries if UserUpvote._meta.db_table in q['sql']]
+        self.assertEqual(len(upvote_queries), 1)
+        self.assertIn(' IN (', upvote_queries[0])
+
+        results = {rating['id']: rating for rating in response.data}
+        page_ratings = [rating for rating in self.ratings if rating.supplement_id == self.supplement.pk]
+        self.assertEqual(set(results), {rating.pk for rating in page_ratings})
+        for rating in page_ratings:
+            self.assertEqual(results[rating.pk]['has_upvoted'], rating != self.ratings[0])
+        self.assertTrue(results[self.ratings[0].pk]['comments'][0]['has_upvoted'])
+
+
+class ConcurrentUpvoteToggleTests(TransactionTestCase):
+    """Threads toggling upvotes as the same users must leave every counter equal to its UserUpvote rows."""
+    threads = 6
+    clicks = 60
+
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.users = [User.objects.create_user(f'clicker{i}') for i in range(8)]
+        supplement = Supplement.objects.create(name='Magnesium', category='Mineral')
+        self.rating = Rating.objects.create(user=author, supplement=supplement, score=3)
+        self.comment = Comment.objects.create(rating=self.rating, user=author, content='Helped me sleep')
+
+    def test_counters_match_rows_after_concurrent_toggles(self):
+        start = threading.Barrier(self.threads)
+        toggled = []
+
+        def clicker(seed):
+            clicks = random.Random(seed)
+            try:
+                start.wait()
+                for _ in range(self.clicks):
+                    target = self.rating if clicks.random() < 0.5 else self.comment
+                    try:
+                        toggle_upvote(clicks.choice(self.users), target)
+                        toggled.append(target)
+                    except DatabaseError:
+                        pass  # e.g. SQLite's "database is locked"; a failed toggle must still leave the counter right
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=clicker, args=(seed,)) for seed in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertTrue(toggled)
+
+        for field, target in (('rating', self.rating), ('comment', self.comment)):
+            upvotes = UserUpvote.objects.filter(**{field: target})
+            target.refresh_from_db(fields=['upvotes'])
+            self.assertEqual(target.upvotes, upvotes.count(), field)
+            self.assertFalse(upvotes.values('user').annotate(n=Count('id')).filter(n__gt=1).exists(), field)
+
+    def test_toggle_adds_then_removes(self):
+        user = self.users[0]
+        self.assertEqual(toggle_upvote(user, self.rating), (True, 1))
+        self.assertEqual(toggle_upvote(user, self.rating), (False, 0))
+        self.assertFalse(UserUpvote.objects.filter(user=user).exists())
+
+
+@without_response_cache
+class BrandFilterTests(TestCase):
+    def setUp(self):
+        Brand.objects.create(name='NOW Foods')
+        Brand.objects.create(name='Thorne')
+        author = User.objects.create_user('author')
+        self.magnesium = Supplement.objects.create(name='Magnesium', category='Mineral')
+        self.zinc = Supplement.objects.create(name='Zinc', category='Mineral')
+        Rating.objects.create(user=author, supplement=self.magnesium, score=4, brands='NOW Foods')
+        Rating.objects.create(user=author, supplement=self.zinc, score=2, brands='Thorne')
+
+    def listed(self, brands):
+        response = self.client.get('/api/supplements/', {'brands': brands})
+        self.assertEqual(response.status_code, 200)
+        return {row['id']: row['rating_count'] for row in response.data}
+
+    def test_brand_names_match_ignoring_case(self):
+        self.assertEqual(self.listed('now foods'), {self.magnesium.pk: 1})
+        self.assertEqual(self.listed('NOW FOODS, thorne'), {self.magnesium.pk: 1, self.zinc.pk: 1})
+
+    def test_unknown_brand_matches_nothing(self):
+        self.assertEqual(self.listed('Acme'), {})
+
+
+class RatingStatsTests(TestCase):
+    def setUp(self):
+        self.magnesium = Supplement.objects.create(name='Magnesium', category='Mineral')
+        self.zinc = Supplement.objects.create(name='Zinc', category='Mineral')
+        self.users = [User.objects.create_user(f'rater{i}') for i in range(3)]
+
+    def assertStats(self, supplement, rating_sum, rating_count):
+        stats = SupplementRatingStats.objects.get(supplement=supplement)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (rating_sum, rating_count))
+        self.assertEqual(stats.avg_rating, round(rating_sum / rating_count, 2) if rating_count else None)
+
+    def test_create_and_delete_adjust_stats(self):
+        first = Rating.objects.create(user=self.users[0], supplement=self.magnesium, score=2)
+        self.assertStats(self.magnesium, 2, 1)
+        second = Rating.objects.create(user=self.users[1], supplement=self.magnesium, score=5)
+        self.assertStats(self.magnesium, 7, 2)
+        self.assertEqual(SupplementRatingStats.objects.get(supplement=self.magnesium).last_rated_at, second.created_at)
+
+        second.delete()
+        self.assertStats(self.magnesium, 2, 1)
+        self.assertEqual(SupplementRatingStats.objects.get(supplement=self.magnesium).last_rated_at, first.created_at)
+        Rating.objects.filter(pk=first.pk).delete()
+        self.assertStats(self.magnesium, 0, 0)
+
+    def test_rebuild_restores_drifted_and_missing_rows(self):
+        Rating.objects.create(user=self.users[0], supplement=self.magnesium, score=3)
+        Rating.objects.create(user=self.users[1], supplement=self.magnesium, score=4)
+        SupplementRatingStats.objects.filter(supplement=self.magnesium).update(rating_sum=99, rating_count=1)
+        SupplementRatingStats.objects.filter(supplement=self.zinc).delete()
+        self.assertEqual(SupplementRatingStats.rebuild([self.magnesium.pk, self.zinc.pk]), 2)
+        self.assertStats(self.magnesium, 7, 2)
+        self.assertStats(self.zinc, 0, 0)
+
+    def test_score_change_is_applied_as_a_delta(self):
+        Rating.objects.create(user=self.users[0], supplement=self.magnesium, score=2)
+        rating_id = Rating.objects.create(user=self.users[1], supplement=self.magnesium, score=4).pk
+        rating = Rating.objects.get(pk=rating_id)
+        rating.score = 5
+        rating.save()
+        self.assertStats(self.magnesium, 7, 2)
+        # Saving the same instance again diffs against what that save wrote
+        rating.score = 1
+        rating.save()
+        self.assertStats(self.magnesium, 3, 2)
+
+    def test_moving_a_rating_moves_its_stats(self):
+        rating = Rating.objects.create(user=self.users[0], supplement=self.magnesium, score=4)
+        Rating.objects.create(user=self.users[1], supplement=self.zinc, score=2)
+        rating.supplement = self.zinc
+        rating.score = 3
+        rating.save()
+        self.assertStats(self.magnesium, 0, 0)
+        self.assertStats(self.zinc, 5, 2)
+
+    def test_instance_that_was_never_loaded_diffs_against_its_old_row(self):
+        rating = Rating.objects.create(user=self.users[0], supplement=self.magnesium, score=4)
+        detached = Rating(
+            pk=rating.pk, user=self.users[0], supplement=self.zinc, score=2, created_at=rating.created_at,
+        )
+        detached.save(force_update=True)
+        self.assertStats(self.magnesium, 0, 0)
+        self.assertStats(self.zinc, 2, 1)
+
+    def test_refreshed_instance_diffs_against_the_refreshed_row(self):
+        rating = Rating.objects.create(user=self.users[0], supplement=self.magnesium, score=4)
+        for fields in (None, ['score']):
+            Rating.objects.filter(pk=rating.pk).update(score=2)
+            SupplementRatingStats.rebuild([self.magnesium.pk])
+            rating.refresh_from_db(fields=fields)
+            rating.score = 5
+            rating.save()
+            self.assertStats(self.magnesium, 5, 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentStatsRebuildTests(TransactionTestCase):
+    """A rating committed while its supplement's stats are being rebuilt must still be counted."""
+
+    def test_rebuild_waits_for_an_uncommitted_delta(self):
+        supplement = Supplement.objects.create(name='Magnesium', category='Mineral')
+        Rating.objects.create(user=User.objects.create_user('first'), supplement=supplement, score=2)
+        rater = User.objects.create_user('second')
+        delta_applied = threading.Event()
+
+        def rate():
+            try:
+                with transaction.atomic():
+                    Rating.objects.create(user=rater, supplement=supplement, score=5)
+                    delta_applied.set()
+                    # Hold the uncommitted rating and its stats row lock while rebuild() starts
+                    time.sleep(0.5)
+            finally:
+                connections.close_all()
+
+        writer = threading.Thread(target=rate)
+        writer.start()
+        delta_applied.wait()
+        try:
+            SupplementRatingStats.rebuild([supplement.pk])
+        finally:
+            writer.join()
+
+        stats = SupplementRatingStats.objects.get(supplement=supplement)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (7, 2))
+
+
+class SupplementMergeTests(TestCase):
+    def setUp(self):
+        self.source = Supplement.objects.create(name='Magnesium Glycinate', category='Mineral')
+        self.target = Supplement.objects.create(name='Magnesium', category='Mineral')
+        self.sleep = Condition.objects.create(name='Sleep')
+        alice, bob, self.carol, dave = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol', 'dave'))
+
+        # alice rated both supplements; bob only the source, carol only the target
+        self.alice_source = self.rate(alice, self.source, 5)
+        self.alice_target = self.rate(alice, self.target, 3)
+        self.bob_source = self.rate(bob, self.source, 4)
+        self.rate(self.carol, self.target, 2)
+        self.comment = Comment.objects.create(rating=self.alice_source, user=self.carol, content='Which brand?')
+        self.reply = Comment.objects.create(parent_comment=self.comment, user=dave, content='Same question')
+        toggle_upvote(bob, self.alice_source)
+        # carol upvoted both of alice's ratings, so hers does not move to the winner twice
+        toggle_upvote(self.carol, self.alice_source)
+        toggle_upvote(self.carol, self.alice_target)
+
+    def rate(self, user, supplement, score):
+        rating = Rating.objects.create(user=user, supplement=supplement, score=score)
+        rating.conditions.add(self.sleep)
+        return rating
+
+    def condition_stats(self, supplement):
+        stats = SupplementConditionStats.objects.filter(
+            supplement=supplement, condition=self.sleep, role=SupplementConditionStats.ROLE_PURPOSE,
+        ).first()
+        return (stats.rating_sum, stats.rating_count) if stats else None
+
+    def test_merge_moves_ratings_comments_upvotes_and_stats(self):
+        merge = SupplementMerge(self.source, self.target).run()
+        self.assertEqual((merge.transferred, len(merge.conflicts), merge.comments_moved, merge.upvotes_moved), (1, 1, 2, 1))
+        self.assertFalse(Supplement.objects.filter(pk=self.source.pk).exists())
+        self.assertFalse(Rating.objects.filter(pk=self.alice_source.pk).exists())
+
+        ratings = Rating.objects.filter(supplement=self.target)
+        self.assertEqual(sorted(ratings.values_list('score', flat=True)), [2, 3, 4])
+        stats = SupplementRatingStats.objects.get(supplement=self.target)
+        self.assertEqual((stats.rating_sum, stats.rating_count, stats.avg_rating), (9, 3, 3.0))
+        self.assertEqual(self.condition_stats(self.target), (9, 3))
+
+        self.comment.refresh_from_db()
+        self.reply.refresh_from_db()
+        self.assertEqual((self.comment.rating_id, self.comment.root_rating_id), (self.alice_target.pk, self.alice_target.pk))
+        self.assertEqual((self.comment.supplement_id, self.reply.supplement_id), (self.target.pk, self.target.pk))
+        self.assertEqual(self.reply.root_rating_id, self.alice_target.pk)
+
+        self.alice_target.refresh_from_db()
+        self.assertEqual(self.alice_target.upvotes, 2)
+        self.assertEqual(UserUpvote.objects.filter(rating=self.alice_target).count(), 2)
+
+    def test_keep_newer_keeps_the_later_rating(self):
+        Rating.objects.filter(pk=self.alice_source.pk).update(updated_at=self.alice_target.updated_at + timedelta(days=1))
+        merge = SupplementMerge(self.source, self.target, keep_newer=True).run()
+        self.assertEqual(merge.conflicts[0]['kept'], 'source')
+        self.assertFalse(Rating.objects.filter(pk=self.alice_target.pk).exists())
+        self.assertEqual(sorted(Rating.objects.filter(supplement=self.target).values_list('score', flat=True)), [2, 4, 5])
+        stats = SupplementRatingStats.objects.get(supplement=self.target)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (11, 3))
+        self.assertEqual(self.condition_stats(self.target), (11, 3))
+        self.alice_source.refresh_from_db()
+        self.assertEqual(self.alice_source.upvotes, UserUpvote.objects.filter(rating=self.alice_source).count())
+
+    def test_dry_run_reports_without_changing_anything(self):
+        merge = SupplementMerge(self.source, self.target).run(dry_run=True)
+        self.assertEqual((merge.transferred, len(merge.conflicts), merge.comments_moved, merge.upvotes_moved), (1, 1, 2, 1))
+        self.assertEqual(Rating.objects.filter(supplement=self.source).count(), 2)
+        stats = SupplementRatingStats.objects.get(supplement=self.target)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (5, 2))
+
+
+class ConditionMergeTests(TestCase):
+    def setUp(self):
+        self.source = Condition.objects.create(name='Anxiety')
+        self.target = Condition.objects.create(name='Stress')
+        supplement = Supplement.objects.create(name='Ashwagandha', category='Herb')
+        users = [User.objects.create_user(f'rater{i}') for i in range(3)]
+        self.only_source = Rating.objects.create(user=users[0], supplement=supplement, score=4)
+        self.only_source.conditions.add(self.source)
+        self.both = Rating.objects.create(user=users[1], supplement=supplement, score=2)
+        self.both.conditions.add(self.source, self.target)
+        self.as_benefit = Rating.objects.create(user=users[2], supplement=supplement, score=5)
+        self.as_benefit.conditions.add(self.target)
+        self.as_benefit.benefits.add(self.source)
+        users[0].profile.chronic_conditions.add(self.source)
+        users[1].profile.chronic_conditions.add(self.source, self.target)
+        self.supplement = supplement
+        self.users = users
+
+    def cube(self, role):
+        rows = SupplementConditionStats.objects.filter(supplement=self.supplement, role=role, rating_count__gt=0)
+        return {name: (rating_sum, count) for name, rating_sum, count in rows.values_list(
+            'condition__name', 'rating_sum', 'rating_count'
+        )}
+
+    def test_links_move_to_the_target_without_duplicates(self):
+        merge = ConditionMerge(self.source, self.target).run()
+        self.assertFalse(Condition.objects.filter(pk=self.source.pk).exists())
+        self.assertEqual(merge.moved, {'conditions': 1, 'benefits': 1, 'side_effects': 0, 'chronic_conditions': 1})
+        self.assertEqual(merge.already_linked, {'conditions': 1, 'benefits': 0, 'side_effects': 0, 'chronic_conditions': 1})
+        self.assertEqual((merge.ratings_transferred, merge.profiles_transferred), (3, 2))
+
+        for rating in (self.only_source, self.both, self.as_benefit):
+            self.assertEqual(list(rating.conditions.values_list('name', flat=True)), ['Stress'])
+        self.assertEqual(list(self.as_benefit.benefits.values_list('name', flat=True)), ['Stress'])
+        for user in self.users[:2]:
+            self.assertEqual(list(user.profile.chronic_conditions.values_list('name', flat=True)), ['Stress'])
+
+    def test_condition_cube_counts_each_rating_once(self):
+        ConditionMerge(self.source, self.target).run()
+        self.assertEqual(self.cube(SupplementConditionStats.ROLE_PURPOSE), {'Stress': (11, 3)})
+        self.assertEqual(self.cube(SupplementConditionStats.ROLE_BENEFIT), {'Stress': (5, 1)})
+
+
+@without_response_cache
+class ConditionCubeFilterTests(TestCase):
+    """A single-condition filter is answered from SupplementConditionStats; it must agree with aggregating ratings."""
+
+    def setUp(self):
+        self.sleep = Condition.objects.create(name='Sleep')
+        self.focus = Condition.objects.create(name='Focus')
+        Condition.objects.create(name='Unused')
+        supplements = [Supplement.objects.create(name=name, category='Test') for name in ('A', 'B', 'C', 'D')]
+        users = [User.objects.create_user(f'rater{i}') for i in range(5)]
+        self.ratings = []
+        for i, user in enumerate(users):
+            for j, supplement in enumerate(supplements):
+                rating = Rating.objects.create(user=user, supplement=supplement, score=(i * 3 + j) % 5 + 1)
+                rating.conditions.add(*[self.sleep, self.focus][:(i + j) % 3])
+                if (i + j) % 2:
+                    rating.benefits.add(self.sleep)
+                self.ratings.append(rating)
+
+    def listing(self, **params):
+        response = self.client.get('/api/supplements/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['id'], row['avg_rating'], row['rating_count']) for row in response.data]
+
+    def assertCubeMatchesAggregate(self):
+        for param in ('conditions', 'benefits'):
+            for name in ('Sleep', 'Focus'):
+                # A second name (matching nothing) sends the same filter down the aggregating path
+                from_cube = self.listing(**{param: name})
+                aggregated = self.listing(**{param: f'{name},Unused'})
+                self.assertEqual(from_cube, aggregated, f'{param}={name}')
+
+    def test_cube_matches_aggregate(self):
+        self.assertTrue(self.listing(conditions='Sleep'))
+        self.assertCubeMatchesAggregate()
+
+    def test_cube_follows_rating_edits(self):
+        self.ratings[0].score = 5
+        self.ratings[0].save()
+        self.ratings[1].conditions.remove(self.sleep)
+        self.ratings[2].conditions.set([self.sleep])
+        self.ratings[3].benefits.clear()
+        self.ratings[4].delete()
+        self.assertCubeMatchesAggregate()
+
+
+@without_response_cache
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.sleep = Condition.objects.create(name='Sleep')
+        users = [User.objects.create_user(f'rater{i}') for i in range(3)]
+        # Ties on every sort key, same names in different categories, and supplements with no ratings (NULL averages)
+        for i in range(14):
+            supplement = Supplement.objects.create(name=f'Supplement {i % 5}', category=f'Category {i}')
+            for user in users[:i % 4]:
+                rating = Rating.objects.create(user=user, supplement=supplement, score=(i % 3) + 2)
+                if i % 2:
+                    rating.conditions.add(self.sleep)
+
+    def rows(self, response):
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'] if isinstance(response.data, dict) else response.data
+
+    def ids(self, response):
+        return [row['id'] for row in self.rows(response)]
+
+    def walk(self, params, limit=4):
+        rows = []
+        response = self.client.get('/api/supplements/', {**params, 'limit': limit})
+        while True:
+            rows += self.rows(response)
+            if not response.data['next']:
+                return rows
+            response = self.client.get(response.data['next'])
+
+    def test_pages_join_up_to_the_unpaginated_listing(self):
+        # Without a cursor, ties on the sort keys come back in any order, so compare the keys' values, not ids
+        for params, sort_fields in (
+            ({}, ('avg_rating', 'rating_count', 'name')),
+            ({'ordering': 'name'}, ('name',)),
+            ({'ordering': '-name'}, ('name',)),
+            ({'ordering': 'avg_rating'}, ('avg_rating',)),
+            ({'ordering': '-rating_count,name'}, ('rating_count', 'name')),
+            ({'conditions': 'Sleep'}, ('avg_rating', 'rating_count', 'name')),
+        ):
+            expected = self.rows(self.client.get('/api/supplements/', params))
+            walked = self.walk(params)
+            walked_ids = [row['id'] for row in walked]
+            self.assertEqual(len(walked_ids), len(set(walked_ids)), f'duplicates with {params}')
+            self.assertEqual(set(walked_ids), {row['id'] for row in expected}, f'rows skipped with {params}')
+            self.assertEqual(
+                [[row[field] for field in sort_fields] for row in walked],
+                [[row[field] for field in sort_fields] for row in expected],
+                f'rows out of order with {params}',
+            )
+
+    def test_rows_added_behind_the_cursor_are_not_repeated(self):
+        first = self.client.get('/api/supplements/', {'ordering': 'name', 'limit': 5})
+        seen = self.ids(first)
+        Supplement.objects.create(name='Supplement 0', category='Category late')
+        seen += self.walk_from(first.data['next'])
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Supplement.objects.count() - 1)
+
+    def walk_from(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            ids += self.ids(response)
+            url = response.data['next']
+        return ids
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        first = self.client.get('/api/supplements/', {'ordering': 'name', 'limit': 5})
+        cursor = first.data['next'].split('cursor=')[1]
+        response = self.client.get('/api/supplements/', {'ordering': '-name', 'limit': 5, 'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogImportTests(TestCase):
+    def upload(self, content, name='catalog.csv'):
+        return SimpleUploadedFile(name, content.encode('utf-8'))
+
+    def test_rows_are_created_updated_skipped_and_merged_across_chunks(self):
+        Supplement.objects.create(name='Zinc', category='Mineral', dosage_unit='mg')
+        Supplement.objects.create(name='Iron', category='Mineral', dosage_unit='mg')
+        csv_file = self.upload(
+            'name,category,dosage_unit\n'
+            'Magnesium,Mineral,mg\n'
+            'Creatine,Amino Acid,g\n'
+            'Zinc,Mineral,mcg\n'
+            'Iron,Mineral,mg\n'
+            ',Mineral,mg\n'
+            'Creatine,Amino Acid,mg\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            result = SPECS['supplements'].make_importer(chunk_size=2).run(csv_file)
+
+        self.assertEqual((result.created, result.updated, result.unchanged, result.duplicates), (2, 2, 1, 0))
+        self.assertEqual(result.row_errors, ['Row 6: Missing or invalid supplement name.'])
+        units = dict(Supplement.objects.values_list('name', 'dosage_unit'))
+        # The two Creatine rows fall in different chunks, so the later one updates the row the first created
+        self.assertEqual(units, {'Magnesium': 'mg', 'Zinc': 'mcg', 'Iron': 'mg', 'Creatine': 'mg'})
+        # bulk_create bypasses the receivers that create stats rows and retire the search index
+        self.assertEqual(SupplementRatingStats.objects.filter(supplement__name__in=['Magnesium', 'Creatine']).count(), 2)
+        self.assertGreater(DataVersion.current([DataVersion.SEARCH])[0], 0)
+
+    def test_duplicates_within_a_chunk_keep_the_last_row(self):
+        result = SPECS['conditions'].make_importer().run(self.upload('name\nSleep\nFocus\nSleep\n'))
+        self.assertEqual((result.created, result.duplicates), (2, 1))
+        self.assertEqual(sorted(Condition.objects.values_list('name', flat=True)), ['Focus', 'Sleep'])
+
+    def test_dry_run_reports_the_diff_without_writing(self):
+        Supplement.objects.create(name='Zinc', category='Mineral', dosage_unit='mg')
+        result = SPECS['supplements'].make_importer(dry_run=True).run(
+            self.upload('name,category,dosage_unit\nZinc,Mineral,mcg\nMagnesium,Mineral,mg\n')
+        )
+        self.assertEqual(result.diff['create'], ['Magnesium'])
+        self.assertEqual(result.diff['update'], [{'name': 'Zinc', 'changes': {'dosage_unit': {'from': 'mg', 'to': 'mcg'}}}])
+        self.assertEqual(list(Supplement.objects.values_list('name', 'dosage_unit')), [('Zinc', 'mg')])
+
+    def test_missing_columns_are_reported_before_any_row(self):
+        importer = SPECS['supplements'].make_importer()
+        with self.assertRaisesMessage(ImportFileError, 'CSV must contain at least the following columns: category'):
+            importer.check_header(self.upload('name,dosage_unit\nZinc,mg\n'))
+        with self.assertRaisesMessage(ImportFileError, "CSV must contain a 'name' column for brands."):
+            SPECS['brands'].make_importer().check_header(self.upload('brand\nThorne\n'))
+
+    def test_spec_without_clean_says_what_is_missing(self):
+        class UnfinishedImport(ImportSpec):
+            model = Brand
+
+        with self.assertRaisesMessage(NotImplementedError, 'UnfinishedImport must implement clean()'):
+            UnfinishedImport().make_importer().run(self.upload('name\nThorne\n'))
+
+
+
+class RolledBack(Exception):
+    pass
+
+
+@override_settings(IMPORT_JOB_RUNNER='worker')
+class ImportJobResumeTests(TestCase):
+    CSV = (
+        'name,category,dosage_unit\n'
+        'Magnesium,Mineral,mg\n'
+        'Zinc,Mineral,mg\n'
+        'Iron,Mineral,mg\n'
+        ',Mineral,mg\n'
+        'Creatine,Amino Acid,g\n'
+        'Zinc,Mineral,mcg\n'
+    )
+    COUNTS = ('created_count', 'updated_count', 'unchanged_count', 'duplicate_count', 'rows_processed', 'row_error_count')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_job(self):
+        return ImportJob.objects.create(
+            kind='supplements', file=SimpleUploadedFile('catalog.csv', self.CSV.encode('utf-8')), chunk_size=2,
+        )
+
+    def clean_run_counts(self):
+        try:
+            with transaction.atomic():
+                job = self.create_job()
+                self.assertTrue(import_jobs.process_job(job.pk))
+                job.refresh_from_db()
+                counts = [getattr(job, name) for name in self.COUNTS]
+                raise RolledBack
+        except RolledBack:
+            pass
+        return counts
+
+    def test_failed_chunk_resumes_where_the_job_left_off(self):
+        expected = self.clean_run_counts()
+        self.assertFalse(Supplement.objects.exists())
+        job = self.create_job()
+
+        imported = []
+        original = BulkImporter.import_chunk
+
+        def import_chunk(importer, rows):
+            imported.append([row_number for row_number, _ in rows])
+            if fail and rows[0][0] == 4:
+                raise DatabaseError('connection lost')
+            return original(importer, rows)
+
+        with mock.patch.object(BulkImporter, 'import_chunk', import_chunk):
+            fail = True
+            for attempt in range(1, ImportJob.MAX_ATTEMPTS + 1):
+                self.assertFalse(import_jobs.process_job(job.pk))
+                job.refresh_from_db()
+                # The first chunk and its progress stay committed; the failing one rolled back alone
+                self.assertEqual((job.attempts, job.next_chunk, job.rows_processed, job.created_count), (attempt, 1, 2, 2))
+                self.assertEqual(sorted(Supplement.objects.values_list('name', flat=True)), ['Magnesium', 'Zinc'])
+            self.assertEqual(job.status, ImportJob.FAILED)
+            self.assertEqual(job.error, 'connection lost')
+            self.assertEqual(imported, [[2, 3], [4, 5], [4, 5], [4, 5]])
+
+            self.assertTrue(import_jobs.resume_job(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (ImportJob.PENDING, 0))
+            fail = False
+            imported.clear()
+            self.assertTrue(import_jobs.process_job(job.pk))
+
+        # Chunks already committed are not imported a second time
+        self.assertEqual(imported, [[4, 5], [6, 7]])
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual([getattr(job, name) for name in self.COUNTS], expected)
+        self.assertEqual(job.row_errors, ['Row 5: Missing or invalid supplement name.'])
+        self.assertEqual(Supplement.objects.get(name='Zinc').dosage_unit, 'mcg')
+
+    def test_resume_only_applies_to_failed_jobs(self):
+        job = self.create_job()
+        self.assertFalse(import_jobs.resume_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.PENDING)
+
+class RatingImportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='pw')
+        self.bob = User.objects.create_user('bob', password='pw')
+        self.zinc = Supplement.objects.create(name='Zinc', category='Mineral', dosage_unit='mg')
+        self.iron = Supplement.objects.create(name='Iron', category='Mineral', dosage_unit='mg')
+        self.sleep = Condition.objects.create(name='Sleep')
+        self.focus = Condition.objects.create(name='Focus')
+        self.thorne = Brand.objects.create(name='Thorne')
+        Rating.objects.create(user=self.bob, supplement=self.iron, score=2)
+
+    def upload(self, content, name='ratings.csv'):
+        return SimpleUploadedFile(name, content.encode('utf-8'))
+
+    def test_rows_are_created_linked_and_reported_in_file_order(self):
+        csv_file = self.upload(
+            'user,supplement,score,conditions,benefits,brands,created_at\n'
+            'alice,Zinc,5,Sleep;Focus,Sleep,thorne,2020-01-02T03:04:05\n'
+            'bob,Iron,4,,,,\n'
+            'carol,Zinc,3,,,,\n'
+            'alice,Zinc,1,,,,\n'
+            'bob,Zinc,9,,,,\n'
+            'bob,Zinc,3,Unknown,,,\n'
+            'bob,Zinc,4,Focus,,Thorne,\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            result = IMPORT_SPECS['ratings'].make_importer(chunk_size=3).run(csv_file)
+
+        self.assertEqual((result.created, result.duplicates), (2, 2))
+        self.assertEqual(result.row_errors, [
+            'Row 3 (User: bob, Supplement: Iron): Duplicate - this user has already rated this supplement.',
+            'Row 4 (User: carol, Supplement: Zinc): Unknown user.',
+            # Row 2 was written with the first chunk, so row 5 meets it as an existing rating
+            'Row 5 (User: alice, Supplement: Zinc): Duplicate - this user has already rated this supplement.',
+            'Row 6 (User: bob, Supplement: Zinc): Score must be a whole number from 1 to 5.',
+            'Row 7 (User: bob, Supplement: Zinc): Unknown conditions: Unknown.',
+        ])
+
+        rating = Rating.objects.get(user=self.alice, supplement=self.zinc)
+        self.assertEqual(rating.score, 5)
+        self.assertEqual((rating.created_at.year, rating.created_at.month, rating.created_at.day), (2020, 1, 2))
+        self.assertEqual(set(rating.conditions.values_list('name', flat=True)), {'Sleep', 'Focus'})
+        self.assertEqual(list(rating.benefits.values_list('name', flat=True)), ['Sleep'])
+        self.assertEqual(list(rating.linked_brands.all()), [self.thorne])
+        self.assertEqual(Rating.objects.get(user=self.bob, supplement=self.iron).score, 2)
+
+        # bulk_create skips the receivers that keep the stored stats and the cube in step
+        stats = SupplementRatingStats.objects.get(supplement=self.zinc)
+        self.assertEqual((stats.rating_count, stats.rating_sum), (2, 9))
+        purpose_counts = dict(
+            SupplementConditionStats.objects.filter(supplement=self.zinc, role=SupplementConditionStats.ROLE_PURPOSE)
+            .values_list('condition__name', 'rating_count')
+        )
+        self.assertEqual(purpose_counts, {'Sleep': 1, 'Focus': 2})
+
+    def test_ndjson_lists_and_bad_lines(self):
+        ndjson_file = self.upload(
+            '{"user": "alice", "supplement": "Zinc", "score": 4, "side_effects": ["Sleep"]}\n'
+            'not json\n'
+            '["alice"]\n',
+            name='ratings.ndjson',
+        )
+        result = IMPORT_SPECS['ratings'].make_importer().run(ndjson_file)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(len(result.row_errors), 2)
+        self.assertTrue(result.row_errors[0].startswith('Row 2: Invalid JSON'))
+        self.assertEqual(result.row_errors[1], 'Row 3: Each line must be a JSON object.')
+        rating = Rating.objects.get(user=self.alice, supplement=self.zinc)
+        self.assertEqual(list(rating.side_effects.values_list('name', flat=True)), ['Sleep'])
+
+    def test_shared_names_need_a_category(self):
+        Supplement.objects.create(name='Zinc', category='Other', dosage_unit='mg')
+        result = IMPORT_SPECS['ratings'].make_importer().run(self.upload(
+            'user,supplement,score,supplement_category\n'
+            'alice,Zinc,4,\n'
+            'bob,Zinc,4,Other\n'
+        ))
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.row_errors, [
+            'Row 2 (User: alice, Supplement: Zinc): 2 supplements share this name; add a supplement_category column.',
+        ])
+        self.assertEqual(Rating.objects.get(user=self.bob, supplement__name='Zinc').supplement.category, 'Other')
+
+    def test_dry_run_reports_without_writing(self):
+        result = IMPORT_SPECS['ratings'].make_importer(dry_run=True).run(
+            self.upload('user,supplement,score\nalice,Zinc,4\nalice,Zinc,5\n')
+        )
+        self.assertEqual(result.diff['create'], [{'user': 'alice', 'supplement': 'Zinc'}])
+        self.assertEqual(result.row_errors, ['Row 3 (User: alice, Supplement: Zinc): Duplicate of row 2.'])
+        self.assertFalse(Rating.objects.filter(user=self.alice).exists())
@@ -0,0 +1,50 @@
+# pages/uploads.py
+
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingUploadMixin:
+    """
+    Computes the SHA-256 of an uploaded file while its chunks stream in and
+    sets it on the resulting UploadedFile as `sha256`, so deduplication needs
+    no second pass over the data.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # An inactive memory handler only passes chunks on to the temp-file handler
+        if getattr(self, 'activated', True):
+            self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def upload_sha256(file):
+    """SHA-256 hex digest of an upload, from the hashing upload handlers when they saw it, else by reading it."""
+    content_hash = getattr(file, 'sha256', None)
+    if content_hash:
+        return content_hash
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    file.sha256 = digest.hexdigest()
+    return file.sha256
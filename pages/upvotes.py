@@ -0,0 +1,154 @@
+# pages/upvotes.py
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, PositiveIntegerField, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import DataVersion, Rating, UserUpvote, comment_supplement_id
+
+# One statement on PostgreSQL: drop the user's upvote if there is one, otherwise
+# add it (a concurrent insert makes that a no-op), then move the target's counter
+# by exactly what changed. Data-modifying CTEs share a snapshot, and the UPDATE
+# re-reads the counter under the target's row lock, so concurrent toggles can't
+# lose or double-count an upvote.
+TOGGLE_SQL = """
+WITH removed AS (
+    DELETE FROM {upvote_table} WHERE user_id = %(user_id)s AND {column} = %(target_id)s
+    RETURNING 1
+), added AS (
+    INSERT INTO {upvote_table} (user_id, {column}, {other_column}, created_at)
+    SELECT %(user_id)s, %(target_id)s, NULL, %(now)s
+    WHERE NOT EXISTS (SELECT 1 FROM removed)
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+)
+UPDATE {target_table}
+SET upvotes = GREATEST(upvotes + (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed), 0)
+WHERE id = %(target_id)s
+RETURNING upvotes, (SELECT COUNT(*) FROM removed)
+"""
+
+# The removal half of TOGGLE_SQL for the other backends, which run it under the target's row lock
+REMOVE_SQL = "DELETE FROM {upvote_table} WHERE user_id = %s AND {column} = %s"
+
+
+class UpvoteLookup:
+    """
+    Which of the ratings and comments being serialized the requesting user has
+    upvoted. List serializers load() every ID on their page, comment threads
+    included, with one query; an ID nobody loaded costs a query of its own.
+    It lives in serializer context, so nested ratings and reply threads of any
+    depth share the same lookup.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.upvoted_rating_ids = set()
+        self.upvoted_comment_ids = set()
+        self.loaded_rating_ids = set()
+        self.loaded_comment_ids = set()
+
+    def load(self, rating_ids=(), comment_ids=()):
+        rating_ids = {rating_id for rating_id in rating_ids if rating_id is not None} - self.loaded_rating_ids
+        comment_ids = {comment_id for comment_id in comment_ids if comment_id is not None} - self.loaded_comment_ids
+        if not (rating_ids or comment_ids):
+            return
+        rows = UserUpvote.objects.filter(user=self.user).filter(
+            Q(rating_id__in=rating_ids) | Q(comment_id__in=comment_ids)
+        ).values_list('rating_id', 'comment_id')
+        for rating_id, comment_id in rows:
+            if rating_id is not None:
+                self.upvoted_rating_ids.add(rating_id)
+            if comment_id is not None:
+                self.upvoted_comment_ids.add(comment_id)
+        self.loaded_rating_ids |= rating_ids
+        self.loaded_comment_ids |= comment_ids
+
+    def has_upvoted_rating(self, rating_id):
+        self.load(rating_ids=[rating_id])
+        return rating_id in self.upvoted_rating_ids
+
+    def has_upvoted_comment(self, comment_id):
+        self.load(comment_ids=[comment_id])
+        return comment_id in self.upvoted_comment_ids
+
+
+def get_upvote_lookup(context):
+    """Returns the context's UpvoteLookup, creating it for authenticated requests; None for anonymous ones."""
+    if 'upvotes' not in context:
+        request = context.get('request')
+        if not (request and request.user.is_authenticated):
+            return None
+        context['upvotes'] = UpvoteLookup(request.user)
+    return context['upvotes']
+
+
+def get_upvote_state(user, rating_ids, comment_ids):
+    """Maps each requested rating and comment ID to whether user has upvoted it, in one query."""
+    upvoted_ratings = set()
+    upvoted_comments = set()
+    if rating_ids or comment_ids:
+        rows = UserUpvote.objects.filter(user=user).filter(
+            Q(rating_id__in=rating_ids) | Q(comment_id__in=comment_ids)
+        ).values_list('rating_id', 'comment_id')
+        for rating_id, comment_id in rows:
+            if rating_id is not None:
+                upvoted_ratings.add(rating_id)
+            if comment_id is not None:
+                upvoted_comments.add(comment_id)
+    return {
+        'ratings': {str(rating_id): rating_id in upvoted_ratings for rating_id in rating_ids},
+        'comments': {str(comment_id): comment_id in upvoted_comments for comment_id in comment_ids},
+    }
+
+
+def toggle_upvote(user, target):
+    """
+    Adds user's upvote to a Rating or Comment, or takes it away if they had
+    one, and adjusts the target's counter to match. Returns (upvoted, count)
+    as they stand afterwards; count is None if the target no longer exists.
+    """
+    column, other_column = ('rating_id', 'comment_id') if isinstance(target, Rating) else ('comment_id', 'rating_id')
+    using = router.db_for_write(UserUpvote)
+    if connections[using].vendor == 'postgresql':
+        sql = TOGGLE_SQL.format(
+            upvote_table=UserUpvote._meta.db_table,
+            target_table=type(target)._meta.db_table,
+            column=column,
+            other_column=other_column,
+        )
+        with connections[using].cursor() as cursor:
+            cursor.execute(sql, {'user_id': user.pk, 'target_id': target.pk, 'now': timezone.now()})
+            row = cursor.fetchone()
+        count, removed = row if row else (None, 0)
+    else:
+        count, removed = _toggle_upvote_locked(user, target, column, using)
+
+    # The statements above skip the UserUpvote receivers that move response versions
+    supplement_id = target.supplement_id if isinstance(target, Rating) else comment_supplement_id(target)
+    DataVersion.bump_on_commit([supplement_id])
+    # Nothing removed means the upvote is now there, whether added here or by a concurrent click
+    return not removed, count
+
+
+def _toggle_upvote_locked(user, target, column, using):
+    """Backends without data-modifying CTEs: the same toggle as a short transaction holding the target's row lock."""
+    targets = type(target).objects.using(using).filter(pk=target.pk)
+    with transaction.atomic(using=using):
+        if not targets.select_for_update().values_list('pk').first():
+            return None, 0
+        with connections[using].cursor() as cursor:
+            cursor.execute(REMOVE_SQL.format(upvote_table=UserUpvote._meta.db_table, column=column), [user.pk, target.pk])
+            removed = cursor.rowcount
+        added = 0
+        if not removed:
+            try:
+                with transaction.atomic(using=using):
+                    UserUpvote.objects.using(using).bulk_create([UserUpvote(user=user, **{column: target.pk})])
+                added = 1
+            except IntegrityError:
+                pass  # a concurrent click already added it
+        if added or removed:
+            targets.update(upvotes=Greatest(F('upvotes') + (added - removed), Value(0), output_field=PositiveIntegerField()))
+        return targets.values_list('upvotes', flat=True).first(), removed
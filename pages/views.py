@@ -1,29 +1,31 @@
 from rest_framework import viewsets, serializers
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework import permissions
-from django.db.models import Avg, Case, When, FloatField, F, Value, BooleanField, Exists, OuterRef, ExpressionWrapper, Count, Q
-from django.db.models.functions import Round
-from .models import Supplement, Rating, Comment, Condition, EmailVerificationToken, Brand, UserUpvote, Profile
+from django.db.models import Avg, Case, When, FloatField, F, Value, BooleanField, Exists, OuterRef, ExpressionWrapper, Count, Q, Subquery
+from django.db.models.functions import Round, Cast, Coalesce
+from .models import Supplement, Rating, Comment, Condition, EmailVerificationToken, Brand, Profile, SupplementConditionStats, DataVersion, ImportJob, comment_supplement_id
 from .serializers import (
     SupplementSerializer, 
     RatingSerializer, 
     CommentSerializer, 
     ConditionSerializer,
     BrandSerializer,
+    ImportJobSerializer,
     RegisterUserSerializer,
     BasicUserSerializer,
     ProfileSerializer,
     ProfileImageUrlSerializer,
     PublicProfileSerializer,
     PasswordResetRequestSerializer,
-    PasswordResetConfirmSerializer
+    PasswordResetConfirmSerializer,
+    DynamicFieldsMixin,
+    parse_field_paths
 )
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.contrib.auth.models import User
 from rest_framework.decorators import api_view, permission_classes, authentication_classes, action, throttle_classes
 from rest_framework.permissions import IsAdminUser, AllowAny
-import pandas as pd
 from django.db import transaction
 from rest_framework import status
 from django.core.mail import send_mail
@@ -39,6 +41,15 @@ import os
 from decouple import config, Config, RepositoryEnv
 from rest_framework import filters
 from rest_framework.pagination import LimitOffsetPagination
+from .pagination import KeysetPagination
+from .search import SupplementSearchFilter
+from .cache import AnonymousResponseCacheMixin, ConditionalResponseMixin
+from .upvotes import UpvoteLookup, get_upvote_state, toggle_upvote
+from .image_ingest import ImageRejected, validate_upload
+from .condition_merge import ConditionMerge
+from .csv_import import ImportFileError
+from .import_jobs import IMPORT_SPECS, resume_job
+from .supplement_merge import SupplementMerge
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
@@ -53,8 +64,6 @@ from django.contrib import messages
 from rest_framework.parsers import MultiPartParser, FormParser # For file uploads
 from django_filters.rest_framework import DjangoFilterBackend # Import DjangoFilterBackend
 from .filters import SupplementFilter # Import your custom filter
-from google.oauth2 import id_token as google_id_token
-from google.auth.transport import requests as google_requests
 
 logger = logging.getLogger(__name__) # Moved logger to module level
 
@@ -78,73 +87,140 @@ class CustomOrderingFilter(filters.OrderingFilter):
             return new_ordering
         return ordering
 
+class SparseFieldsetMixin:
+    """
+    Passes ?fields= and ?expand= (comma-separated, dotted for nested relations)
+    to DynamicFieldsMixin serializers on read requests. `default_expand` maps an
+    action to the expansion used when ?expand= is absent; actions that are not
+    listed keep every nested relation.
+    """
+    default_expand = {}
+
+    def get_expand(self):
+        expand = parse_field_paths(self.request.query_params.get('expand'))
+        if expand is None and self.action in self.default_expand:
+            expand = parse_field_paths(self.default_expand[self.action])
+        return expand
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method in permissions.SAFE_METHODS and issubclass(self.get_serializer_class(), DynamicFieldsMixin):
+            kwargs.setdefault('fields', parse_field_paths(self.request.query_params.get('fields')))
+            kwargs.setdefault('expand', self.get_expand())
+        return super().get_serializer(*args, **kwargs)
+
+class UpvoteContextMixin:
+    """
+    Puts an UpvoteLookup for the requesting user into serializer context, so
+    has_upvoted for a whole page (nested ratings and replies included) costs
+    one query for that page's IDs instead of one per object.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user and self.request.user.is_authenticated:
+            context['upvotes'] = UpvoteLookup(self.request.user)
+        return context
+
 # logging.warning("DEBUG: REST_FRAMEWORK_THROTTLE_RATES = %s", getattr(settings, 'REST_FRAMEWORK_THROTTLE_RATES', None))
 
-class SupplementViewSet(viewsets.ModelViewSet):
+class SupplementViewSet(ConditionalResponseMixin, AnonymousResponseCacheMixin, SparseFieldsetMixin, UpvoteContextMixin, viewsets.ModelViewSet):
     serializer_class = SupplementSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    pagination_class = LimitOffsetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, CustomOrderingFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, SupplementSearchFilter, CustomOrderingFilter]
     filterset_class = SupplementFilter # Use your custom filterset
     search_fields = ['name', 'category']
     ordering_fields = ['name', 'id', 'category', 'avg_rating', 'rating_count']
+    # Listings render without nested ratings unless ?expand=ratings is passed
+    default_expand = {'list': ''}
 
     def get_queryset(self):
         queryset = Supplement.objects.all()
 
         # Build a Q object for filtering ratings within annotations
         rating_aggregation_q_filter = Q()
+        # Condition names per SupplementConditionStats role, used to answer simple filters from the cube
+        role_filters = {}
         
         conditions_param = self.request.query_params.get('conditions', None)
         if conditions_param:
             condition_names = [name.strip() for name in conditions_param.split(',') if name.strip()]
             if condition_names:
                 rating_aggregation_q_filter &= Q(ratings__conditions__name__in=condition_names)
+                role_filters[SupplementConditionStats.ROLE_PURPOSE] = condition_names
 
         benefits_param = self.request.query_params.get('benefits', None)
         if benefits_param:
             benefit_names = [name.strip() for name in benefits_param.split(',') if name.strip()]
             if benefit_names:
                 rating_aggregation_q_filter &= Q(ratings__benefits__name__in=benefit_names)
+                role_filters[SupplementConditionStats.ROLE_BENEFIT] = benefit_names
 
         side_effects_param = self.request.query_params.get('side_effects', None)
         if side_effects_param:
             side_effect_names = [name.strip() for name in side_effects_param.split(',') if name.strip()]
             if side_effect_names:
                 rating_aggregation_q_filter &= Q(ratings__side_effects__name__in=side_effect_names)
+                role_filters[SupplementConditionStats.ROLE_SIDE_EFFECT] = side_effect_names
 
-        # Filter by brands within rating aggregations if provided (matches any brand substring)
+        # Filter by brands within rating aggregations if provided (names ignoring case, joined through Rating.linked_brands)
+        brand_names = []
         brands_param = self.request.query_params.get('brands', None)
         if brands_param:
             brand_names = [name.strip() for name in brands_param.split(',') if name.strip()]
             if brand_names:
-                brand_q = Q()
-                for bn in brand_names:
-                    brand_q |= Q(ratings__brands__icontains=bn)
-                rating_aggregation_q_filter &= brand_q
+                rating_aggregation_q_filter &= Q(ratings__linked_brands__in=Brand.named(brand_names).values('id'))
         
-        # Annotate with filtered aggregations
-        # The `filter` argument to Avg and Count applies to the related 'ratings' queryset
-        queryset = queryset.annotate(
-            avg_rating=Round(
-                Avg('ratings__score', 
-                    filter=rating_aggregation_q_filter # This Q object filters the ratings being aggregated
-                ),
-                2, 
-                output_field=FloatField()
-            ),
-            rating_count=Count(
-                'ratings__id', 
-                filter=rating_aggregation_q_filter, # This Q object filters the ratings being counted
-                distinct=True
+        if not rating_aggregation_q_filter:
+            # Unfiltered listing: read the stored per-supplement stats (one-to-one join, indexed columns)
+            queryset = queryset.annotate(
+                avg_rating=F('rating_stats__avg_rating'),
+                rating_count=F('rating_stats__rating_count')
             )
-        )
+        elif not brand_names and len(role_filters) == 1 and len(next(iter(role_filters.values()))) == 1:
+            # A single condition in a single role maps to exactly one SupplementConditionStats row.
+            # Several names (or roles) can match the same rating, so those still aggregate below.
+            role, names = next(iter(role_filters.items()))
+            queryset = self._annotate_from_condition_stats(queryset, role, names[0])
+        else:
+            # Annotate with filtered aggregations
+            # The `filter` argument to Avg and Count applies to the related 'ratings' queryset
+            queryset = queryset.annotate(
+                avg_rating=Round(
+                    Avg('ratings__score', 
+                        filter=rating_aggregation_q_filter # This Q object filters the ratings being aggregated
+                    ),
+                    2, 
+                    output_field=FloatField()
+                ),
+                rating_count=Count(
+                    'ratings__id', 
+                    filter=rating_aggregation_q_filter, # This Q object filters the ratings being counted
+                    distinct=True
+                )
+            ).distinct()
         
         is_ordering_requested = self.request.query_params.get(filters.OrderingFilter.ordering_param, None) is not None
         if not is_ordering_requested:
             queryset = queryset.order_by(F('avg_rating').desc(nulls_last=True), F('rating_count').desc(nulls_last=True), 'name')
 
-        return queryset.distinct()
+        return queryset
+
+    def get_existence_queryset(self):
+        # The stats joins above only matter for rendering
+        return Supplement.objects.all()
+
+    def _annotate_from_condition_stats(self, queryset, role, condition_name):
+        stats_row = SupplementConditionStats.objects.filter(
+            supplement=OuterRef('pk'), role=role, condition__name=condition_name, rating_count__gt=0
+        )
+        stats_avg = stats_row.annotate(
+            avg=ExpressionWrapper(Cast('rating_sum', FloatField()) / F('rating_count'), output_field=FloatField())
+        ).values('avg')[:1]
+        return queryset.annotate(
+            avg_rating=Round(Subquery(stats_avg), 2, output_field=FloatField()),
+            rating_count=Coalesce(Subquery(stats_row.values('rating_count')[:1]), Value(0))
+        )
 
     @action(detail=False, methods=['get'])
     def categories(self, request):
@@ -168,11 +244,12 @@ class SupplementViewSet(viewsets.ModelViewSet):
         delete_ratings_explicitly = request.query_params.get('delete_ratings', 'false').lower() == 'true'
 
         ratings_to_transfer = Rating.objects.filter(supplement=instance)
-        transferred_count = 0
-        skipped_due_to_conflict_count = 0
         deleted_directly_count = 0
 
         if transfer_to_supplement_id:
+            # dry_run previews the merge; keep_newer resolves users who rated both by their latest rating
+            dry_run = request.query_params.get('dry_run', 'false').lower() == 'true'
+            keep_newer = request.query_params.get('keep_newer', 'false').lower() == 'true'
             try:
                 target_supplement = Supplement.objects.get(id=transfer_to_supplement_id)
                 if target_supplement == instance:
@@ -181,32 +258,15 @@ class SupplementViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST
                     )
 
-                with transaction.atomic():
-                    for rating in ratings_to_transfer:
-                        # Check if the user already has a rating for the target supplement
-                        if Rating.objects.filter(user=rating.user, supplement=target_supplement).exists():
-                            skipped_due_to_conflict_count += 1
-                            # Optionally, delete this conflicting rating from the source supplement now
-                            # rating.delete() 
-                            # For now, we just skip, it will be deleted when 'instance' is deleted if not transferred
-                        else:
-                            rating.supplement = target_supplement
-                            rating.save()
-                            transferred_count += 1
-                    
-                    instance.delete() # Delete the original supplement
-                
-                message = f"Supplement '{instance.name}' deleted. {transferred_count} ratings transferred to '{target_supplement.name}'."
-                if skipped_due_to_conflict_count > 0:
-                    message += f" {skipped_due_to_conflict_count} ratings were not transferred due to existing ratings by the same users on the target supplement and were deleted with the original supplement."
-                return Response({'message': message}, status=status.HTTP_200_OK)
+                merge = SupplementMerge(instance, target_supplement, keep_newer=keep_newer).run(dry_run=dry_run)
+                return Response(merge.as_response_data(dry_run), status=status.HTTP_200_OK)
 
             except Supplement.DoesNotExist:
                 return Response(
                     {'error': f'Target supplement with id {transfer_to_supplement_id} not found.'},
                     status=status.HTTP_404_NOT_FOUND
                 )
-            except IntegrityError as e: # Should be caught by the pre-check, but as a safeguard
+            except IntegrityError as e:
                  logging.error(f"Integrity error during rating transfer for supplement {instance.id}: {str(e)}")
                  return Response(
                      {'error': f'A database integrity error occurred during rating transfer: {str(e)}'},
@@ -242,7 +302,7 @@ class SupplementViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class RatingViewSet(viewsets.ModelViewSet):
+class RatingViewSet(ConditionalResponseMixin, SparseFieldsetMixin, UpvoteContextMixin, viewsets.ModelViewSet):
     serializer_class = RatingSerializer
     permission_classes = [IsOwnerOrAdmin]
     authentication_classes = [JWTAuthentication]
@@ -287,7 +347,15 @@ class RatingViewSet(viewsets.ModelViewSet):
         supplement_id = self.request.query_params.get('supplement', None)
         if supplement_id:
             queryset = queryset.filter(supplement_id=supplement_id)
-        return queryset.prefetch_related('conditions', 'comments')
+        # Comment threads are loaded per page by RatingListSerializer's CommentTree
+        return queryset.prefetch_related('conditions')
+
+    def get_data_version_keys(self):
+        # Only supplement-scoped listings have a version narrower than everything
+        supplement_id = self.request.query_params.get('supplement')
+        if self.action == 'list' and supplement_id:
+            return [DataVersion.supplement_key(supplement_id), DataVersion.REFERENCE]
+        return None
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -333,22 +401,13 @@ class RatingViewSet(viewsets.ModelViewSet):
             if rating.user == user:
                 return Response({'status': 'error', 'message': 'Cannot upvote your own rating.'}, status=status.HTTP_403_FORBIDDEN)
 
-            try:
-                UserUpvote.objects.create(user=request.user, rating=rating)
-                rating.upvotes = F('upvotes') + 1
-                rating.save(update_fields=['upvotes'])
-                rating.refresh_from_db()
-                return Response({'status': 'upvote added', 'upvotes_count': rating.upvotes}, status=status.HTTP_200_OK)
-            except IntegrityError:
-                # Assumed that IntegrityError means the user has already upvoted; remove the upvote.
-                UserUpvote.objects.filter(user=request.user, rating=rating).delete()
-                
-                # Atomically decrement, ensuring upvotes do not go below 0.
-                # This update happens only if upvotes > 0.
-                Rating.objects.filter(pk=rating.pk, upvotes__gt=0).update(upvotes=F('upvotes') - 1)
-                
-                rating.refresh_from_db() # Get the latest state of the rating
-                return Response({'status': 'upvote removed', 'upvotes_count': rating.upvotes}, status=status.HTTP_200_OK)
+            upvoted, upvotes_count = toggle_upvote(user, rating)
+            if upvotes_count is None:
+                return Response({'status': 'error', 'message': 'Rating not found.'}, status=status.HTTP_404_NOT_FOUND)
+            return Response(
+                {'status': 'upvote added' if upvoted else 'upvote removed', 'upvotes_count': upvotes_count},
+                status=status.HTTP_200_OK
+            )
 
         except Exception as e:
             # Log the full exception details for debugging
@@ -373,17 +432,35 @@ class RatingViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ConditionalResponseMixin, SparseFieldsetMixin, UpvoteContextMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [IsOwnerOrAdmin]
     authentication_classes = [JWTAuthentication]
     pagination_class = LimitOffsetPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['user__username', 'content', 'rating__supplement__name']
+    search_fields = ['user__username', 'content', 'supplement__name']
     ordering_fields = ['created_at', 'upvotes']
 
     def get_queryset(self):
-        return Comment.objects.all()
+        queryset = Comment.objects.select_related('user__profile', 'supplement')
+        supplement_id = self.request.query_params.get('supplement', None)
+        if supplement_id:
+            queryset = queryset.filter(supplement_id=supplement_id)
+        rating_id = self.request.query_params.get('rating', None)
+        if rating_id:
+            queryset = queryset.filter(root_rating_id=rating_id)
+        return queryset
+
+    def get_data_version_keys(self):
+        if self.action == 'retrieve':
+            if not str(self.kwargs['pk']).isdigit():
+                return None
+            comment_row = Comment.objects.filter(pk=self.kwargs['pk']).values('supplement_id', 'rating_id', 'parent_comment_id').first()
+            supplement_id = comment_supplement_id(Comment(**comment_row)) if comment_row else None
+            if supplement_id is None:
+                return None
+            return [DataVersion.supplement_key(supplement_id), DataVersion.REFERENCE]
+        return super().get_data_version_keys()
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -405,16 +482,10 @@ class CommentViewSet(viewsets.ModelViewSet):
         if comment.user == request.user:
             return Response({'error': 'You cannot upvote your own comment'}, status=400)
 
-        try:
-            UserUpvote.objects.create(user=request.user, comment=comment)
-            comment.upvotes += 1
-            comment.save()
-            return Response({'upvotes': comment.upvotes})
-        except IntegrityError:
-            UserUpvote.objects.filter(user=request.user, comment=comment).delete()
-            comment.upvotes = max(0, comment.upvotes - 1)
-            comment.save()
-            return Response({'upvotes': comment.upvotes})
+        _, upvotes_count = toggle_upvote(request.user, comment)
+        if upvotes_count is None:
+            return Response({'error': 'Comment not found'}, status=404)
+        return Response({'upvotes': upvotes_count})
 
 class ConditionViewSet(viewsets.ModelViewSet):
     serializer_class = ConditionSerializer
@@ -433,7 +504,6 @@ class ConditionViewSet(viewsets.ModelViewSet):
         transfer_to_condition_id = request.query_params.get('transfer_ratings_to_condition_id')
         ratings_associated = Rating.objects.filter(conditions=instance)
         ratings_deleted_count = 0
-        ratings_transferred_count = 0
 
         with transaction.atomic():
             if transfer_to_condition_id:
@@ -444,19 +514,10 @@ class ConditionViewSet(viewsets.ModelViewSet):
                             {'error': 'Cannot transfer ratings to the same condition/purpose.'},
                             status=status.HTTP_400_BAD_REQUEST
                         )
-                    
-                    for rating in ratings_associated:
-                        rating.conditions.remove(instance) # Remove old condition
-                        rating.conditions.add(target_condition) # Add new one (Django handles duplicates)
-                        # No need to call rating.save() explicitly for M2M changes unless other fields on rating change
-                        ratings_transferred_count += 1
-                    
-                    instance.delete() # Delete the condition itself
-                    message = (
-                        f"Condition/Purpose '{instance.name}' deleted. "
-                        f"{ratings_transferred_count} associated ratings were transferred to '{target_condition.name}'."
-                    )
-                    return Response({'message': message}, status=status.HTTP_200_OK)
+
+                    # Moves purpose, benefit, side-effect and chronic-condition links, then deletes the condition
+                    merge = ConditionMerge(instance, target_condition).run()
+                    return Response(merge.as_response_data(), status=status.HTTP_200_OK)
 
                 except Condition.DoesNotExist:
                     return Response(
@@ -480,6 +541,20 @@ class ConditionViewSet(viewsets.ModelViewSet):
                 )
                 return Response({'message': message}, status=status.HTTP_200_OK)
 
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Background CSV imports started by the upload views, newest first."""
+    queryset = ImportJob.objects.order_by('-created_at')
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAdminUser]
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        job = self.get_object()
+        if not resume_job(job):
+            return Response({'error': 'Only failed imports can be resumed.'}, status=status.HTTP_400_BAD_REQUEST)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
 class BrandViewSet(viewsets.ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
@@ -495,8 +570,8 @@ class BrandViewSet(viewsets.ModelViewSet):
             )
 
         replace_with_brand_id = request.query_params.get('replace_ratings_brand_with_id')
+        target_brand = None
         target_brand_name_to_replace_with = None
-        ratings_updated_count = 0
 
         if replace_with_brand_id:
             try:
@@ -513,35 +588,8 @@ class BrandViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-        # Find ratings that contain the brand name in their 'brands' CharField.
-        # This is a simple substring match. Be mindful of partial matches if brand names can be substrings of others.
-        # E.g., deleting "Alpha" could affect "Alpha Plus". Exact word match is harder with a simple CharField.
-        # For now, we proceed with case-sensitive substring match as a starting point.
-        ratings_with_brand = Rating.objects.filter(brands__icontains=instance.name)
-
         with transaction.atomic():
-            for rating in ratings_with_brand:
-                old_brands_list = [b.strip() for b in rating.brands.split(',') if b.strip()]
-                new_brands_list = []
-                brand_found_in_rating = False
-
-                for b_name in old_brands_list:
-                    if b_name.lower() == instance.name.lower(): # Case-insensitive comparison for removal/replacement
-                        brand_found_in_rating = True
-                        if target_brand_name_to_replace_with:
-                            # Add the target brand name, ensuring it's not already there to avoid duplicates like "New, New"
-                            if target_brand_name_to_replace_with not in new_brands_list:
-                                new_brands_list.append(target_brand_name_to_replace_with)
-                    else:
-                        if b_name not in new_brands_list: # Avoid duplicates from original list
-                             new_brands_list.append(b_name)
-                
-                if brand_found_in_rating:
-                    rating.brands = ', '.join(new_brands_list) # Re-join with comma and space
-                    rating.save()
-                    ratings_updated_count += 1
-            
-            # After processing ratings, delete the brand instance
+            ratings_updated_count = instance.remove_from_ratings(replacement=target_brand)
             instance.delete()
 
         message = f"Brand '{instance.name}' deleted. "
@@ -552,174 +600,77 @@ class BrandViewSet(viewsets.ModelViewSet):
         
         return Response({'message': message}, status=status.HTTP_200_OK)
 
-@api_view(['POST'])
-@permission_classes([IsAdminUser])
-def upload_supplements_csv(request):
-    if not request.user.is_staff:
-        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        
-    if 'file' not in request.FILES:
-        return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    csv_file = request.FILES['file']
-    if not csv_file.name.endswith('.csv'):
-        return Response({'error': 'File must be a CSV'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    try:
-        df = pd.read_csv(csv_file)
-        if df.empty:
-            return Response({'error': 'The uploaded CSV file is empty.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        required_columns = ['name', 'category'] # dosage_unit is optional
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            return Response({
-                'error': f'CSV must contain at least the following columns: {", ".join(missing_columns)}'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        supplements_created_count = 0
-        supplements_updated_count = 0
-        row_errors = []
+MAX_UPVOTE_STATE_IDS = 500
 
-        with transaction.atomic():
-            for index, row in df.iterrows():
-                supplement_name = row['name']
-                supplement_category = row['category']
-                # Use .get for optional columns, defaulting to None if not present or empty
-                supplement_dosage_unit = row.get('dosage_unit') if pd.notna(row.get('dosage_unit')) else None
-
-                if not supplement_name or pd.isna(supplement_name):
-                    row_errors.append(f"Row {index+2}: Missing or invalid supplement name.")
-                    continue
-                if not supplement_category or pd.isna(supplement_category):
-                    row_errors.append(f"Row {index+2} (Name: {supplement_name}): Missing or invalid category.")
-                    continue
-
-                try:
-                    obj, created = Supplement.objects.update_or_create(
-                        name=supplement_name,
-                        defaults={
-                            'category': supplement_category,
-                            'dosage_unit': supplement_dosage_unit
-                        }
-                    )
-                    if created:
-                        supplements_created_count += 1
-                    else:
-                        supplements_updated_count += 1
-                except IntegrityError as e:
-                    # This might happen if there's a unique constraint violation not on 'name' 
-                    # (though unlikely with the current Supplement model structure for this operation)
-                    logging.error(f"Integrity error processing row {index+2} (Name: {supplement_name}): {str(e)}")
-                    row_errors.append(f"Row {index+2} (Name: {supplement_name}): Could not process due to a database integrity issue. {str(e)}")
-                except Exception as e:
-                    logging.error(f"Error processing row {index+2} (Name: {supplement_name}): {str(e)}")
-                    row_errors.append(f"Row {index+2} (Name: {supplement_name}): Error - {str(e)}")
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def upvote_state(request):
+    """
+    GET /api/upvotes/?ratings=1,2&comments=3,4
+    Returns {'ratings': {id: bool}, 'comments': {id: bool}} for the current user.
+    """
+    try:
+        rating_ids = [int(value) for value in request.query_params.get('ratings', '').split(',') if value.strip()]
+        comment_ids = [int(value) for value in request.query_params.get('comments', '').split(',') if value.strip()]
+    except ValueError:
+        return Response({'error': 'ratings and comments must be comma-separated integer IDs.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        processed_successfully_count = supplements_created_count + supplements_updated_count
-        response_message = (
-            f"{processed_successfully_count} supplements processed. "
-            f"{supplements_created_count} created, {supplements_updated_count} updated."
-        )
-        
-        response_data = {'message': response_message}
-        current_status = status.HTTP_200_OK
+    if len(rating_ids) + len(comment_ids) > MAX_UPVOTE_STATE_IDS:
+        return Response({'error': f'At most {MAX_UPVOTE_STATE_IDS} IDs can be requested at once.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if row_errors:
-            response_data['row_errors'] = row_errors
-            if processed_successfully_count > 0:
-                current_status = status.HTTP_207_MULTI_STATUS # Partial success
-            else:
-                current_status = status.HTTP_400_BAD_REQUEST # All rows failed or no valid data
-        
-        return Response(response_data, status=current_status)
-    
-    except pd.errors.EmptyDataError: # Should be caught by df.empty check, but good to have
-        return Response({'error': 'The uploaded CSV file is empty.'}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Critical error in upload_supplements_csv: {str(e)}")
-        return Response({'error': f'An unexpected critical error occurred. Please check server logs.'}, 
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response(get_upvote_state(request.user, rating_ids, comment_ids))
 
-@api_view(['POST'])
-@permission_classes([IsAdminUser])
-def upload_conditions_csv(request):
-    if not request.user.is_staff: # Ensure consistency
+def run_csv_import(request, spec_name):
+    """
+    Shared body of the CSV upload views. After the header is checked the file
+    is stored as an ImportJob and imported in the background; the 202
+    response carries the job, whose progress is at /api/import-jobs/<id>/.
+    `dry_run=true` (query string or form field) instead returns the
+    create/update/skip diff inline, without writing anything.
+    """
+    if not request.user.is_staff:
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
     if 'file' not in request.FILES:
         return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    csv_file = request.FILES['file']
-    if not csv_file.name.endswith('.csv'):
-        return Response({'error': 'File must be a CSV'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    try:
-        df = pd.read_csv(csv_file)
-        if df.empty:
-            return Response({'error': 'The uploaded CSV file is empty.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if 'name' not in df.columns:
-            return Response({'error': "CSV must contain a 'name' column for conditions/purposes."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        conditions_created_count = 0
-        conditions_updated_count = 0
-        row_errors = []
-
-        with transaction.atomic():
-            for index, row in df.iterrows():
-                condition_name = row['name']
+    spec = IMPORT_SPECS[spec_name]
+    csv_file = request.FILES['file']
+    if not csv_file.name.lower().endswith(spec.file_extensions):
+        return Response({'error': spec.wrong_file_error}, status=status.HTTP_400_BAD_REQUEST)
 
-                if not condition_name or pd.isna(condition_name):
-                    row_errors.append(f"Row {index+2}: Missing or invalid condition name.")
-                    continue
-                
-                condition_name = str(condition_name).strip()
-                if not condition_name:
-                    row_errors.append(f"Row {index+2}: Condition name cannot be empty after stripping whitespace.")
-                    continue
+    dry_run = str(request.query_params.get('dry_run', request.data.get('dry_run', 'false'))).lower() == 'true'
+    try:
+        importer = spec.make_importer(dry_run=dry_run)
+        if not dry_run:
+            importer.check_header(csv_file)
+            csv_file.seek(0)
+            job = ImportJob.enqueue(spec_name, csv_file, user=request.user)
+            return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        result = importer.run(csv_file)
+    except ImportFileError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Critical error importing {spec_name} CSV: {str(e)}", exc_info=True)
+        return Response({'error': 'An unexpected critical error occurred. Please check server logs.'},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response(result.as_response_data(), status=result.status_code)
 
-                try:
-                    obj, created = Condition.objects.update_or_create(
-                        name=condition_name,
-                        defaults={} # No other fields to update in Condition model for now
-                    )
-                    if created:
-                        conditions_created_count += 1
-                    else:
-                        conditions_updated_count += 1
-                except IntegrityError as e:
-                    logging.error(f"Integrity error processing condition row {index+2} (Name: {condition_name}): {str(e)}")
-                    row_errors.append(f"Row {index+2} (Name: {condition_name}): Could not process due to a database integrity issue. {str(e)}")
-                except Exception as e:
-                    logging.error(f"Error processing condition row {index+2} (Name: {condition_name}): {str(e)}")
-                    row_errors.append(f"Row {index+2} (Name: {condition_name}): Error - {str(e)}")
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def upload_supplements_csv(request):
+    return run_csv_import(request, 'supplements')
 
-        processed_successfully_count = conditions_created_count + conditions_updated_count
-        response_message = (
-            f"{processed_successfully_count} conditions/purposes processed. "
-            f"{conditions_created_count} created, {conditions_updated_count} updated."
-        )
-        
-        response_data = {'message': response_message}
-        current_status_code = status.HTTP_200_OK
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def upload_conditions_csv(request):
+    return run_csv_import(request, 'conditions')
 
-        if row_errors:
-            response_data['row_errors'] = row_errors
-            if processed_successfully_count > 0:
-                current_status_code = status.HTTP_207_MULTI_STATUS
-            else:
-                current_status_code = status.HTTP_400_BAD_REQUEST
-        
-        return Response(response_data, status=current_status_code)
-    
-    except pd.errors.EmptyDataError:
-        return Response({'error': 'The uploaded CSV file is empty.'}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Critical error in upload_conditions_csv: {str(e)}")
-        # Ensure the status code object is used here
-        return Response({'error': 'An unexpected critical error occurred. Please check server logs.'}, 
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def upload_ratings_file(request):
+    # Historical ratings as CSV or NDJSON; see pages/rating_import.py for the fields
+    return run_csv_import(request, 'ratings')
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
@@ -731,7 +682,8 @@ def test_auth(request):
 def get_user_details(request):
     user = User.objects.prefetch_related(
         'profile__chronic_conditions',
-        'comment_set__rating__supplement', # Prefetch supplement through rating
+        'comment_set__supplement', # Denormalized thread supplement
+        'comment_set__user__profile',
         'comment_set__parent_comment'    # Prefetch parent comment for replies
     ).get(pk=request.user.pk)
     serializer = BasicUserSerializer(user, context={'request': request})
@@ -836,81 +788,7 @@ def verify_email(request, token):
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def upload_brands_csv(request):
-    if not request.user.is_staff:
-        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-
-    if 'file' not in request.FILES:
-        return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    csv_file = request.FILES['file']
-    if not csv_file.name.endswith('.csv'):
-        return Response({'error': 'File must be a CSV'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    try:
-        df = pd.read_csv(csv_file)
-        if df.empty:
-            return Response({'error': 'The uploaded CSV file is empty.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if 'name' not in df.columns:
-            return Response({'error': "CSV must contain a 'name' column for brands."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        brands_created_count = 0
-        brands_updated_count = 0
-        row_errors = []
-
-        with transaction.atomic():
-            for index, row in df.iterrows():
-                brand_name = row['name']
-
-                if not brand_name or pd.isna(brand_name):
-                    row_errors.append(f"Row {index+2}: Missing or invalid brand name.")
-                    continue
-                
-                brand_name = str(brand_name).strip()
-                if not brand_name:
-                    row_errors.append(f"Row {index+2}: Brand name cannot be empty after stripping whitespace.")
-                    continue
-
-                try:
-                    obj, created = Brand.objects.update_or_create(
-                        name=brand_name,
-                        defaults={} 
-                    )
-                    if created:
-                        brands_created_count += 1
-                    else:
-                        brands_updated_count += 1
-                except IntegrityError as e:
-                    logging.error(f"Integrity error processing brand row {index+2} (Name: {brand_name}): {str(e)}")
-                    row_errors.append(f"Row {index+2} (Name: {brand_name}): Could not process due to a database integrity issue. {str(e)}")
-                except Exception as e:
-                    logging.error(f"Error processing brand row {index+2} (Name: {brand_name}): {str(e)}")
-                    row_errors.append(f"Row {index+2} (Name: {brand_name}): Error - {str(e)}")
-
-        processed_successfully_count = brands_created_count + brands_updated_count
-        response_message = (
-            f"{processed_successfully_count} brands processed. "
-            f"{brands_created_count} created, {brands_updated_count} updated."
-        )
-        
-        response_data = {'message': response_message}
-        current_status_code = status.HTTP_200_OK
-
-        if row_errors:
-            response_data['row_errors'] = row_errors
-            if processed_successfully_count > 0:
-                current_status_code = status.HTTP_207_MULTI_STATUS
-            else:
-                current_status_code = status.HTTP_400_BAD_REQUEST
-        
-        return Response(response_data, status=current_status_code)
-    
-    except pd.errors.EmptyDataError:
-        return Response({'error': 'The uploaded CSV file is empty.'}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logging.error(f"Critical error in upload_brands_csv: {str(e)}")
-        return Response({'error': 'An unexpected critical error occurred. Please check server logs.'}, 
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return run_csv_import(request, 'brands')
 
 class ProfileImageUpdateAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -921,6 +799,11 @@ class ProfileImageUpdateAPIView(APIView):
         if 'image' not in request.FILES:
             return Response({'error': 'No image file provided.'}, status=status.HTTP_400_BAD_REQUEST)
         
+        try:
+            validate_upload(request.FILES['image'], Profile.image_profile)
+        except ImageRejected as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         profile, created = Profile.objects.get_or_create(user=request.user)
         
         # Manually update the image and save the profile
@@ -1010,9 +893,9 @@ class PublicProfileRetrieveView(APIView):
                 'ratings__conditions', 
                 'ratings__benefits',
                 'ratings__side_effects',
-                # Prefetch comments made by this user, and for each comment, its rating, and that rating's supplement
-                'comment_set__rating__supplement', # comment_set is the default reverse accessor
-                'comment_set__user', # User who made the comment (the profile owner)
+                # Prefetch comments made by this user, and for each comment, its thread's supplement
+                'comment_set__supplement', # comment_set is the default reverse accessor
+                'comment_set__user__profile', # User who made the comment (the profile owner)
                 'comment_set__parent_comment' # For replies, if needed by CommentSerializer
             ).get(username__iexact=username, is_active=True) # Use iexact for case-insensitive username lookup
             
@@ -1154,6 +1037,10 @@ def google_login(request):
         if not client_id:
             return Response({'error': 'Server misconfiguration: GOOGLE_OAUTH_CLIENT_ID not set'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        # google-auth pulls in its crypto backends; import it on first use rather than at worker start-up
+        from google.oauth2 import id_token as google_id_token
+        from google.auth.transport import requests as google_requests
+
         idinfo = google_id_token.verify_oauth2_token(id_token, google_requests.Request(), client_id)
 
         if idinfo.get('iss') not in ['accounts.google.com', 'https://accounts.google.com']: